@@ -0,0 +1,251 @@
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, Counter
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable, Tuple, Iterator
+from urllib.parse import urlsplit
+
+from metrics import ADMISSION_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+# Token buckets: `rate` tokens per second refill up to `burst`. A client
+# spends one token per URL it submits; a target domain one per page fetched.
+CLIENT_RATE = float(os.getenv('CLIENT_RATE', 5))
+CLIENT_BURST = int(os.getenv('CLIENT_BURST', 50))
+DOMAIN_RATE = float(os.getenv('DOMAIN_RATE', 2))
+DOMAIN_BURST = int(os.getenv('DOMAIN_BURST', 10))
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 50))
+# Analyses running at once across all API workers; beyond this requests are shed
+MAX_IN_FLIGHT = int(os.getenv('MAX_IN_FLIGHT', 64))
+# A slot not released within this many seconds (e.g. its worker died) is reclaimed
+IN_FLIGHT_LEASE = 300
+# After a Redis error, limits are enforced per process for this long before Redis is tried again
+REDIS_RETRY_INTERVAL = 30
+LOCAL_BUCKETS_MAX = 10000
+
+KEY_PREFIX = 'admission:'
+
+# Refills and takes `cost` tokens atomically, on the Redis clock so workers
+# agree on time. Returns the seconds until enough tokens are available, 0 if
+# they were taken.
+TOKEN_BUCKET_SCRIPT = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+# Slots are members of a sorted set scored by lease expiry. Returns 1 if a
+# slot was taken, 0 if all `limit` are held.
+ACQUIRE_SLOT_SCRIPT = """
+local now = tonumber(redis.call('TIME')[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+return 1
+"""
+
+class Rejected(Exception):
+    """A request refused by admission control; sent as `status_code` with Retry-After."""
+
+    def __init__(self, status_code: int, reason: str, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class LocalTokenBuckets:
+    """In-process token buckets, used when Redis isn't reachable."""
+
+    def __init__(self, max_buckets: int = LOCAL_BUCKETS_MAX):
+        self.buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self.max_buckets = max_buckets
+        self.lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, cost: float) -> float:
+        now = time.monotonic()
+        with self.lock:
+            tokens, ts = self.buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - ts) * rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+            return wait
+
+class AdmissionController:
+    """Per-client and per-domain rate limits and a global cap on analyses in flight.
+
+    State is kept in Redis so limits hold across API workers. If Redis fails,
+    limits fall back to per-process state until `REDIS_RETRY_INTERVAL` has
+    passed, rather than failing requests.
+    """
+
+    def __init__(self, get_redis: Optional[Callable[[], Any]] = None, enabled: bool = ADMISSION_ENABLED,
+                 client_rate: float = CLIENT_RATE, client_burst: int = CLIENT_BURST,
+                 domain_rate: float = DOMAIN_RATE, domain_burst: int = DOMAIN_BURST,
+                 max_in_flight: int = MAX_IN_FLIGHT, max_batch_size: int = MAX_BATCH_SIZE):
+        self.get_redis = get_redis
+        self.enabled = enabled
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.domain_rate = domain_rate
+        self.domain_burst = domain_burst
+        self.max_in_flight = max_in_flight
+        self.max_batch_size = max_batch_size
+        self.local_buckets = LocalTokenBuckets()
+        self.local_in_flight = 0
+        self.lock = threading.Lock()
+        self.rejected: Counter = Counter()
+        self._scripts: Dict[str, Any] = {}
+        self._scripts_client = None
+        self._redis_retry_at = 0.0
+
+    def admit_client(self, client: str, cost: int = 1) -> None:
+        """Spend `cost` of the client's tokens, or raise `Rejected` (429)."""
+        if not self.enabled:
+            return
+        wait = self._take(f"client:{client}", self.client_rate, self.client_burst, cost)
+        if wait > 0:
+            self._reject(Rejected(429, 'client', "Rate limit exceeded, slow down", wait))
+
+    def admit_domain(self, url: str) -> None:
+        """Spend a token for fetching from the URL's domain, or raise `Rejected` (429)."""
+        if not self.enabled:
+            return
+        domain = (urlsplit(url).hostname or '').lower()
+        wait = self._take(f"domain:{domain}", self.domain_rate, self.domain_burst, 1)
+        if wait > 0:
+            self._reject(Rejected(429, 'domain', f"Too many requests to {domain}, try again later", wait))
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one of the in-flight slots for the duration, or raise `Rejected` (503)."""
+        if not self.enabled:
+            yield
+            return
+        release = self._acquire_slot()
+        if release is None:
+            self._reject(Rejected(503, 'overloaded', "Server busy, try again shortly", 1))
+        try:
+            yield
+        finally:
+            release()
+
+    def status(self) -> Dict[str, Any]:
+        """Limits, current load and rejections in this process, for /health."""
+        backend, in_flight = 'local', self.local_in_flight
+        client = self._redis() if self.enabled else None
+        if client is not None:
+            try:
+                in_flight = client.zcount(f"{KEY_PREFIX}in_flight", time.time(), '+inf')
+                backend = 'redis'
+            except Exception as e:
+                self._redis_failed(e)
+        return {
+            'enabled': self.enabled,
+            'backend': backend,
+            'in_flight': in_flight,
+            'max_in_flight': self.max_in_flight,
+            'max_batch_size': self.max_batch_size,
+            'client_limit': {'rate': self.client_rate, 'burst': self.client_burst},
+            'domain_limit': {'rate': self.domain_rate, 'burst': self.domain_burst},
+            'rejected': dict(self.rejected),
+        }
+
+    def _reject(self, rejection: Rejected) -> None:
+        self.rejected[rejection.reason] += 1
+        ADMISSION_REJECTIONS.labels(rejection.reason).inc()
+        raise rejection
+
+    def _take(self, key: str, rate: float, burst: float, cost: float) -> float:
+        # A cost above the burst could never be paid; cap it so it waits for a full bucket instead
+        cost = min(cost, burst)
+        client = self._redis()
+        if client is not None:
+            try:
+                return float(self._script(client, 'bucket')(keys=[KEY_PREFIX + key], args=[rate, burst, cost]))
+            except Exception as e:
+                self._redis_failed(e)
+        return self.local_buckets.take(key, rate, burst, cost)
+
+    def _acquire_slot(self) -> Optional[Callable[[], None]]:
+        client = self._redis()
+        if client is not None:
+            key, member = f"{KEY_PREFIX}in_flight", uuid.uuid4().hex
+            try:
+                if not int(self._script(client, 'slot')(keys=[key], args=[member, self.max_in_flight, IN_FLIGHT_LEASE])):
+                    return None
+            except Exception as e:
+                self._redis_failed(e)
+            else:
+                def release():
+                    try:
+                        client.zrem(key, member)
+                    except Exception as e:
+                        self._redis_failed(e)
+                return release
+
+        with self.lock:
+            if self.local_in_flight >= self.max_in_flight:
+                return None
+            self.local_in_flight += 1
+
+        def release_local():
+            with self.lock:
+                self.local_in_flight -= 1
+        return release_local
+
+    def _redis(self):
+        if self.get_redis is None or time.monotonic() < self._redis_retry_at:
+            return None
+        return self.get_redis()
+
+    def _redis_failed(self, error: Exception) -> None:
+        self._redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+        logger.warning("Admission control falling back to per-process limits: %s", error)
+
+    def _script(self, client, name: str):
+        # Registered scripts run by SHA; re-registered if the client is replaced
+        if client is not self._scripts_client:
+            self._scripts = {
+                'bucket': client.register_script(TOKEN_BUCKET_SCRIPT),
+                'slot': client.register_script(ACQUIRE_SLOT_SCRIPT),
+            }
+            self._scripts_client = client
+        return self._scripts[name]
+
+def client_id(request, user_id: Optional[int] = None) -> str:
+    """Identify the API client: the signed-in user or API key owner, else its address.
+
+    Unregistered X-API-Key values are never used, so made-up keys can't buy
+    fresh buckets; resolve registered keys to their owner before calling.
+    """
+    if user_id is not None:
+        return f"user:{user_id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
@@ -1,17 +1,30 @@
-import openai
 import os
 import json
 from typing import Dict, Any, List
 import re
+from seo import SEOEngine
 
 class AIAnalyzer:
     def __init__(self):
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-        self.client = openai.OpenAI(api_key=openai.api_key) if openai.api_key else None
+        self.api_key = os.getenv('OPENAI_API_KEY')
+        self._client = None
+        self.seo_engine = SEOEngine()
+
+    @property
+    def client(self):
+        # The openai package is slow to import; only load it once a key is configured and used
+        if self._client is None and self.api_key:
+            import openai
+            self._client = openai.OpenAI(api_key=self.api_key)
+        return self._client
+
+    @client.setter
+    def client(self, client) -> None:
+        self._client = client
 
     def is_enabled(self) -> bool:
         """Check if AI analysis is enabled."""
-        return self.client is not None
+        return self._client is not None or bool(self.api_key)
 
     async def analyze_content(self, content: str, metadata: Dict[str, Any], links: Dict[str, Any], images: Dict[str, Any]) -> Dict[str, Any]:
         """Perform AI-powered content analysis."""
@@ -98,88 +111,13 @@ class AIAnalyzer:
                 "raw_response": response
             }
 
-    def analyze_seo(self, metadata: Dict[str, Any], content: Dict[str, Any], headings: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze_seo(self, metadata: Dict[str, Any], content: Dict[str, Any], headings: Dict[str, Any],
+                    links: Dict[str, Any] = None, images: Dict[str, Any] = None) -> Dict[str, Any]:
         """Analyze SEO aspects of the page."""
-        seo_score = 0
-        issues = []
-        recommendations = []
-
-        # Title analysis
-        title = metadata.get('title', '')
-        if not title:
-            issues.append("Missing page title")
-        elif len(title) < 30:
-            issues.append("Title too short (should be 30-60 characters)")
-            recommendations.append("Expand title to 30-60 characters for better SEO")
-        elif len(title) > 60:
-            issues.append("Title too long (should be 30-60 characters)")
-            recommendations.append("Shorten title to under 60 characters")
-        else:
-            seo_score += 25
-
-        # Meta description
-        meta_desc = metadata.get('meta_tags', {}).get('description', '')
-        if not meta_desc:
-            issues.append("Missing meta description")
-            recommendations.append("Add meta description (120-160 characters)")
-        elif len(meta_desc) < 120:
-            issues.append("Meta description too short")
-            recommendations.append("Expand meta description to 120-160 characters")
-        elif len(meta_desc) > 160:
-            issues.append("Meta description too long")
-            recommendations.append("Shorten meta description to under 160 characters")
-        else:
-            seo_score += 25
-
-        # Heading structure
-        h1_count = len(headings.get('h1', []))
-        if h1_count == 0:
-            issues.append("Missing H1 tag")
-            recommendations.append("Add an H1 tag with your main keyword")
-        elif h1_count > 1:
-            issues.append("Multiple H1 tags found")
-            recommendations.append("Use only one H1 tag per page")
-        else:
-            seo_score += 20
-
-        # Content length
-        content_length = content.get('length', 0)
-        if content_length < 300:
-            issues.append("Content too short for good SEO")
-            recommendations.append("Add more content (aim for 300+ words)")
-        else:
-            seo_score += 15
-
-        # Image alt text
-        images = metadata.get('images', {})
-        without_alt = images.get('without_alt', 0)
-        if without_alt > 0:
-            issues.append(f"{without_alt} images missing alt text")
-            recommendations.append("Add descriptive alt text to all images")
-            seo_score -= 10
-
-        # Internal linking
-        internal_links = metadata.get('links', {}).get('total_internal', 0)
-        if internal_links < 3:
-            recommendations.append("Add more internal links to improve site structure")
-            seo_score += 5
-
-        return {
-            "score": max(0, seo_score),
-            "grade": self._get_seo_grade(seo_score),
-            "issues": issues,
-            "recommendations": recommendations
-        }
-
-    def _get_seo_grade(self, score: int) -> str:
-        """Convert SEO score to grade."""
-        if score >= 80:
-            return "A"
-        elif score >= 70:
-            return "B"
-        elif score >= 60:
-            return "C"
-        elif score >= 50:
-            return "D"
-        else:
-            return "F"
+        return self.seo_engine.score({
+            'metadata': metadata,
+            'content': content,
+            'headings': headings,
+            'links': links,
+            'images': images
+        })
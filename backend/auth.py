@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Tuple, Callable
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+
+logger = logging.getLogger(__name__)
+
+SECRET_KEY = os.getenv('SECRET_KEY')
+if not SECRET_KEY:
+    # Tokens then only validate in this process and not after a restart
+    logger.warning("SECRET_KEY is not set; using a random key for this process")
+    SECRET_KEY = secrets.token_urlsafe(32)
+ALGORITHM = os.getenv('ALGORITHM', 'HS256')
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES', 60))
+# When false, requests without a token are served anonymously
+AUTH_REQUIRED = os.getenv('AUTH_REQUIRED', 'false').lower() == 'true'
+# Validated tokens remembered per process, so repeat requests skip the signature check
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+# API key lookups, unknown keys included, are remembered per process for this many seconds
+API_KEY_CACHE_TTL = int(os.getenv('API_KEY_CACHE_TTL', 60))
+
+# bcrypt takes ~0.25s of CPU per hash; it runs here, off the event loop, and the
+# pool size bounds how many cores a burst of logins can take
+password_executor = ThreadPoolExecutor(max_workers=int(os.getenv('AUTH_WORKERS', 4)), thread_name_prefix='auth')
+
+@dataclass(frozen=True)
+class TokenUser:
+    id: int
+    username: str
+
+class InvalidToken(Exception):
+    pass
+
+def _password_bytes(password: str) -> bytes:
+    # bcrypt only uses the first 72 bytes; truncate as passlib did, so existing hashes still verify
+    return password.encode('utf-8')[:72]
+
+def hash_password(password: str) -> str:
+    import bcrypt
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(BCRYPT_ROUNDS)).decode('ascii')
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    import bcrypt
+    try:
+        return bcrypt.checkpw(_password_bytes(password), hashed_password.encode('ascii'))
+    except ValueError:  # not a bcrypt hash
+        return False
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(password_executor, hash_password, password)
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(
+        password_executor, verify_password, password, hashed_password
+    )
+
+def create_access_token(user_id: int, username: str,
+                        expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES) -> Tuple[str, int]:
+    """A signed JWT for the user and its lifetime in seconds."""
+    from jose import jwt
+
+    now = int(time.time())
+    claims = {'sub': str(user_id), 'name': username, 'iat': now, 'exp': now + expires_minutes * 60}
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM), expires_minutes * 60
+
+class TokenValidator:
+    """Validates JWTs, remembering valid ones in an LRU until they expire.
+
+    A cached token costs a dict lookup; only unseen tokens get a signature
+    check. Tokens are never looked up in the database.
+    """
+
+    def __init__(self, secret: str = SECRET_KEY, algorithm: str = ALGORITHM, max_size: int = TOKEN_CACHE_SIZE):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.max_size = max_size
+        self.cache: 'OrderedDict[str, Tuple[TokenUser, float]]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def validate(self, token: str) -> TokenUser:
+        now = time.time()
+        with self.lock:
+            entry = self.cache.get(token)
+            if entry is not None:
+                if entry[1] > now:
+                    self.cache.move_to_end(token)
+                    return entry[0]
+                del self.cache[token]
+
+        claims = self._decode(token)
+        user = TokenUser(id=int(claims['sub']), username=claims.get('name', ''))
+        with self.lock:
+            self.cache[token] = (user, float(claims['exp']))
+            if len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+        return user
+
+    def _decode(self, token: str) -> Dict[str, Any]:
+        from jose import jwt, JWTError
+
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        except JWTError as e:
+            raise InvalidToken(str(e))
+        if 'sub' not in claims or 'exp' not in claims:
+            raise InvalidToken("Token is missing claims")
+        try:
+            int(claims['sub'])
+        except (TypeError, ValueError):
+            raise InvalidToken("Invalid subject")
+        return claims
+
+def hash_api_key(key: str) -> str:
+    # Keys are long and random, so a plain hash is enough; bcrypt would cost every request
+    return hashlib.sha256(key.encode()).hexdigest()
+
+def generate_api_key() -> Tuple[str, str]:
+    """A new API key and the hash to store for it."""
+    key = 'wa_' + secrets.token_urlsafe(32)
+    return key, hash_api_key(key)
+
+class ApiKeyRegistry:
+    """Resolves X-API-Key values to the user owning them, from the `api_keys` table.
+
+    Lookups, misses included, are kept in an LRU for `API_KEY_CACHE_TTL`
+    seconds, so a known key costs a dict lookup and a revoked key stops
+    working within the TTL.
+    """
+
+    def __init__(self, session_factory: Optional[Callable[[], Any]] = None, ttl: int = API_KEY_CACHE_TTL,
+                 max_size: int = TOKEN_CACHE_SIZE):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.max_size = max_size
+        self.cache: 'OrderedDict[str, Tuple[Optional[int], float]]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def owner(self, key: str) -> Optional[int]:
+        """The id of the user owning an active `key`, or None."""
+        key_hash = hash_api_key(key)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.cache.get(key_hash)
+            if entry is not None and entry[1] > now:
+                self.cache.move_to_end(key_hash)
+                return entry[0]
+
+        from models import SessionLocal, ApiKey
+
+        with (self.session_factory or SessionLocal)() as db:
+            user_id = db.query(ApiKey.user_id).filter(ApiKey.key_hash == key_hash, ApiKey.is_active.is_(True)).scalar()
+        with self.lock:
+            self.cache[key_hash] = (user_id, now + self.ttl)
+            self.cache.move_to_end(key_hash)
+            if len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+        return user_id
+
+    def forget(self, key_hash: str) -> None:
+        with self.lock:
+            self.cache.pop(key_hash, None)
+
+token_validator = TokenValidator()
+api_keys = ApiKeyRegistry()
+bearer_scheme = HTTPBearer(auto_error=False)
+
+async def current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)) -> Optional[TokenUser]:
+    """The user a bearer token belongs to; None for anonymous requests unless AUTH_REQUIRED."""
+    if credentials is None:
+        if AUTH_REQUIRED:
+            raise HTTPException(status_code=401, detail="Not authenticated", headers={'WWW-Authenticate': 'Bearer'})
+        return None
+    try:
+        return token_validator.validate(credentials.credentials)
+    except InvalidToken:
+        raise HTTPException(status_code=401, detail="Invalid or expired token", headers={'WWW-Authenticate': 'Bearer'})
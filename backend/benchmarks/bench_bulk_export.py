@@ -0,0 +1,83 @@
+"""Bulk export benchmark.
+
+Seeds a throwaway SQLite database with synthetic analyses and times a bulk
+export in each format, reporting throughput and peak memory:
+
+    cd backend && python benchmarks/bench_bulk_export.py --analyses 100000
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def synthetic_rows(start, count, links_per_page, images_per_page):
+    created = datetime(2025, 1, 1)
+    for i in range(start, start + count):
+        url = f"https://site{i % 50}.test/page/{i}"
+        yield {
+            'url': url, 'final_url': url, 'title': f"Page {i}", 'status_code': 200,
+            'processing_time': 0.25, 'created_at': created + timedelta(seconds=i),
+            'page_metadata': {'language': 'en', 'canonical': url, 'meta_tags': {'description': f"About page {i}"}},
+            'links': {
+                'all': [{'text': f"Link {j}", 'href': f"/page/{j}", 'full_url': f"https://site{i % 50}.test/page/{j}",
+                         'is_internal': True, 'rel': None, 'target': None, 'title': None}
+                        for j in range(links_per_page)],
+                'total': links_per_page, 'total_internal': links_per_page, 'total_external': 0
+            },
+            'images': {
+                'images': [{'src': f"/img/{j}.png", 'full_url': f"https://site{i % 50}.test/img/{j}.png",
+                            'alt': '' if j % 3 else f"Image {j}", 'width': 640, 'height': 480, 'loading': 'lazy'}
+                           for j in range(images_per_page)],
+                'total': images_per_page, 'without_alt': images_per_page - (images_per_page + 2) // 3
+            },
+            'headings': {'h1': [{'text': f"Page {i}", 'id': None}], 'h2': [{'text': 'Section', 'id': 'section'}] * 3},
+            'stats': {'content_length': 5000},
+        }
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--analyses', type=int, default=10000)
+    parser.add_argument('--links', type=int, default=20, help="links per page")
+    parser.add_argument('--images', type=int, default=5, help="images per page")
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--formats', default='parquet,arrow,excel')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-bulk-export-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{workdir}/bench.db"
+    from sqlalchemy import insert
+    from models import Base, engine, SessionLocal, Analysis
+    from bulk_export import BulkExportFilter, export_bulk
+
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for start in range(0, args.analyses, args.chunk_size):
+            count = min(args.chunk_size, args.analyses - start)
+            conn.execute(insert(Analysis), list(synthetic_rows(start, count, args.links, args.images)))
+    print(f"seeded {args.analyses} analyses in {time.perf_counter() - started:.1f}s, peak RSS {peak_rss_mb():.0f} MB")
+
+    for format in args.formats.split(','):
+        rss_before = peak_rss_mb()
+        started = time.perf_counter()
+        with SessionLocal() as db:
+            export = export_bulk(db, BulkExportFilter(), format, directory=tempfile.mkdtemp(dir=workdir),
+                                 chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - started
+        rows = sum(export['rows'].values())
+        print(f"{format:8} {elapsed:7.1f}s  {rows / elapsed:10.0f} rows/s  "
+              f"{os.path.getsize(export['path']) / 2 ** 20:7.1f} MB  "
+              f"peak RSS {peak_rss_mb():.0f} MB (+{peak_rss_mb() - rss_before:.0f})")
+        os.remove(export['path'])
+
+if __name__ == '__main__':
+    main()
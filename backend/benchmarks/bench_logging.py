@@ -0,0 +1,101 @@
+"""Logging overhead microbenchmark.
+
+Replays the log calls one cache-miss `/api/analyze` request makes, first as
+the old emoji print() calls and then through the queue-based logging pipeline,
+and reports the time the request thread spends in them:
+
+    cd backend && python benchmarks/bench_logging.py --requests 20000
+
+stdout is a line-buffered pipe into a separate reader process, as it is
+under a process manager or `docker logs`. Each simulated request then waits
+`--io-wait` microseconds, standing in for the fetch; that is when the writer
+thread formats and writes. `--io-wait 0` gives a CPU-bound worst case where
+the writer competes with requests for the GIL. `--reader-kbps` throttles the
+reader, as a busy log shipper or a terminal does; print() then blocks the
+request once the pipe buffer fills, while the writer thread absorbs it.
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logs
+
+URL = "https://example.com/some/page"
+RESULT = {'status_code': 200, 'final_url': URL, 'title': "Example page", 'stats': {'processing_time': 0.42}}
+
+def request_with_print():
+    print(f"📝 Received analysis request for: {URL}")
+    print(f"❌ Cache miss for {URL}")
+    print(f"🌐 Fetching URL: {URL}")
+    print(f"✅ Successfully fetched URL, status: {RESULT['status_code']}, final URL: {RESULT['final_url']}")
+    print(f"📄 Page title: {RESULT['title']}")
+    print(f"💾 Cached result for {URL} (TTL: 3600s)")
+    print(f"✅ Enhanced analysis complete for {URL}")
+
+logger = logging.getLogger('main')
+cache_logger = logging.getLogger('cache')
+lookup_logger = logs.sampled_logger('cache.lookups')
+
+def request_with_logging():
+    logger.info("Analysis requested", extra={'url': URL})
+    lookup_logger.info("Cache miss", extra={'url': URL, 'result': 'miss'})
+    logger.debug("Fetched page", extra={'url': URL, 'status_code': RESULT['status_code'],
+                                        'final_url': RESULT['final_url']})
+    cache_logger.debug("Cached result", extra={'url': URL, 'ttl': 3600})
+    logger.info("Analysis complete", extra={'url': URL, 'status_code': RESULT['status_code'],
+                                            'duration_ms': round(RESULT['stats']['processing_time'] * 1000, 1)})
+
+# Drains stdin, optionally at a capped rate
+READER = """
+import sys, time
+kbps = int(sys.argv[1])
+while True:
+    chunk = sys.stdin.buffer.read1(4096)
+    if not chunk:
+        break
+    if kbps:
+        time.sleep(len(chunk) / (kbps * 1024))
+"""
+
+def measure(label, func, requests, io_wait):
+    for _ in range(min(1000, requests)):
+        func()
+    spent = 0.0
+    for _ in range(requests):
+        started = time.perf_counter()
+        func()
+        spent += time.perf_counter() - started
+        if io_wait:
+            time.sleep(io_wait)
+    print(f"{label:10} {spent / requests * 1e6:8.2f} µs/request", file=sys.__stderr__)
+    return spent
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--reader-kbps', type=int, default=0, help="throttle the stdout reader (0 = unthrottled)")
+    parser.add_argument('--io-wait', type=float, default=200, help="simulated I/O per request, in µs")
+    args = parser.parse_args()
+
+    reader = subprocess.Popen([sys.executable, '-c', READER, str(args.reader_kbps)],
+                              stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+    sys.stdout = open(reader.stdin.fileno(), 'w', buffering=1, encoding='utf-8', closefd=False)
+    try:
+        before = measure('print', request_with_print, args.requests, args.io_wait / 1e6)
+        logs.setup_logging(level='INFO', format='json')
+        after = measure('logging', request_with_logging, args.requests, args.io_wait / 1e6)
+        logs.stop_logging()
+    finally:
+        sys.stdout.close()
+        sys.stdout = sys.__stdout__
+        reader.stdin.close()
+        reader.wait()
+    print(f"speedup    {before / after:8.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Near-duplicate lookup benchmark.
+
+Seeds a throwaway SQLite database with MinHash fingerprints of synthetic
+pages, in clusters of near-duplicates (copies of a page with a few words
+changed), and times `near_duplicates.find` against the LSH buckets. Each
+lookup is checked against a brute-force comparison with every stored
+signature, reporting latency percentiles for both and the LSH recall:
+
+    cd backend && python benchmarks/bench_near_duplicates.py --signatures 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def page_words(rng, vocabulary, count):
+    return [rng.choice(vocabulary) for _ in range(count)]
+
+def edited(rng, vocabulary, words, share):
+    """A copy of `words` with `share` of them replaced."""
+    copy = list(words)
+    for i in rng.sample(range(len(copy)), int(len(copy) * share)):
+        copy[i] = rng.choice(vocabulary)
+    return copy
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--signatures', type=int, default=100000)
+    parser.add_argument('--words', type=int, default=300, help="words per page")
+    parser.add_argument('--cluster-size', type=int, default=5, help="near-duplicates per original page")
+    parser.add_argument('--edit', type=float, default=0.01, help="share of words changed in a near-duplicate")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='bench-near-duplicates-'), 'bench.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+    import numpy as np
+    from sqlalchemy import insert
+    from models import Base, engine, SessionLocal, Analysis, ContentFingerprint, ContentBucket
+    import near_duplicates
+
+    rng = random.Random(1)
+    vocabulary = [f"w{i}" for i in range(50000)]
+    Base.metadata.create_all(bind=engine)
+
+    hashing = 0.0
+    originals = []
+    signatures = np.empty((args.signatures, near_duplicates.MINHASH_PERMUTATIONS), dtype=near_duplicates.SIGNATURE_DTYPE)
+    started = time.perf_counter()
+    for start in range(0, args.signatures, args.chunk_size):
+        analyses, fingerprints, buckets = [], [], []
+        for i in range(start, min(start + args.chunk_size, args.signatures)):
+            if i % args.cluster_size == 0:
+                originals.append(page_words(rng, vocabulary, args.words))
+                words = originals[-1]
+            else:
+                words = edited(rng, vocabulary, originals[-1], args.edit)
+            text = ' '.join(words)
+            hash_started = time.perf_counter()
+            sig = near_duplicates.signature.__wrapped__(text)
+            keys = near_duplicates.band_keys(sig)
+            hashing += time.perf_counter() - hash_started
+            signatures[i] = sig
+            analysis_id = i + 1
+            analyses.append({'id': analysis_id, 'url': f"https://site.test/{i}"})
+            fingerprints.append({'analysis_id': analysis_id, 'signature': sig.tobytes()})
+            buckets += [{'analysis_id': analysis_id, 'band': band, 'bucket': key} for band, key in enumerate(keys)]
+        with engine.begin() as conn:
+            conn.execute(insert(Analysis), analyses)
+            conn.execute(insert(ContentFingerprint), fingerprints)
+            conn.execute(insert(ContentBucket), buckets)
+    elapsed = time.perf_counter() - started
+    print(f"fingerprinted {args.signatures} pages in {hashing:.1f}s ({hashing / args.signatures * 1000:.2f} ms/page), "
+          f"stored in {elapsed:.1f}s total, database {os.path.getsize(path) / 2 ** 20:.0f} MB")
+
+    lsh, brute, found, expected = [], [], 0, 0
+    with SessionLocal() as db:
+        for _ in range(args.queries):
+            # A fresh near-duplicate of a stored original: its cluster should come back
+            query = near_duplicates.signature.__wrapped__(' '.join(edited(rng, vocabulary, rng.choice(originals), args.edit)))
+            started = time.perf_counter()
+            matches = near_duplicates.find(db, query, limit=args.signatures)
+            lsh.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            truth = np.flatnonzero(near_duplicates.similarity(query, signatures) >= near_duplicates.NEAR_DUPLICATE_THRESHOLD) + 1
+            brute.append((time.perf_counter() - started) * 1000)
+            expected += len(truth)
+            found += len(set(truth.tolist()) & {match['analysis_id'] for match in matches})
+
+    print(f"{'lookup':12} {'p50 ms':>8} {'p95 ms':>8}")
+    print(f"{'lsh':12} {percentile(lsh, 50):8.2f} {percentile(lsh, 95):8.2f}")
+    print(f"{'brute force':12} {percentile(brute, 50):8.2f} {percentile(brute, 95):8.2f}  (in memory, no database)")
+    print(f"recall at similarity >= {near_duplicates.NEAR_DUPLICATE_THRESHOLD}: {found / max(expected, 1):.3f} "
+          f"({found}/{expected})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Full-text search benchmark.
+
+Seeds a throwaway SQLite database with synthetic analyses, their words drawn
+from a Zipf-distributed vocabulary so that terms range from very common to
+rare, and times `/api/search`-style queries against the FTS5 index, reporting
+latency percentiles per query and the number of matching pages:
+
+    cd backend && python benchmarks/bench_search.py --analyses 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'su', 'ta', 'ri', 'vo', 'ze', 'pu', 'an', 'el', 'or', 'ix', 'um', 'ba']
+
+def vocabulary(size):
+    # Distinct pronounceable words, so the porter stemmer leaves them mostly alone
+    rng = random.Random(1)
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words, key=lambda word: (len(word), word))
+
+def synthetic_rows(start, count, words, cum_weights, words_per_page, rng):
+    created = datetime(2025, 1, 1)
+    for i in range(start, start + count):
+        text = rng.choices(words, cum_weights=cum_weights, k=words_per_page)
+        url = f"https://site{i % 500}.test/page/{i}"
+        yield {
+            'url': url, 'final_url': url, 'title': ' '.join(text[:6]).capitalize(), 'status_code': 200,
+            'created_at': created + timedelta(seconds=i),
+            'headings': {'h1': [{'text': ' '.join(text[6:10]), 'id': None}],
+                         'h2': [{'text': ' '.join(text[10:14]), 'id': None}]},
+            'content': {'text': ' '.join(text[14:]), 'length': words_per_page * 6, 'truncated': False},
+        }
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--analyses', type=int, default=100000)
+    parser.add_argument('--words', type=int, default=150, help="words per page")
+    parser.add_argument('--vocabulary', type=int, default=50000)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--runs', type=int, default=20, help="timed runs per query")
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--database', help="reuse a database seeded by an earlier run")
+    args = parser.parse_args()
+
+    path = args.database or os.path.join(tempfile.mkdtemp(prefix='bench-search-'), 'bench.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+    from sqlalchemy import insert, func, select
+    from models import Base, engine, Analysis
+    import search
+
+    words = vocabulary(args.vocabulary)
+    cum_weights = list(accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        existing = conn.scalar(select(func.count()).select_from(Analysis))
+    if existing < args.analyses:
+        rng = random.Random(existing)
+        started = time.perf_counter()
+        # Indexed by the insert trigger, as the API's writes are
+        for start in range(existing, args.analyses, args.chunk_size):
+            count = min(args.chunk_size, args.analyses - start)
+            with engine.begin() as conn:
+                conn.execute(insert(Analysis), list(synthetic_rows(start, count, words, cum_weights, args.words, rng)))
+        elapsed = time.perf_counter() - started
+        print(f"seeded and indexed {args.analyses - existing} analyses in {elapsed:.1f}s "
+              f"({(args.analyses - existing) / elapsed:.0f}/s), database {os.path.getsize(path) / 2 ** 20:.0f} MB")
+        with engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO analysis_search(analysis_search) VALUES ('optimize')")
+
+    queries = {
+        'common word': words[10],
+        'frequent word': words[200],
+        'uncommon word': words[5000],
+        'rare word': words[40000],
+        'two words': f"{words[300]} {words[800]}",
+        'phrase': f'"{words[2]} {words[20]}"',
+        # bm25 weights a phrase by counting its matches across the whole index
+        'stopword phrase': f'"{words[0]} {words[1]}"',
+        'word -exclusion': f"{words[500]} -{words[50]}",
+    }
+    print(f"{'query':16} {'matches':>9} {'p50 ms':>8} {'p95 ms':>8} {'page 5 p50':>11}")
+    with engine.connect() as conn:
+        for name, query in queries.items():
+            matches = conn.exec_driver_sql("SELECT count(*) FROM analysis_search WHERE analysis_search MATCH ?",
+                                           (search.fts5_query(query),)).scalar()
+            first, deep = [], []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                page = search.search(conn, query, args.limit)
+                first.append((time.perf_counter() - started) * 1000)
+                # Four more pages through the cursor; the last one is timed
+                for _ in range(4):
+                    if page['next_cursor'] is None:
+                        break
+                    started = time.perf_counter()
+                    page = search.search(conn, query, args.limit, page['next_cursor'])
+                deep.append((time.perf_counter() - started) * 1000)
+            print(f"{name:16} {matches:9d} {percentile(first, 50):8.1f} {percentile(first, 95):8.1f} "
+                  f"{percentile(deep, 50):11.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Response serialization benchmark.
+
+Builds analysis results for the large stub pages (a long article and a link
+hub) and times the serialization work `/api/analyze` does per request, before
+and after the switch to orjson and pre-serialized cache entries:
+
+    cd backend && python benchmarks/bench_serialization.py --iterations 200
+
+A cache miss encodes the result for the response and for the cache; a hit
+decodes the cached entry (for the stored analysis row) and sends the
+response body. The old path ran `jsonable_encoder` and stdlib `json` for
+each of these.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+from benchmarks.stub_sites import build_corpus
+from json_responses import FastJSONResponse, dumps, loads
+from pipeline import AnalysisSettings, parse_html, build_result, compute_stats
+from seo import SEOEngine
+
+def large_result(path: str, max_links: int):
+    html = build_corpus()[path]
+    settings = AnalysisSettings(max_links=max_links)
+    result = build_result(f"https://bench.test{path}", f"https://bench.test{path}", 200, parse_html(html),
+                          settings, {'response_time': 0.1}, SEOEngine())
+    result['stats'] = compute_stats(result, len(html))
+    return result
+
+def render_stdlib(content) -> bytes:
+    # What starlette's JSONResponse does with the output of jsonable_encoder
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+def old_miss(result):
+    render_stdlib(result)
+    json.dumps({'result': result, 'cached_at': datetime.utcnow().isoformat()}, default=str)
+
+def new_miss(result):
+    FastJSONResponse(result)
+    datetime.utcnow().isoformat().encode() + b'\n' + dumps(result)
+
+def old_hit(cached: str):
+    render_stdlib(json.loads(cached)['result'])
+
+def new_hit(cached: bytes):
+    payload = cached.partition(b'\n')[2]
+    loads(payload)
+    FastJSONResponse(payload)
+
+def timed(function, argument, iterations: int) -> float:
+    """Mean microseconds per call."""
+    function(argument)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        function(argument)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--max-links', type=int, default=1000, help="links kept per result")
+    args = parser.parse_args()
+
+    for path in ('/huge', '/links'):
+        result = large_result(path, args.max_links)
+        old_cached = json.dumps({'result': result, 'cached_at': datetime.utcnow().isoformat()}, default=str)
+        new_cached = datetime.utcnow().isoformat().encode() + b'\n' + dumps(result)
+        print(f"{path}: {len(new_cached) / 1024:.0f} KB")
+        for name, old, new in (('miss', (old_miss, result), (new_miss, result)),
+                               ('hit', (old_hit, old_cached), (new_hit, new_cached))):
+            before = timed(*old, args.iterations)
+            after = timed(*new, args.iterations)
+            print(f"  {name:5} json {before:9.0f} µs   orjson {after:9.0f} µs   {before / after:5.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""In-process fakes for Redis and OpenAI, so benchmarks run offline."""
+import fnmatch
+import json
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Optional, Dict, Tuple
+
+class FakeRedis:
+    """The subset of the redis-py client that `CacheManager` uses, held in a dict."""
+
+    def __init__(self):
+        self.data: Dict[str, Tuple[str, Optional[float]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[str]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            value = self._live(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def setex(self, key: str, ttl: int, value) -> bool:
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + ttl)
+            return True
+
+    def delete(self, *keys) -> int:
+        with self.lock:
+            return sum(self.data.pop(key.decode() if isinstance(key, bytes) else key, None) is not None for key in keys)
+
+    unlink = delete
+
+    def expire(self, key: str, ttl: int) -> bool:
+        with self.lock:
+            if self._live(key) is None:
+                return False
+            self.data[key] = (self.data[key][0], time.monotonic() + ttl)
+            return True
+
+    def sadd(self, key: str, *members) -> int:
+        with self.lock:
+            members = {self._bytes(member) for member in members}
+            current = self._live(key)
+            if current is None:
+                current = set()
+                self.data[key] = (current, None)
+            added = len(members - current)
+            current |= members
+            return added
+
+    def srem(self, key: str, *members) -> int:
+        with self.lock:
+            current = self._live(key)
+            if current is None:
+                return 0
+            removed = {self._bytes(member) for member in members} & current
+            current -= removed
+            if not current:
+                del self.data[key]
+            return len(removed)
+
+    def sscan_iter(self, key: str, match: Optional[str] = None, count: Optional[int] = None):
+        with self.lock:
+            members = list(self._live(key) or ())
+        return iter(members)
+
+    def scan_iter(self, match: Optional[str] = None, count: Optional[int] = None):
+        with self.lock:
+            keys = [key for key in self.data if match is None or fnmatch.fnmatchcase(key, match)]
+        return iter(keys)
+
+    def pipeline(self, transaction: bool = True) -> 'FakePipeline':
+        return FakePipeline(self)
+
+    @staticmethod
+    def _bytes(value) -> bytes:
+        # Like Redis, set members come back as bytes
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def flushdb(self) -> bool:
+        with self.lock:
+            self.data.clear()
+            return True
+
+    def dbsize(self) -> int:
+        return len(self.data)
+
+    def info(self) -> Dict[str, object]:
+        size = sum(len(value) for value, _ in self.data.values())
+        return {'used_memory_human': f"{size / 1024:.1f}K", 'keyspace_hits': self.hits, 'keyspace_misses': self.misses}
+
+class FakePipeline:
+    """Queues `FakeRedis` commands and runs them on `execute`, like a non-transactional pipeline."""
+
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self.commands.append((getattr(self.redis, name), args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> list:
+        commands, self.commands = self.commands, []
+        return [command(*args, **kwargs) for command, args, kwargs in commands]
+
+AI_RESPONSE = json.dumps({
+    "summary": "A benchmark page.",
+    "topics": ["benchmarks"],
+    "sentiment": "neutral",
+    "readability_score": 7,
+    "key_insights": ["Served by the local stub site"],
+    "seo_suggestions": ["None"],
+    "content_quality": "medium",
+    "target_audience": "Benchmarks"
+})
+
+class FakeOpenAI:
+    """Answers chat completions with a canned analysis after `latency` seconds.
+
+    Blocks like the real synchronous client does.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=AI_RESPONSE))])
+
+@contextmanager
+def offline(main_module, ai_latency: float = 0.0):
+    """Swap the app's Redis and OpenAI clients for fakes, restoring them afterwards."""
+    cache_manager, ai_analyzer = main_module.cache_manager, main_module.ai_analyzer
+    saved = cache_manager.redis_client, ai_analyzer.client
+    cache_manager.redis_client = FakeRedis()
+    ai_analyzer.client = FakeOpenAI(ai_latency)
+    try:
+        yield cache_manager.redis_client, ai_analyzer.client
+    finally:
+        cache_manager.redis_client, ai_analyzer.client = saved
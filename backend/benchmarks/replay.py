@@ -0,0 +1,159 @@
+"""Replay captured traffic against the app, offline.
+
+Plays back the requests recorded with TRAFFIC_CAPTURE_DIR. Pages are served
+from the capture's response store instead of the network. Redis and OpenAI
+are in-process fakes, so a replay starts with a cold cache every time:
+
+    cd backend
+    TRAFFIC_CAPTURE_DIR=captures/today uvicorn main:app      # capture
+    python -m benchmarks.replay captures/today               # original rate
+    python -m benchmarks.replay captures/today --speed 4     # four times faster
+    python -m benchmarks.replay captures/today --speed 0 --concurrency 16   # flat out
+
+At a positive speed requests are sent on the captured schedule, whether or
+not earlier ones have finished, and latency includes any time spent queued
+behind --concurrency.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='webanalyzer-replay-'), 'replay.db')}")
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+# One client drives all the load, so per-client limits would cap the run
+os.environ.setdefault('ADMISSION_ENABLED', 'false')
+
+import httpx
+
+from benchmarks.fakes import offline
+from benchmarks.run import drive, percentile, print_result, rss_mb, peak_rss_mb
+
+def load_capture(directory: str, endpoint: str = '/api/analyze') -> List[Dict[str, Any]]:
+    with open(os.path.join(directory, 'requests.jsonl'), encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records = [record for record in records if record.get('endpoint') == endpoint]
+    return sorted(records, key=lambda record: record['ts'])
+
+def schedule(records: List[Dict[str, Any]], speed: float, max_gap: float) -> List[float]:
+    """Send time of each record, in seconds from the start of the replay."""
+    times, elapsed, previous = [], 0.0, None
+    for record in records:
+        ts = datetime.fromisoformat(record['ts'])
+        if previous is not None:
+            elapsed += min((ts - previous).total_seconds(), max_gap) / speed
+        times.append(elapsed)
+        previous = ts
+    return times
+
+async def replay_on_schedule(send, send_times: List[float], concurrency: int) -> Dict[str, Any]:
+    """Open-loop replay: each request goes out at its scheduled time."""
+    limit = asyncio.Semaphore(concurrency)
+    latencies, statuses, outcomes = [], {}, [None] * len(send_times)
+    started = time.perf_counter()
+    rss_before = rss_mb()
+
+    async def one(i: int, at: float):
+        await asyncio.sleep(max(0.0, started + at - time.perf_counter()))
+        scheduled = time.perf_counter()
+        async with limit:
+            try:
+                response = await send(i)
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+        latencies.append(time.perf_counter() - scheduled)
+        statuses[status] = statuses.get(status, 0) + 1
+        outcomes[i] = status
+
+    await asyncio.gather(*(one(i, at) for i, at in enumerate(send_times)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(send_times),
+        'concurrency': concurrency,
+        'errors': sum(count for status, count in statuses.items() if not status.startswith(('2', '3'))),
+        'statuses': statuses,
+        'outcomes': outcomes,
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(send_times) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            'p50': round(percentile(latencies, 50) * 1000, 2),
+            'p95': round(percentile(latencies, 95) * 1000, 2),
+            'p99': round(percentile(latencies, 99) * 1000, 2),
+            'max': round(max(latencies, default=0) * 1000, 2),
+        },
+        'rss_mb': round(rss_mb(), 1),
+        'rss_delta_mb': round(rss_mb() - rss_before, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+async def replay(directory: str, speed: float = 1.0, concurrency: int = 8, max_gap: float = 5.0,
+                 latency: bool = False, ai_latency: float = 0.0) -> Dict[str, Any]:
+    """Replay a capture and compare the outcome with what was recorded."""
+    import main
+    import pipeline
+    from capture import ResponseStore, ReplayAdapter
+
+    records = load_capture(directory)
+    if not records:
+        raise ValueError(f"No analysis requests captured in {directory}")
+
+    saved_adapter = pipeline.fetch_adapter
+    pipeline.fetch_adapter = ReplayAdapter(ResponseStore(directory), latency=latency)
+    try:
+        with offline(main, ai_latency) as (fake_redis, _):
+            transport = httpx.ASGITransport(app=main.app)
+            async with main.app.router.lifespan_context(main.app), \
+                    httpx.AsyncClient(transport=transport, base_url='http://replay', timeout=300) as client:
+                def send(i: int):
+                    return client.post('/api/analyze', json={'url': records[i]['url'], 'settings': records[i]['settings']})
+
+                if speed > 0:
+                    result = await replay_on_schedule(send, schedule(records, speed, max_gap), concurrency)
+                else:
+                    result = await drive(send, len(records), concurrency)
+            cache = {'hits': fake_redis.hits, 'misses': fake_redis.misses}
+    finally:
+        pipeline.fetch_adapter = saved_adapter
+
+    captured_statuses = [str(record['status']) for record in records]
+    result['captured'] = {
+        'statuses': {status: captured_statuses.count(status) for status in set(captured_statuses)},
+        'cache_hits': sum(record.get('cache') == 'hit' for record in records),
+        'p50_ms': percentile([record['duration_ms'] for record in records if record.get('duration_ms')], 50),
+    }
+    result['cache'] = cache
+    outcomes = result.pop('outcomes', None)
+    if outcomes is not None:
+        result['status_mismatches'] = sum(a != b for a, b in zip(outcomes, captured_statuses))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('capture', help="directory written with TRAFFIC_CAPTURE_DIR")
+    parser.add_argument('--speed', type=float, default=1.0, help="rate multiplier; 0 sends as fast as --concurrency allows")
+    parser.add_argument('--concurrency', type=int, default=8, help="requests in flight at most")
+    parser.add_argument('--max-gap', type=float, default=5.0, help="idle gaps in the capture are cut to this many seconds")
+    parser.add_argument('--latency', action='store_true', help="serve pages as slowly as they were captured")
+    parser.add_argument('--ai-latency', type=float, default=0.0, help="seconds the fake OpenAI takes to answer")
+    parser.add_argument('--save', metavar='PATH', help="write the result as JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(replay(args.capture, args.speed, args.concurrency, args.max_gap, args.latency, args.ai_latency))
+    print_result('replay', result)
+    print(f"captured: {result['captured']}")
+    print(f"cache: {result['cache']}" + (f"  status mismatches: {result['status_mismatches']}"
+                                         if 'status_mismatches' in result else ''))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == '__main__':
+    main()
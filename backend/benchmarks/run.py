@@ -0,0 +1,261 @@
+"""Offline load benchmarks for the API.
+
+Serves a corpus of stub pages locally, runs the FastAPI app in-process with
+Redis and OpenAI replaced by fakes, and drives the analyze, batch and export
+endpoints at a fixed concurrency. Reports throughput, latency percentiles and
+memory per scenario:
+
+    cd backend
+    python -m benchmarks.run --requests 200 --concurrency 8
+    python -m benchmarks.run --save before          # benchmarks/baselines/before.json
+    python -m benchmarks.run --compare before       # diff against a saved run
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional, Dict, List, Any, Callable, Awaitable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='webanalyzer-bench-'), 'bench.db')}")
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+# One client drives all the load, so per-client limits would cap the run
+os.environ.setdefault('ADMISSION_ENABLED', 'false')
+
+import httpx
+
+from benchmarks.fakes import offline
+from benchmarks.stub_sites import StubServer, build_corpus
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+PAGES = ('/small', '/huge', '/links', '/slow', '/redirect')
+EXPORT_FORMATS = ('csv', 'json', 'pdf', 'excel')
+SCENARIOS = ('analyze_cold', 'analyze_warm', 'analyze_batch') + tuple(f'export_{f}' for f in EXPORT_FORMATS)
+BATCH_SIZE = 5
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of unsorted values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+def rss_mb() -> float:
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return peak_rss_mb()
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+async def drive(make_request: Callable[[int], Awaitable[httpx.Response]], requests: int,
+                concurrency: int) -> Dict[str, Any]:
+    """Issue `requests` calls from `concurrency` workers and time each one."""
+    counter = itertools.count()
+    latencies, statuses = [], {}
+
+    async def worker():
+        for i in iter(lambda: next(counter), None):
+            if i >= requests:
+                return
+            started = time.perf_counter()
+            try:
+                response = await make_request(i)
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(count for status, count in statuses.items() if not status.startswith(('2', '3'))),
+        'statuses': statuses,
+        'seconds': round(elapsed, 3),
+        'throughput': round(requests / elapsed, 2),
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 2),
+            'p50': round(percentile(latencies, 50) * 1000, 2),
+            'p95': round(percentile(latencies, 95) * 1000, 2),
+            'p99': round(percentile(latencies, 99) * 1000, 2),
+            'max': round(max(latencies) * 1000, 2),
+        },
+        'rss_mb': round(rss_mb(), 1),
+        'rss_delta_mb': round(rss_mb() - rss_before, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+async def seed_analyses(client: httpx.AsyncClient, site: StubServer, count: int) -> List[int]:
+    """Store `count` analyses, copied from real analyses of the corpus pages."""
+    import main
+    from models import SessionLocal, Analysis
+
+    templates = []
+    for path in ('/small', '/huge', '/links'):
+        response = await client.post('/api/analyze', json={'url': site.url(f"{path}?seed")})
+        response.raise_for_status()
+        templates.append(response.json()['analysis_id'])
+
+    with SessionLocal() as db:
+        rows = [db.get(Analysis, analysis_id) for analysis_id in templates]
+        copies = []
+        for i in range(count):
+            row = rows[i % len(rows)]
+            copies.append(Analysis(
+                url=row.url, final_url=row.final_url, title=row.title, status_code=row.status_code,
+                processing_time=row.processing_time, page_metadata=row.page_metadata, links=row.links,
+                images=row.images, content=row.content, headings=row.headings, stats=row.stats,
+                ai_insights=row.ai_insights, analysis_settings=row.analysis_settings
+            ))
+        db.add_all(copies)
+        db.commit()
+        return [copy.id for copy in copies]
+
+def scenario_request(name: str, client: httpx.AsyncClient, site: StubServer, run_id: str,
+                     analysis_ids: List[int]) -> Callable[[int], Awaitable[httpx.Response]]:
+    def cold_url(i: int) -> str:
+        # A unique query string defeats the result cache; the stub ignores it
+        return site.url(f"{PAGES[i % len(PAGES)]}?run={run_id}&n={i}")
+
+    if name == 'analyze_cold':
+        return lambda i: client.post('/api/analyze', json={'url': cold_url(i)})
+    if name == 'analyze_warm':
+        return lambda i: client.post('/api/analyze', json={'url': site.url(PAGES[i % len(PAGES)])})
+    if name == 'analyze_batch':
+        return lambda i: client.post('/api/analyze/batch', json={
+            'urls': [site.url(f"{PAGES[j % len(PAGES)]}?run={run_id}&batch={i}&n={j}") for j in range(BATCH_SIZE)]
+        })
+    if name.startswith('export_'):
+        format = name.split('_', 1)[1]
+        # Each request exports a different analysis, so the artifact cache never answers
+        return lambda i: client.post(f'/api/export/{analysis_ids[i]}', params={'format': format})
+    raise ValueError(f"Unknown scenario: {name}")
+
+async def run_suite(scenarios=SCENARIOS, requests: int = 100, concurrency: int = 8,
+                    ai_latency: float = 0.05) -> Dict[str, Any]:
+    """Run the given scenarios and return their results, keyed by scenario."""
+    import main
+
+    results = {}
+    run_id = str(time.time_ns())
+    with StubServer(build_corpus()) as site, offline(main, ai_latency), \
+            tempfile.TemporaryDirectory(prefix='webanalyzer-bench-exports-') as export_dir:
+        saved_export_dir = main.artifact_cache.directory
+        main.artifact_cache.directory = export_dir
+        transport = httpx.ASGITransport(app=main.app)
+        try:
+            async with main.app.router.lifespan_context(main.app), \
+                    httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=300) as client:
+                exports = [name for name in scenarios if name.startswith('export_')]
+                analysis_ids = await seed_analyses(client, site, requests * len(exports)) if exports else []
+                if 'analyze_warm' in scenarios:
+                    for path in PAGES:
+                        await client.post('/api/analyze', json={'url': site.url(path)})
+
+                for name in scenarios:
+                    ids = []
+                    if name in exports:
+                        position = exports.index(name)
+                        ids = analysis_ids[position * requests:(position + 1) * requests]
+                    results[name] = await drive(
+                        scenario_request(name, client, site, run_id, ids), requests, concurrency
+                    )
+                    print_result(name, results[name])
+        finally:
+            main.artifact_cache.directory = saved_export_dir
+    return results
+
+def print_result(name: str, result: Dict[str, Any]) -> None:
+    latency = result['latency_ms']
+    print(f"{name:15} {result['throughput']:8.1f} req/s  p50 {latency['p50']:8.1f}  p95 {latency['p95']:8.1f}  "
+          f"p99 {latency['p99']:8.1f} ms  errors {result['errors']:3}  rss {result['rss_mb']:6.0f} MB "
+          f"({result['rss_delta_mb']:+.0f})", flush=True)
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+def baseline_path(name: str) -> str:
+    return name if name.endswith('.json') else os.path.join(BASELINE_DIR, f"{name}.json")
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print the change per scenario; return the scenarios that regressed beyond `threshold`."""
+    regressions = []
+    print(f"\nvs baseline {baseline['environment'].get('commit')} ({baseline['environment'].get('created_at')})")
+    for name, result in current.items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        throughput = result['throughput'] / before['throughput'] - 1 if before['throughput'] else 0.0
+        p95 = result['latency_ms']['p95'] / before['latency_ms']['p95'] - 1 if before['latency_ms']['p95'] else 0.0
+        regressed = throughput < -threshold or p95 > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:15} throughput {throughput:+7.1%}  p95 {p95:+7.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument('--requests', type=int, default=100, help="requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--ai-latency', type=float, default=0.05, help="seconds the fake OpenAI takes to answer")
+    parser.add_argument('--save', metavar='NAME', help="save results as a baseline")
+    parser.add_argument('--compare', metavar='NAME', help="compare against a saved baseline")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = asyncio.run(run_suite(scenarios, args.requests, args.concurrency, args.ai_latency))
+    report = {
+        'environment': environment(),
+        'parameters': {'requests': args.requests, 'concurrency': args.concurrency, 'ai_latency': args.ai_latency},
+        'scenarios': results,
+    }
+
+    if args.save:
+        path = baseline_path(args.save)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline to {path}")
+
+    if args.compare:
+        with open(baseline_path(args.compare)) as f:
+            baseline = json.load(f)
+        if baseline.get('parameters') != report['parameters']:
+            print(f"warning: baseline parameters differ: {baseline.get('parameters')}")
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
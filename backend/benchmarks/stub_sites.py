@@ -0,0 +1,135 @@
+"""Local stand-ins for the sites WebAnalyzer fetches.
+
+`StubHandler` backs the `stub_site` test fixture and the benchmark corpus, so
+neither needs network access.
+"""
+import ssl
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Dict, Any
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves `server.routes`: path -> HTML string or dict(status, headers, body, delay, ...).
+
+    `delay` is waited before the response headers, `body_delay` between the
+    headers and the body. `head: False` refuses HEAD with 405; `ranges: True`
+    answers `Range: bytes=a-b` with a 206 partial body. A list of routes is
+    served one entry per request, repeating the last. Paths with a query
+    string fall back to the route for the bare path.
+    """
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        route = self.server.routes.get(self.path)
+        if route is None and '?' in self.path:
+            route = self.server.routes.get(self.path.split('?', 1)[0])
+        if isinstance(route, list):
+            route = route.pop(0) if len(route) > 1 else route[0]
+        if route is None:
+            route = {'status': 404, 'body': 'Not found'}
+        elif isinstance(route, str):
+            route = {'body': route}
+
+        if self.command == 'HEAD' and route.get('head') is False:
+            route = {'status': 405, 'body': 'Method not allowed'}
+
+        if route.get('delay'):
+            time.sleep(route['delay'])
+        body = route.get('body', '')
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        status = route.get('status', 200)
+        headers = {'Content-Type': 'text/html; charset=utf-8'}
+        byte_range = self.headers.get('Range', '')
+        if route.get('ranges') and status == 200 and byte_range.startswith('bytes='):
+            start, _, end = byte_range[6:].partition('-')
+            start, end = int(start), min(int(end or len(body) - 1), len(body) - 1)
+            headers['Content-Range'] = f"bytes {start}-{end}/{len(body)}"
+            status, body = 206, body[start:end + 1]
+
+        self.send_response(status)
+        headers.update(route.get('headers', {}))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if route.get('body_delay'):
+            self.wfile.flush()
+            time.sleep(route['body_delay'])
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    do_HEAD = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+class KeepAliveStubHandler(StubHandler):
+    protocol_version = 'HTTP/1.1'
+
+class StubServer(ThreadingHTTPServer):
+    """`StubHandler` on a free local port; `keep_alive` serves HTTP/1.1, `ssl_context` HTTPS."""
+    daemon_threads = True
+
+    def __init__(self, routes: Dict[str, Any] = None, keep_alive: bool = False,
+                 ssl_context: Optional[ssl.SSLContext] = None):
+        super().__init__(('127.0.0.1', 0), KeepAliveStubHandler if keep_alive else StubHandler)
+        if ssl_context is not None:
+            self.socket = ssl_context.wrap_socket(self.socket, server_side=True)
+        self.scheme = 'https' if ssl_context is not None else 'http'
+        self.routes = routes if routes is not None else {}
+        self.requests = []
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def url(self, path: str = '/') -> str:
+        return f"{self.scheme}://127.0.0.1:{self.server_port}{path}"
+
+    def start(self) -> 'StubServer':
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+WORDS = ("analysis performance latency throughput crawler parser metadata canonical "
+         "structured content heading paragraph navigation accessibility").split()
+
+def paragraph(seed: int, words: int = 60) -> str:
+    return ' '.join(WORDS[(seed * 7 + i * 3) % len(WORDS)] for i in range(words)).capitalize() + '.'
+
+def page(title: str, body: str, description: str = "A benchmark page") -> str:
+    return (f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{title}</title>'
+            f'<meta name="description" content="{description}">'
+            f'<meta name="viewport" content="width=device-width, initial-scale=1">'
+            f'<meta property="og:title" content="{title}">'
+            f'<link rel="canonical" href="/{title.lower()}"></head><body>{body}</body></html>')
+
+def build_corpus() -> Dict[str, Any]:
+    """Routes for a small, huge, link-heavy, slow and redirecting page."""
+    small = page("Small", "<h1>Small page</h1>" + ''.join(f"<p>{paragraph(i)}</p>" for i in range(5))
+                 + '<img src="/logo.png" alt="Logo"><a href="/about">About</a>')
+    huge = page("Huge", "<h1>Huge page</h1>" + ''.join(
+        f"<h2>Section {i}</h2><p>{paragraph(i, 200)}</p>" + (f'<img src="/img/{i}.jpg">' if i % 10 == 0 else '')
+        for i in range(1500)
+    ))
+    links = page("Links", "<h1>Link hub</h1><ul>" + ''.join(
+        f'<li><a href="/{"page" if i % 4 else "https://external.example/page"}/{i}" title="Page {i}">Page {i}</a></li>'
+        for i in range(3000)
+    ) + "</ul>")
+    return {
+        '/small': small,
+        '/huge': huge,
+        '/links': links,
+        '/slow': {'body': small, 'delay': 0.25},
+        '/redirect': {'status': 301, 'headers': {'Location': '/redirect/2'}},
+        '/redirect/2': {'status': 302, 'headers': {'Location': '/small'}},
+    }
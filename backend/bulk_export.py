@@ -0,0 +1,278 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Iterator
+
+from pydantic import BaseModel
+from sqlalchemy import select, or_
+from sqlalchemy.orm import Session
+
+from models import Analysis, SEOScore
+
+BULK_FORMATS = ('parquet', 'arrow', 'excel')
+
+# Excel's hard row limit per sheet; longer tables continue on a new sheet
+EXCEL_MAX_ROWS = 1048576
+
+# Columns of each exported table, with pyarrow type aliases. pyarrow and
+# openpyxl are imported by the sinks, only when a bulk export runs.
+TABLES = {
+    'pages': [
+        ('analysis_id', 'int64'),
+        ('url', 'string'),
+        ('final_url', 'string'),
+        ('title', 'string'),
+        ('status_code', 'int32'),
+        ('processing_time', 'double'),
+        ('created_at', 'timestamp[us]'),
+        ('language', 'string'),
+        ('canonical', 'string'),
+        ('meta_description', 'string'),
+        ('content_length', 'int64'),
+        ('link_count', 'int32'),
+        ('internal_link_count', 'int32'),
+        ('external_link_count', 'int32'),
+        ('image_count', 'int32'),
+        ('images_without_alt', 'int32'),
+        ('seo_score', 'int32'),
+        ('seo_grade', 'string'),
+    ],
+    'links': [
+        ('analysis_id', 'int64'),
+        ('position', 'int32'),
+        ('text', 'string'),
+        ('href', 'string'),
+        ('full_url', 'string'),
+        ('title', 'string'),
+        ('rel', 'string'),
+        ('target', 'string'),
+        ('is_internal', 'bool'),
+    ],
+    'images': [
+        ('analysis_id', 'int64'),
+        ('position', 'int32'),
+        ('src', 'string'),
+        ('full_url', 'string'),
+        ('alt', 'string'),
+        ('title', 'string'),
+        ('width', 'string'),
+        ('height', 'string'),
+        ('loading', 'string'),
+    ],
+    'headings': [
+        ('analysis_id', 'int64'),
+        ('level', 'int8'),
+        ('position', 'int32'),
+        ('text', 'string'),
+        ('id', 'string'),
+    ],
+}
+
+class BulkExportFilter(BaseModel):
+    ids: Optional[List[int]] = None
+    domain: Optional[str] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+def escape_like(value: str) -> str:
+    """`value` as a literal in a LIKE pattern escaped with a backslash."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def filtered_query(export_filter: BulkExportFilter):
+    """Select the columns bulk exports need, restricted by the filter.
+
+    Page text (`Analysis.content`) is never loaded; it is the largest column
+    and none of the exported tables use it.
+    """
+    query = select(
+        Analysis.id, Analysis.url, Analysis.final_url, Analysis.title, Analysis.status_code,
+        Analysis.processing_time, Analysis.created_at, Analysis.page_metadata, Analysis.links,
+        Analysis.images, Analysis.headings, Analysis.stats, SEOScore.score, SEOScore.grade
+    ).outerjoin(SEOScore, SEOScore.analysis_id == Analysis.id)
+
+    if export_filter.ids is not None:
+        query = query.where(Analysis.id.in_(export_filter.ids))
+    if export_filter.domain:
+        domain = escape_like(export_filter.domain.lower().strip('/'))
+        query = query.where(or_(*(
+            Analysis.url.like(f"{scheme}://{domain}{suffix}", escape='\\')
+            for scheme in ('http', 'https') for suffix in ('', '/%', ':%', '?%')
+        )))
+    if export_filter.start:
+        query = query.where(Analysis.created_at >= export_filter.start)
+    if export_filter.end:
+        query = query.where(Analysis.created_at < export_filter.end)
+    return query
+
+def iter_chunks(db: Session, export_filter: BulkExportFilter, chunk_size: int = 1000) -> Iterator[List[Any]]:
+    """Stream matching rows in id order, one chunk at a time (keyset pagination)."""
+    query = filtered_query(export_filter).order_by(Analysis.id).limit(chunk_size)
+    last_id = 0
+    while True:
+        rows = db.execute(query.where(Analysis.id > last_id)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+        db.expunge_all()
+
+def flatten(rows: List[Any]) -> Dict[str, Dict[str, list]]:
+    """Turn a chunk of rows into column lists for each table."""
+    columns = {name: {field: [] for field, _ in fields} for name, fields in TABLES.items()}
+
+    def append(table: str, **values):
+        for field, column in columns[table].items():
+            column.append(values.get(field))
+
+    for row in rows:
+        metadata = row.page_metadata or {}
+        links = row.links or {}
+        images = row.images or {}
+        append(
+            'pages',
+            analysis_id=row.id, url=row.url, final_url=row.final_url, title=row.title,
+            status_code=row.status_code, processing_time=row.processing_time, created_at=row.created_at,
+            language=metadata.get('language'), canonical=metadata.get('canonical'),
+            meta_description=(metadata.get('meta_tags') or {}).get('description'),
+            content_length=(row.stats or {}).get('content_length'),
+            link_count=links.get('total'), internal_link_count=links.get('total_internal'),
+            external_link_count=links.get('total_external'), image_count=images.get('total'),
+            images_without_alt=images.get('without_alt'), seo_score=row.score, seo_grade=row.grade
+        )
+        for position, link in enumerate(links.get('all') or []):
+            rel = link.get('rel')
+            append(
+                'links', analysis_id=row.id, position=position, text=link.get('text'), href=link.get('href'),
+                full_url=link.get('full_url'), title=link.get('title'),
+                rel=' '.join(rel) if isinstance(rel, list) else rel,
+                target=link.get('target'), is_internal=link.get('is_internal')
+            )
+        for position, image in enumerate(images.get('images') or []):
+            append(
+                'images', analysis_id=row.id, position=position, src=image.get('src'),
+                full_url=image.get('full_url'), alt=image.get('alt'), title=image.get('title'),
+                width=_string(image.get('width')), height=_string(image.get('height')),
+                loading=image.get('loading')
+            )
+        position = 0
+        for level in range(1, 7):
+            for heading in (row.headings or {}).get(f'h{level}') or []:
+                append('headings', analysis_id=row.id, level=level, position=position,
+                       text=heading.get('text'), id=heading.get('id'))
+                position += 1
+    return columns
+
+def _string(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+def arrow_schema(name: str):
+    import pyarrow as pa
+    return pa.schema([(field, pa.type_for_alias(type_name)) for field, type_name in TABLES[name]])
+
+class ArrowSink:
+    """Writes each table to its own Parquet or Arrow IPC file, a record batch per chunk."""
+
+    def __init__(self, directory: str, format: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.format = format
+        self.schemas = {name: arrow_schema(name) for name in TABLES}
+        self.paths = {name: os.path.join(directory, f"{name}.{format}") for name in TABLES}
+        if format == 'parquet':
+            self.writers = {name: pq.ParquetWriter(self.paths[name], schema, compression='zstd')
+                            for name, schema in self.schemas.items()}
+        else:
+            self.writers = {name: pa.ipc.new_file(self.paths[name], schema) for name, schema in self.schemas.items()}
+
+    def write(self, columns: Dict[str, Dict[str, list]]) -> None:
+        import pyarrow as pa
+
+        for name, schema in self.schemas.items():
+            batch = pa.record_batch([pa.array(columns[name][f.name], type=f.type) for f in schema], schema=schema)
+            if batch.num_rows:
+                if self.format == 'parquet':
+                    self.writers[name].write_batch(batch)
+                else:
+                    self.writers[name].write(batch)
+
+    def close(self) -> List[str]:
+        for writer in self.writers.values():
+            writer.close()
+        return list(self.paths.values())
+
+class ExcelSink:
+    """Multi-sheet workbook written in openpyxl's constant-memory write-only mode."""
+
+    def __init__(self, directory: str):
+        from openpyxl import Workbook
+
+        self.path = os.path.join(directory, "analyses.xlsx")
+        self.workbook = Workbook(write_only=True)
+        self.sheets = {}
+        self.rows = {}
+        self.parts = {}
+        for name in TABLES:
+            self._new_sheet(name)
+
+    def _new_sheet(self, name: str) -> None:
+        self.parts[name] = self.parts.get(name, 0) + 1
+        title = name.capitalize() if self.parts[name] == 1 else f"{name.capitalize()} ({self.parts[name]})"
+        sheet = self.workbook.create_sheet(title)
+        sheet.append([field for field, _ in TABLES[name]])
+        self.sheets[name] = sheet
+        self.rows[name] = 1
+
+    def write(self, columns: Dict[str, Dict[str, list]]) -> None:
+        for name, table in columns.items():
+            for row in zip(*table.values()):
+                if self.rows[name] >= EXCEL_MAX_ROWS:
+                    self._new_sheet(name)
+                self.sheets[name].append(row)
+                self.rows[name] += 1
+
+    def close(self) -> List[str]:
+        self.workbook.save(self.path)
+        return [self.path]
+
+def export_bulk(db: Session, export_filter: BulkExportFilter, format: str,
+                directory: Optional[str] = None, chunk_size: int = 1000) -> Dict[str, Any]:
+    """Export every matching analysis, reading and writing one chunk at a time.
+
+    Parquet and Arrow exports are zipped (one file per table); Excel is a
+    single workbook with a sheet per table. Returns the output path and counts.
+    Without `directory`, a temporary one is made, and removed if the export fails.
+    """
+    if format not in BULK_FORMATS:
+        raise ValueError(f"Unsupported bulk export format: {format}")
+    own_directory = directory is None
+    directory = directory or tempfile.mkdtemp(prefix='webanalyzer-bulk-')
+    try:
+        sink = ExcelSink(directory) if format == 'excel' else ArrowSink(directory, format)
+        counts = {name: 0 for name in TABLES}
+
+        try:
+            for rows in iter_chunks(db, export_filter, chunk_size):
+                columns = flatten(rows)
+                sink.write(columns)
+                for name in TABLES:
+                    counts[name] += len(columns[name]['analysis_id'])
+        finally:
+            paths = sink.close()
+
+        if format == 'excel':
+            path = paths[0]
+        else:
+            path = os.path.join(directory, f"analyses-{format}.zip")
+            with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as archive:
+                for table_path in paths:
+                    archive.write(table_path, os.path.basename(table_path))
+                    os.remove(table_path)
+    except BaseException:
+        # Nobody will collect a half-written export; a caller's own directory is left to the caller
+        if own_directory:
+            shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return {"path": path, "rows": counts}
@@ -1,45 +1,144 @@
-import redis
 import json
 import hashlib
-from typing import Optional, Dict, Any
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterable
 from datetime import datetime, timedelta
 import os
+import logging
+
+from metrics import CACHE_REQUESTS
+from link_index import target_domain
+from logs import sampled_logger
+from json_responses import dumps, loads
+
+logger = logging.getLogger(__name__)
+# Hits and misses happen on every request, so only a sample is logged
+lookup_logger = sampled_logger('cache.lookups')
+
+# After a Redis error, a SharedCache only uses its in-process entries for this long
+REDIS_RETRY_INTERVAL = 30
+# Seconds to wait for Redis to connect and to answer; without them an unreachable
+# Redis hangs every cache lookup instead of failing over to a miss
+REDIS_CONNECT_TIMEOUT = float(os.getenv('REDIS_CONNECT_TIMEOUT', 0.5))
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 1))
+
+# Prefix of every analysis cache key, so the app can share a Redis database
+CACHE_NAMESPACE = os.getenv('CACHE_NAMESPACE', 'webanalyzer')
+# Bumped when the cached result format changes; entries of other versions are never read and expire
+CACHE_KEY_VERSION = int(os.getenv('CACHE_KEY_VERSION', 1))
+# Keys per SCAN/SSCAN call and per UNLINK when invalidating in bulk
+CACHE_INVALIDATE_BATCH = int(os.getenv('CACHE_INVALIDATE_BATCH', 500))
+
+def unlink_batches(client, keys: Iterable, indexes: Tuple[str, ...] = ()) -> int:
+    """UNLINK `keys` a pipelined batch at a time, also removing them from the sets `indexes`.
+
+    Returns how many of the keys existed. UNLINK frees memory off Redis' main
+    thread, so large invalidations don't stall other clients.
+    """
+    deleted, batch = 0, []
+    for key in keys:
+        batch.append(key)
+        if len(batch) >= CACHE_INVALIDATE_BATCH:
+            deleted += _unlink_batch(client, batch, indexes)
+            batch = []
+    if batch:
+        deleted += _unlink_batch(client, batch, indexes)
+    return deleted
+
+def _unlink_batch(client, keys: List, indexes: Tuple[str, ...]) -> int:
+    pipe = client.pipeline(transaction=False)
+    pipe.unlink(*keys)
+    for index in indexes:
+        pipe.srem(index, *keys)
+    return pipe.execute()[0]
+
+def scan_keys(client, pattern: str) -> Iterable:
+    return client.scan_iter(match=pattern, count=CACHE_INVALIDATE_BATCH)
+
+def _as_bytes(key) -> bytes:
+    return key if isinstance(key, bytes) else key.encode()
 
 class CacheManager:
     def __init__(self):
-        self.redis_client = redis.Redis(
-            host=os.getenv('REDIS_HOST', 'localhost'),
-            port=int(os.getenv('REDIS_PORT', 6379)),
-            decode_responses=True
-        )
+        self._redis_client = None
         self.default_ttl = int(os.getenv('CACHE_TTL', 3600))  # 1 hour default
 
+    @property
+    def redis_client(self):
+        # Created on first use, so importing the app doesn't import redis
+        if self._redis_client is None:
+            import redis
+            self._redis_client = redis.Redis(
+                host=os.getenv('REDIS_HOST', 'localhost'),
+                port=int(os.getenv('REDIS_PORT', 6379)),
+                socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                socket_timeout=REDIS_SOCKET_TIMEOUT
+            )
+        return self._redis_client
+
+    @redis_client.setter
+    def redis_client(self, client) -> None:
+        self._redis_client = client
+
+    @property
+    def prefix(self) -> str:
+        return f"{CACHE_NAMESPACE}:analysis:v{CACHE_KEY_VERSION}:"
+
     def _generate_key(self, url: str, settings: Dict[str, Any]) -> str:
         """Generate a unique cache key for the analysis."""
         # Create a hash of URL and settings to ensure uniqueness
         key_data = f"{url}_{json.dumps(settings, sort_keys=True)}"
-        return f"analysis:{hashlib.md5(key_data.encode()).hexdigest()}"
+        return f"{self.prefix}{hashlib.md5(key_data.encode()).hexdigest()}"
+
+    def _url_index_key(self, url: str) -> str:
+        """The set of keys cached for `url`, under any settings."""
+        from crawler import normalize_url  # crawler imports the pipeline, which imports this module
+
+        normalized = normalize_url(url) or url
+        return f"{self.prefix}url:{hashlib.md5(normalized.encode()).hexdigest()}"
+
+    def _domain_index_key(self, url_or_domain: str) -> str:
+        """The set of keys cached for every URL on a domain ("www." and case don't matter)."""
+        url = url_or_domain if '://' in url_or_domain else f"http://{url_or_domain}"
+        return f"{self.prefix}domain:{target_domain(url)}"
+
+    def _index_keys(self, url: str) -> Tuple[str, str]:
+        return self._url_index_key(url), self._domain_index_key(url)
 
     def get(self, url: str, settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Retrieve cached analysis result."""
+        payload = self.get_raw(url, settings)
+        return loads(payload) if payload is not None else None
+
+    def get_raw(self, url: str, settings: Dict[str, Any]) -> Optional[bytes]:
+        """Retrieve a cached analysis result as serialized JSON, ready to send as a response body.
+
+        Entries are stored as `<cached_at>\n<result JSON>`, so a hit needs no decoding.
+        """
         try:
             key = self._generate_key(url, settings)
             cached_data = self.redis_client.get(key)
 
             if cached_data:
-                data = json.loads(cached_data)
+                cached_at, _, payload = cached_data.partition(b'\n')
                 # Check if cache is still valid
-                if datetime.fromisoformat(data.get('cached_at', '')) + timedelta(seconds=self.default_ttl) > datetime.utcnow():
-                    print(f"✅ Cache hit for {url}")
-                    return data.get('result')
+                if payload and datetime.fromisoformat(cached_at.decode()) + timedelta(seconds=self.default_ttl) > datetime.utcnow():
+                    CACHE_REQUESTS.labels('hit').inc()
+                    lookup_logger.info("Cache hit", extra={'url': url, 'result': 'hit'})
+                    return payload
                 else:
                     # Cache expired, delete it
-                    self.redis_client.delete(key)
-                    print(f"⏰ Cache expired for {url}")
+                    unlink_batches(self.redis_client, [key], self._index_keys(url))
+                    CACHE_REQUESTS.labels('expired').inc()
+                    lookup_logger.info("Cache expired", extra={'url': url, 'result': 'expired'})
             else:
-                print(f"❌ Cache miss for {url}")
+                CACHE_REQUESTS.labels('miss').inc()
+                lookup_logger.info("Cache miss", extra={'url': url, 'result': 'miss'})
         except Exception as e:
-            print(f"⚠️ Cache error: {e}")
+            CACHE_REQUESTS.labels('error').inc()
+            logger.warning("Cache error: %s", e)
 
         return None
 
@@ -47,51 +146,177 @@ class CacheManager:
         """Store analysis result in cache."""
         try:
             key = self._generate_key(url, settings)
-            cache_data = {
-                'result': result,
-                'cached_at': datetime.utcnow().isoformat()
-            }
+            cache_data = datetime.utcnow().isoformat().encode() + b'\n' + dumps(result)
 
             ttl = ttl or self.default_ttl
-            success = self.redis_client.setex(
-                key,
-                ttl,
-                json.dumps(cache_data, default=str)
-            )
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.setex(key, ttl, cache_data)
+            # Index sets get each new entry's TTL, so they expire with the last of them
+            for index in self._index_keys(url):
+                pipe.sadd(index, key)
+                pipe.expire(index, ttl)
+            success = pipe.execute()[0]
 
             if success:
-                print(f"💾 Cached result for {url} (TTL: {ttl}s)")
+                logger.debug("Cached result", extra={'url': url, 'ttl': ttl})
             return success
         except Exception as e:
-            print(f"⚠️ Cache set error: {e}")
+            logger.warning("Cache set error: %s", e)
             return False
 
     def delete(self, url: str, settings: Dict[str, Any]) -> bool:
         """Delete specific cache entry."""
         try:
-            key = self._generate_key(url, settings)
-            return bool(self.redis_client.delete(key))
+            return bool(unlink_batches(self.redis_client, [self._generate_key(url, settings)], self._index_keys(url)))
         except Exception as e:
-            print(f"⚠️ Cache delete error: {e}")
+            logger.warning("Cache delete error: %s", e)
             return False
 
-    def clear_all(self) -> bool:
-        """Clear all cache entries."""
+    def invalidate_url(self, url: str) -> int:
+        """Delete the cached results of `url` under every settings variant; returns how many."""
         try:
-            return bool(self.redis_client.flushdb())
+            return self._unlink_members(*self._index_keys(url))
         except Exception as e:
-            print(f"⚠️ Cache clear error: {e}")
-            return False
+            logger.warning("Cache invalidate error: %s", e)
+            return 0
+
+    def invalidate_domain(self, domain: str) -> int:
+        """Delete the cached results of every URL on `domain`; returns how many.
+
+        Per-URL index sets may keep the deleted keys as members; they expire
+        with their last entry, and unlinking a missing key again is harmless.
+        """
+        try:
+            return self._unlink_members(self._domain_index_key(domain))
+        except Exception as e:
+            logger.warning("Cache invalidate error: %s", e)
+            return 0
+
+    def clear_all(self) -> int:
+        """Delete every analysis cache entry and index, leaving the rest of the database alone.
+
+        Keys are found with SCAN and removed with UNLINK in batches, so Redis
+        isn't blocked on a large keyspace the way FLUSHDB would block it.
+        Returns how many keys were removed.
+        """
+        try:
+            deleted = unlink_batches(self.redis_client, scan_keys(self.redis_client, f"{CACHE_NAMESPACE}:analysis:*"))
+            logger.info("Cache cleared", extra={'keys': deleted})
+            return deleted
+        except Exception as e:
+            logger.warning("Cache clear error: %s", e)
+            return 0
+
+    def _unlink_members(self, index: str, *other_indexes: str) -> int:
+        """Unlink the keys in the set `index`, then the set itself; the keys are also removed from `other_indexes`."""
+        client = self.redis_client
+        deleted = unlink_batches(client, client.sscan_iter(index, count=CACHE_INVALIDATE_BATCH), other_indexes)
+        client.unlink(index)
+        return deleted
+
+    def get_stats(self, count_entries: bool = False) -> Dict[str, Any]:
+        """Get cache statistics.
 
-    def get_stats(self) -> Dict[str, Any]:
-        """Get cache statistics."""
+        `database_keys` counts the whole Redis database, which other apps may
+        share. With `count_entries`, the analyses cached under this key version
+        are counted too, with a SCAN of the namespace.
+        """
         try:
             info = self.redis_client.info()
-            return {
-                'keys': self.redis_client.dbsize(),
+            hits, misses = info.get('keyspace_hits', 0), info.get('keyspace_misses', 0)
+            stats = {
+                'database_keys': self.redis_client.dbsize(),
                 'memory_used': info.get('used_memory_human', 'Unknown'),
-                'hit_rate': info.get('keyspace_hits', 0) / (info.get('keyspace_hits', 0) + info.get('keyspace_misses', 1))
+                # A fresh server reports no hits and no misses
+                'hit_rate': hits / max(hits + misses, 1)
             }
+            if count_entries:
+                indexes = (f"{self.prefix}url:".encode(), f"{self.prefix}domain:".encode())
+                stats['entries'] = sum(1 for key in scan_keys(self.redis_client, self.prefix + '*')
+                                       if not _as_bytes(key).startswith(indexes))
+            return stats
         except Exception as e:
-            print(f"⚠️ Cache stats error: {e}")
+            logger.warning("Cache stats error: %s", e)
             return {}
+
+class SharedCache:
+    """Small JSON values by key, with a TTL: an in-process LRU in front of Redis.
+
+    Redis shares entries between workers; if it fails, the LRU alone is used
+    until `REDIS_RETRY_INTERVAL` has passed. Redis keys are namespaced with
+    `CACHE_NAMESPACE` and `prefix`.
+    """
+
+    def __init__(self, prefix: str, ttl: int, max_size: int, get_redis: Optional[Callable[[], Any]] = None):
+        self.name = prefix.rstrip(':')
+        self.prefix = f"{CACHE_NAMESPACE}:{prefix}"
+        self.ttl = ttl
+        self.max_size = max_size
+        self.get_redis = get_redis
+        self.local: 'OrderedDict[str, Tuple[Any, float]]' = OrderedDict()
+        self.lock = threading.Lock()
+        self._redis_retry_at = 0.0
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        found = {}
+        now = time.monotonic()
+        with self.lock:
+            for key in keys:
+                entry = self.local.get(key)
+                if entry is not None and entry[1] > now:
+                    self.local.move_to_end(key)
+                    found[key] = entry[0]
+        missing = [key for key in keys if key not in found]
+        client = self._redis()
+        if missing and client is not None:
+            try:
+                for key, value in zip(missing, client.mget([self.prefix + key for key in missing])):
+                    if value is not None:
+                        found[key] = loads(value)
+                        self._remember(key, found[key], self.ttl)
+            except Exception as e:
+                self._redis_failed(e)
+        return found
+
+    def set_many(self, values: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        ttl = ttl or self.ttl
+        for key, value in values.items():
+            self._remember(key, value, ttl)
+        client = self._redis()
+        if values and client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for key, value in values.items():
+                    pipe.setex(self.prefix + key, ttl, dumps(value))
+                pipe.execute()
+            except Exception as e:
+                self._redis_failed(e)
+
+    def clear(self) -> int:
+        """Drop the in-process entries and this cache's Redis keys; returns how many keys were removed."""
+        with self.lock:
+            self.local.clear()
+        client = self._redis()
+        if client is None:
+            return 0
+        try:
+            return unlink_batches(client, scan_keys(client, self.prefix + '*'))
+        except Exception as e:
+            self._redis_failed(e)
+            return 0
+
+    def _remember(self, key: str, value: Any, ttl: int) -> None:
+        with self.lock:
+            self.local[key] = (value, time.monotonic() + ttl)
+            self.local.move_to_end(key)
+            if len(self.local) > self.max_size:
+                self.local.popitem(last=False)
+
+    def _redis(self):
+        if self.get_redis is None or time.monotonic() < self._redis_retry_at:
+            return None
+        return self.get_redis()
+
+    def _redis_failed(self, error: Exception) -> None:
+        self._redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+        logger.warning("%s cache falling back to in-process entries: %s", self.name, error)
@@ -0,0 +1,177 @@
+import gzip
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# When set, analysis requests are appended to <dir>/requests.jsonl and fetched
+# pages kept under <dir>/responses/, for replay with `python -m benchmarks.replay`
+TRAFFIC_CAPTURE_DIR = os.getenv('TRAFFIC_CAPTURE_DIR')
+CAPTURE_FLUSH_INTERVAL = 0.5
+# Response headers the analyzers or redirects depend on; others aren't stored
+STORED_HEADERS = ('content-type', 'location', 'server', 'etag', 'last-modified')
+
+class TrafficRecorder:
+    """Appends request records and fetched responses from a background thread.
+
+    The request path only enqueues; hashing, compression and file writes
+    happen on the writer thread.
+    """
+
+    def __init__(self, directory: str, interval: float = CAPTURE_FLUSH_INTERVAL):
+        self.directory = directory
+        self.bodies = os.path.join(directory, 'responses', 'bodies')
+        os.makedirs(self.bodies, exist_ok=True)
+        self.queue = queue.SimpleQueue()
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='traffic-capture', daemon=True)
+        self.thread.start()
+
+    def record_request(self, endpoint: str, url: str, settings: Dict[str, Any], status: int,
+                       cache: str, timings: Optional[Dict[str, float]] = None, error: Optional[str] = None,
+                       ts: Optional[datetime] = None) -> None:
+        """Record a finished request; `ts` is when it arrived, which replay schedules by."""
+        self.queue.put(('request', {
+            'ts': (ts or datetime.utcnow()).isoformat(),
+            'endpoint': endpoint,
+            'url': url,
+            'settings': settings,
+            'status': status,
+            'cache': cache,
+            'duration_ms': (timings or {}).get('total'),
+            'timings': timings,
+            'error': error,
+        }))
+
+    def record_response(self, response: requests.Response) -> None:
+        """Store a fetched response and each redirect hop that led to it."""
+        for hop in list(response.history) + [response]:
+            self.queue.put(('response', {
+                'url': hop.url,
+                'status': hop.status_code,
+                'reason': hop.reason,
+                'headers': {name: hop.headers[name] for name in STORED_HEADERS if name in hop.headers},
+                'elapsed_ms': round(hop.elapsed.total_seconds() * 1000, 1),
+                'captured_at': datetime.utcnow().isoformat(),
+            }, hop.content))
+
+    def stop(self) -> None:
+        """Write out everything recorded so far and stop the writer."""
+        self.stopping.set()
+        self.thread.join()
+
+    def _run(self) -> None:
+        while not self.stopping.wait(self.interval):
+            self._flush()
+        self._flush()
+
+    def _flush(self) -> None:
+        requests_lines, response_lines = [], []
+        while True:
+            try:
+                kind, entry, *body = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'request':
+                requests_lines.append(json.dumps(entry, default=str))
+            else:
+                entry['body'] = self._store_body(body[0])
+                response_lines.append(json.dumps(entry))
+        if requests_lines:
+            with open(os.path.join(self.directory, 'requests.jsonl'), 'a', encoding='utf-8') as f:
+                f.write('\n'.join(requests_lines) + '\n')
+        if response_lines:
+            with open(os.path.join(self.directory, 'responses', 'index.jsonl'), 'a', encoding='utf-8') as f:
+                f.write('\n'.join(response_lines) + '\n')
+
+    def _store_body(self, body: bytes) -> Optional[str]:
+        # Bodies are content-addressed, so unchanged pages are stored once
+        if not body:
+            return None
+        digest = hashlib.sha256(body).hexdigest()
+        path = os.path.join(self.bodies, f"{digest}.gz")
+        if not os.path.exists(path):
+            with gzip.open(path + '.tmp', 'wb') as f:
+                f.write(body)
+            os.replace(path + '.tmp', path)
+        return digest
+
+class ResponseStore:
+    """Read side of a capture's response store: the latest response per URL."""
+
+    def __init__(self, directory: str):
+        self.directory = os.path.join(directory, 'responses')
+        self.responses: Dict[str, Dict[str, Any]] = {}
+        with open(os.path.join(self.directory, 'index.jsonl'), encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.responses[entry['url']] = entry
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        return self.responses.get(url)
+
+    def body(self, entry: Dict[str, Any]) -> bytes:
+        if not entry.get('body'):
+            return b''
+        with gzip.open(os.path.join(self.directory, 'bodies', f"{entry['body']}.gz"), 'rb') as f:
+            return f.read()
+
+class ReplayAdapter(BaseAdapter):
+    """`requests` transport that answers from a `ResponseStore` instead of the network.
+
+    Redirect hops are stored individually, so requests follows them as usual.
+    URLs missing from the store fail like an unreachable host. With
+    `latency=True` each response takes as long as it did when captured.
+    """
+
+    def __init__(self, store: ResponseStore, latency: bool = False):
+        super().__init__()
+        self.store = store
+        self.latency = latency
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        entry = self.store.get(request.url)
+        if entry is None:
+            raise requests.ConnectionError(f"{request.url} is not in the recorded response store", request=request)
+        if self.latency and entry.get('elapsed_ms'):
+            time.sleep(entry['elapsed_ms'] / 1000)
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = entry.get('reason')
+        response.headers = CaseInsensitiveDict(entry.get('headers') or {})
+        response._content = self.store.body(entry)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+# The active recorder, if capture is on
+recorder: Optional[TrafficRecorder] = None
+
+def start(directory: Optional[str] = TRAFFIC_CAPTURE_DIR) -> Optional[TrafficRecorder]:
+    global recorder
+    if directory and recorder is None:
+        recorder = TrafficRecorder(directory)
+    return recorder
+
+def stop() -> None:
+    global recorder
+    if recorder is not None:
+        recorder.stop()
+        recorder = None
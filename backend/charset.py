@@ -0,0 +1,116 @@
+"""Character encoding detection and decoding for fetched pages.
+
+`response.text` runs a statistical detector over the whole body when the
+server sends no charset, which is slow on large pages. Here the encoding comes
+from the first of these that gives one, looking at no more than a bounded
+prefix of the body:
+
+1. the `charset` parameter of the Content-Type header
+2. a byte order mark
+3. a `<meta charset>` or `http-equiv` declaration in the first `CHARSET_SNIFF_BYTES`
+4. a detector run over the first `CHARSET_SAMPLE_BYTES`, after a quick UTF-8 check
+
+The body is then decoded once, with undecodable bytes replaced.
+"""
+import codecs
+import os
+import re
+from typing import Optional, Dict, Tuple
+
+try:
+    import charset_normalizer
+except ImportError:  # installed with requests; without it, non-UTF-8 pages fall back to windows-1252
+    charset_normalizer = None
+
+# How far into the body to look for a <meta> charset declaration
+CHARSET_SNIFF_BYTES = int(os.getenv('CHARSET_SNIFF_BYTES', 4096))
+# How much of the body the detector sees when nothing declares an encoding
+CHARSET_SAMPLE_BYTES = int(os.getenv('CHARSET_SAMPLE_BYTES', 32768))
+
+DEFAULT_ENCODING = 'cp1252'
+
+# Labels browsers treat as windows-1252, its superset
+WINDOWS_1252_ALIASES = {'ascii': 'cp1252', 'iso8859-1': 'cp1252'}
+
+# UTF-32 first: its little-endian BOM starts with UTF-16's
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+META_CHARSET = re.compile(rb'<meta\s[^>]*?charset\s*=\s*["\']?\s*([a-z0-9_.:-]+)', re.IGNORECASE)
+
+def lookup(label: Optional[str]) -> Optional[str]:
+    """Python's codec name for an encoding label, or None if it isn't a text encoding."""
+    if not label:
+        return None
+    try:
+        info = codecs.lookup(label.strip().strip('"\''))
+    except LookupError:
+        return None
+    if not info._is_text_encoding:  # base64, rot13 and the like
+        return None
+    return WINDOWS_1252_ALIASES.get(info.name, info.name)
+
+def header_charset(content_type: str) -> Optional[str]:
+    """The raw `charset` parameter of a Content-Type value."""
+    for param in content_type.split(';')[1:]:
+        name, _, value = param.strip().partition('=')
+        if name.strip().lower() == 'charset' and value:
+            return value.strip('"\' ')
+    return None
+
+def _bom(body: bytes) -> Optional[Tuple[bytes, str]]:
+    for bom, name in BOMS:
+        if body.startswith(bom):
+            return bom, name
+    return None
+
+def _meta_charset(body: bytes) -> Optional[str]:
+    match = META_CHARSET.search(body, 0, CHARSET_SNIFF_BYTES)
+    name = lookup(match.group(1).decode('ascii')) if match else None
+    # A document this regex could read isn't UTF-16, whatever it claims
+    if name and name.startswith('utf-16'):
+        return 'utf-8'
+    return name
+
+def _detect(body: bytes) -> Optional[str]:
+    sample = body[:CHARSET_SAMPLE_BYTES]
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # A character cut in two by the end of the sample doesn't count against UTF-8
+        if len(sample) < len(body) and e.reason == 'unexpected end of data':
+            return 'utf-8'
+    if charset_normalizer is None:
+        return None
+    match = charset_normalizer.from_bytes(sample).best()
+    return lookup(match.encoding) if match else None
+
+def detect(body: bytes, content_type: str = '') -> Tuple[str, str]:
+    """The body's encoding and where it came from: header, bom, meta, detected or default."""
+    name = lookup(header_charset(content_type))
+    if name:
+        return name, 'header'
+    bom = _bom(body)
+    if bom:
+        return bom[1], 'bom'
+    name = _meta_charset(body)
+    if name:
+        return name, 'meta'
+    name = _detect(body)
+    if name:
+        return name, 'detected'
+    return DEFAULT_ENCODING, 'default'
+
+def decode(body: bytes, content_type: str = '') -> Tuple[str, Dict[str, str]]:
+    """Decode a page body, returning the text and `{'name', 'source'}` for `performance.encoding`."""
+    name, source = detect(body, content_type)
+    bom = _bom(body)
+    start = len(bom[0]) if bom and bom[1] == name else 0
+    text = str(memoryview(body)[start:], name, 'replace')
+    return text, {'name': name, 'source': source}
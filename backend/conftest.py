@@ -0,0 +1,21 @@
+import os
+import tempfile
+
+import pytest
+
+# Keep test runs away from the development database.
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+# In-process broker instead of Redis for the job queue.
+os.environ.setdefault('CELERY_BROKER_URL', 'memory://')
+# Rate limits would trip on the suite's back-to-back requests; test_admission enables them itself.
+os.environ.setdefault('ADMISSION_ENABLED', 'false')
+# Minimum bcrypt cost, so registering and logging in don't slow the suite down.
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+
+from benchmarks.stub_sites import StubServer
+
+@pytest.fixture
+def stub_site():
+    """Start a local HTTP server; set `.routes` and use `.url(path)`."""
+    with StubServer() as server:
+        yield server
@@ -0,0 +1,374 @@
+import asyncio
+import hashlib
+import math
+import os
+import posixpath
+import time
+from collections import Counter, defaultdict
+from typing import Optional, Dict, List, Any, Tuple, Callable, TYPE_CHECKING
+from urllib.parse import urlsplit, urlunsplit, urljoin, parse_qsl, urlencode
+from urllib.robotparser import RobotFileParser
+
+from pydantic import BaseModel, Field
+
+import charset
+from models import SessionLocal
+from pipeline import AnalysisSettings, USER_AGENT, parse_html, build_result, compute_stats, analysis_record
+import seo
+import near_duplicates
+from metrics import record_fetch
+
+if TYPE_CHECKING:
+    import aiohttp
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Above this many pages the seen-set switches from an exact set to a Bloom filter.
+BLOOM_MIN_PAGES = 10000
+# Expected distinct URLs discovered per crawled page, used to size the Bloom filter.
+URLS_PER_PAGE = 20
+# Largest crawl a request may ask for; the seen-set is sized from max_pages up front
+MAX_CRAWL_PAGES = int(os.getenv('MAX_CRAWL_PAGES', 10000))
+MAX_CRAWL_DEPTH = int(os.getenv('MAX_CRAWL_DEPTH', 10))
+
+class CrawlSettings(BaseModel):
+    max_depth: int = Field(2, ge=0, le=MAX_CRAWL_DEPTH)
+    max_pages: int = Field(50, ge=1, le=MAX_CRAWL_PAGES)
+    concurrency: int = Field(5, ge=1, le=50)
+    requests_per_second: float = Field(2.0, ge=0.1, le=20)  # per host
+    respect_robots: bool = True
+    timeout: float = Field(15, ge=1, le=120)
+    analysis: AnalysisSettings = Field(default_factory=AnalysisSettings)
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """Canonicalize a URL for frontier de-duplication.
+
+    Lowercases scheme and host, drops default ports and fragments, resolves
+    dot segments and sorts the query. Returns None for non-HTTP(S) URLs.
+    """
+    if base:
+        url = urljoin(base, url)
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if scheme not in DEFAULT_PORTS or not host:
+        return None
+    if ':' in host:
+        host = f"[{host}]"
+    netloc = host if port in (None, DEFAULT_PORTS[scheme]) else f"{host}:{port}"
+
+    path = parts.path or '/'
+    normalized_path = posixpath.normpath(path)
+    if normalized_path.startswith('//'):
+        normalized_path = '/' + normalized_path.lstrip('/')
+    if path.endswith('/') and normalized_path != '/':
+        normalized_path += '/'
+    if normalized_path == '.':
+        normalized_path = '/'
+
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, normalized_path, query, ''))
+
+class BloomFilter:
+    """Fixed-size probabilistic set; may report false positives, never false negatives."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+def make_seen_set(max_pages: int):
+    """Exact set for small crawls, Bloom filter for large ones."""
+    if max_pages < BLOOM_MIN_PAGES:
+        return set()
+    return BloomFilter(max_pages * URLS_PER_PAGE)
+
+class RobotsCache:
+    """Fetches and caches robots.txt once per host."""
+
+    def __init__(self, session: 'aiohttp.ClientSession', user_agent: str):
+        self.session = session
+        self.user_agent = user_agent
+        self._parsers: Dict[str, RobotFileParser] = {}
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def _parser(self, url: str) -> RobotFileParser:
+        import aiohttp
+
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        async with self._locks[origin]:
+            if origin not in self._parsers:
+                parser = RobotFileParser(f"{origin}/robots.txt")
+                try:
+                    async with self.session.get(f"{origin}/robots.txt") as response:
+                        if response.status in (401, 403):
+                            parser.disallow_all = True
+                        elif response.status >= 400:
+                            parser.allow_all = True
+                        else:
+                            parser.parse((await response.text(errors='replace')).splitlines())
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    parser.allow_all = True
+                self._parsers[origin] = parser
+            return self._parsers[origin]
+
+    async def allowed(self, url: str) -> bool:
+        return (await self._parser(url)).can_fetch(self.user_agent, url)
+
+    async def crawl_delay(self, url: str) -> float:
+        return float((await self._parser(url)).crawl_delay(self.user_agent) or 0)
+
+class HostRateLimiter:
+    """Spaces out requests to the same host."""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self._next: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def wait(self, host: str, min_interval: float = 0) -> None:
+        interval = max(self.interval, min_interval)
+        if interval <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        async with self._locks[host]:
+            now = loop.time()
+            ready = self._next.get(host, now)
+            if ready > now:
+                await asyncio.sleep(ready - now)
+                now = ready
+            self._next[host] = now + interval
+
+class Crawler:
+    """Breadth-first crawl of a site's internal links through the analysis pipeline."""
+
+    def __init__(self, seed: str, settings: CrawlSettings, seo_engine=None, ai_analyzer=None,
+                 session_factory=SessionLocal, persist: bool = True,
+                 user_agent: str = USER_AGENT,
+                 save: Optional[Callable[[Dict[str, Any]], int]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None):
+        self.seed = normalize_url(seed)
+        if not self.seed:
+            raise ValueError(f"Invalid seed URL: {seed}")
+        self.host = urlsplit(self.seed).netloc
+        self.settings = settings
+        self.seo_engine = seo_engine
+        self.ai_analyzer = ai_analyzer
+        self.session_factory = session_factory
+        self.persist = persist
+        self.user_agent = user_agent
+        # `save` persists a page result and returns its analysis id; `should_stop`
+        # is polled before each page so callers can cancel a running crawl.
+        self.save = save or self._save
+        self.should_stop = should_stop
+        self.stopped = False
+
+        self.frontier: asyncio.Queue = asyncio.Queue()
+        self.seen = make_seen_set(settings.max_pages)
+        self.limiter = HostRateLimiter(settings.requests_per_second)
+        self.robots: Optional[RobotsCache] = None
+        self.scheduled = 0
+
+        self.pages: List[Dict[str, Any]] = []
+        self.errors: List[Dict[str, Any]] = []
+        self.blocked: List[str] = []
+        self.skipped: List[str] = []
+        self.inbound: Counter = Counter()
+        self.issues: Counter = Counter()
+
+    async def run(self) -> Dict[str, Any]:
+        """Crawl until the frontier is exhausted or a limit is hit, then report."""
+        started = time.monotonic()
+        self.seen.add(self.seed)
+        self.frontier.put_nowait((self.seed, 0))
+
+        # Imported here so the API and workers that never crawl don't load it
+        import aiohttp
+
+        timeout = aiohttp.ClientTimeout(total=self.settings.timeout)
+        connector = aiohttp.TCPConnector(limit=self.settings.concurrency)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector,
+                                         headers={'User-Agent': self.user_agent}) as session:
+            self.robots = RobotsCache(session, self.user_agent)
+            workers = [asyncio.create_task(self._worker(session)) for _ in range(self.settings.concurrency)]
+            try:
+                await self.frontier.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+        return self.report(time.monotonic() - started)
+
+    async def _worker(self, session: 'aiohttp.ClientSession') -> None:
+        while True:
+            url, depth = await self.frontier.get()
+            try:
+                await self._visit(session, url, depth)
+            except Exception as e:
+                self.errors.append({'url': url, 'depth': depth, 'error': str(e)})
+            finally:
+                self.frontier.task_done()
+
+    async def _visit(self, session: 'aiohttp.ClientSession', url: str, depth: int) -> None:
+        if self.scheduled >= self.settings.max_pages or self.stopped:
+            return
+        if self.should_stop and await asyncio.to_thread(self.should_stop):
+            self.stopped = True
+            return
+        delay = 0.0
+        if self.settings.respect_robots:
+            if not await self.robots.allowed(url):
+                self.blocked.append(url)
+                return
+            delay = await self.robots.crawl_delay(url)
+        # Re-checked after the awaits above so concurrent workers can't overshoot.
+        if self.scheduled >= self.settings.max_pages:
+            return
+        self.scheduled += 1
+
+        await self.limiter.wait(urlsplit(url).netloc, delay)
+        started = time.monotonic()
+        async with session.get(url, allow_redirects=self.settings.analysis.follow_redirects) as response:
+            body = await response.read()
+            elapsed = time.monotonic() - started
+            status = response.status
+            record_fetch(status)
+            final_url = str(response.url)
+            content_type = response.headers.get('content-type', '')
+            performance = {
+                'response_time': elapsed,
+                'content_length': len(body),
+                'content_type': content_type,
+                'server': response.headers.get('server', ''),
+                'encoding': None,  # set once the body is decoded
+                'redirect_count': len(response.history)
+            }
+
+        if status >= 400:
+            self.errors.append({'url': url, 'depth': depth, 'status_code': status})
+            return
+        if 'html' not in content_type.lower():
+            self.skipped.append(url)
+            return
+
+        text, performance['encoding'] = charset.decode(body, content_type)
+        result, hrefs = await asyncio.to_thread(self._analyze, url, final_url, status, text, performance)
+
+        settings = self.settings.analysis
+        if (self.ai_analyzer and settings.include_ai_analysis and result.get('content')
+                and self.ai_analyzer.is_enabled()):
+            # Templated pages near-identical to ones already analyzed reuse their insights
+            result['ai_insights'] = await asyncio.to_thread(near_duplicates.reusable_insights, result)
+            if not result['ai_insights']:
+                result['ai_insights'] = await self.ai_analyzer.analyze_content(
+                    result['content']['text'], result.get('metadata', {}),
+                    result.get('links', {}), result.get('images', {})
+                )
+        result['stats'] = compute_stats(result, len(text))
+        if self.persist:
+            result['analysis_id'] = await asyncio.to_thread(self.save, result)
+
+        internal = self._internal_links(hrefs, final_url)
+        self.inbound.update(internal)
+        self._record(result, depth, len(internal))
+
+        if depth < self.settings.max_depth:
+            for link in internal:
+                if link not in self.seen:
+                    self.seen.add(link)
+                    self.frontier.put_nowait((link, depth + 1))
+
+    def _analyze(self, url: str, final_url: str, status: int, text: str,
+                 performance: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        soup = parse_html(text)
+        hrefs = [a['href'] for a in soup.find_all('a', href=True)]
+        result = build_result(url, final_url, status, soup, self.settings.analysis, performance, self.seo_engine)
+        return result, hrefs
+
+    def _save(self, result: Dict[str, Any]) -> int:
+        with self.session_factory() as db:
+            record = analysis_record(result, self.settings.analysis)
+            db.add(record)
+            db.flush()
+            if result.get('seo_analysis'):
+                seo.save_result(db, record.id, result['seo_analysis'], commit=False)
+            db.commit()
+            return record.id
+
+    def _internal_links(self, hrefs: List[str], base_url: str) -> List[str]:
+        links = []
+        for href in hrefs:
+            link = normalize_url(href, base_url)
+            if link and urlsplit(link).netloc == self.host:
+                links.append(link)
+        return list(dict.fromkeys(links))
+
+    def _record(self, result: Dict[str, Any], depth: int, internal_links: int) -> None:
+        seo_analysis = result.get('seo_analysis') or {}
+        self.issues.update(seo_analysis.get('issues', []))
+        self.pages.append({
+            'url': result['url'],
+            'final_url': result['final_url'],
+            'depth': depth,
+            'status_code': result['status_code'],
+            'title': result['title'],
+            'seo_score': seo_analysis.get('score'),
+            'seo_grade': seo_analysis.get('grade'),
+            'internal_links': internal_links,
+            'analysis_id': result.get('analysis_id')
+        })
+
+    def report(self, duration: float) -> Dict[str, Any]:
+        """Site-level summary of the crawl."""
+        scores = [p['seo_score'] for p in self.pages if p['seo_score'] is not None]
+        titles = defaultdict(list)
+        for page in self.pages:
+            titles[page['title']].append(page['url'])
+        crawled = {page['url'] for page in self.pages}
+
+        return {
+            'seed': self.seed,
+            'duration': duration,
+            'pages_crawled': len(self.pages),
+            'stopped': self.stopped,
+            'max_depth_reached': max((p['depth'] for p in self.pages), default=0),
+            'pages': self.pages,
+            'errors': self.errors,
+            'blocked_by_robots': self.blocked,
+            'skipped_non_html': self.skipped,
+            'status_codes': dict(Counter(p['status_code'] for p in self.pages)),
+            'depth_distribution': dict(Counter(p['depth'] for p in self.pages)),
+            'seo': {
+                'average_score': sum(scores) / len(scores) if scores else None,
+                'grades': dict(Counter(p['seo_grade'] for p in self.pages if p['seo_grade'])),
+                'top_issues': self.issues.most_common(10)
+            },
+            'duplicate_titles': {title: urls for title, urls in titles.items() if len(urls) > 1},
+            'link_graph': {
+                'internal_edges': sum(p['internal_links'] for p in self.pages),
+                'most_linked': [
+                    {'url': url, 'inbound': count}
+                    for url, count in self.inbound.most_common(10) if url in crawled
+                ]
+            }
+        }
@@ -1,21 +1,82 @@
-import pandas as pd
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
+import csv
+import io
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Optional, BinaryIO, Union
 import tempfile
 
+# Bump whenever the output of any exporter changes, so cached artifacts
+# from older versions are no longer served.
+EXPORTER_VERSION = "2"
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    'pdf': ('application/pdf', 'pdf'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'excel': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'json': ('application/json', 'json'),
+}
+
+# Formats written incrementally rather than built in memory first
+STREAMING_FORMATS = ('csv', 'json')
+
+CSV_COLUMNS = ['Type', 'Metric', 'Value', 'Details']
+
+# Streamed exports are sent in chunks of about this many characters
+STREAM_CHUNK_SIZE = 64 * 1024
+
 class ExportManager:
+    # reportlab and pandas are imported by the PDF and Excel writers on first
+    # use, so importing this module (and starting the API) doesn't pay for them
     def __init__(self):
-        self.styles = getSampleStyleSheet()
+        self._styles = None
+
+    @property
+    def styles(self):
+        if self._styles is None:
+            from reportlab.lib.styles import getSampleStyleSheet
+            self._styles = getSampleStyleSheet()
+        return self._styles
+
+    def write(self, analysis_result: Dict[str, Any], format: str, target: BinaryIO) -> None:
+        """Write an export in any supported format to a binary file object."""
+        if format == 'pdf':
+            self.write_pdf(analysis_result, target)
+        elif format in ('excel', 'xlsx'):
+            self.write_excel(analysis_result, target)
+        else:
+            for chunk in self.stream(analysis_result, format):
+                target.write(chunk)
+
+    def stream(self, analysis_result: Dict[str, Any], format: str) -> Iterator[bytes]:
+        """Yield a CSV or JSON export as UTF-8 chunks, without building it in memory."""
+        chunks = self.iter_csv(analysis_result) if format == 'csv' else self.iter_json(analysis_result)
+        buffer = []
+        size = 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= STREAM_CHUNK_SIZE:
+                yield ''.join(buffer).encode('utf-8')
+                buffer = []
+                size = 0
+        if buffer:
+            yield ''.join(buffer).encode('utf-8')
 
     def export_to_pdf(self, analysis_result: Dict[str, Any], filename: str) -> str:
         """Export analysis to PDF format."""
-        doc = SimpleDocTemplate(filename, pagesize=A4)
+        self.write_pdf(analysis_result, filename)
+        return filename
+
+    def write_pdf(self, analysis_result: Dict[str, Any], target: Union[str, BinaryIO]) -> None:
+        """Write a PDF report to a path or binary file object."""
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import ParagraphStyle
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+        doc = SimpleDocTemplate(target, pagesize=A4)
         story = []
 
         # Title
@@ -35,11 +96,11 @@ class ExportManager:
         story.append(Spacer(1, 12))
 
         # Stats
-        if 'stats' in analysis_result:
+        if analysis_result.get('stats'):
             stats = analysis_result['stats']
             stats_data = [
                 ['Metric', 'Value'],
-                ['Processing Time', f"{stats.get('processing_time', 0):.2f"}s"],
+                ['Processing Time', f"{stats.get('processing_time', 0):.2f}s"],
                 ['Content Length', f"{stats.get('content_length', 0):,} characters"],
                 ['Links Found', str(stats.get('link_count', 0))],
                 ['Images Found', str(stats.get('image_count', 0))],
@@ -60,7 +121,7 @@ class ExportManager:
             story.append(Spacer(1, 12))
 
         # Links section
-        if 'links' in analysis_result and analysis_result['links'].get('all'):
+        if (analysis_result.get('links') or {}).get('all'):
             story.append(Paragraph("Links Analysis", self.styles['Heading2']))
 
             links_data = [['Text', 'URL', 'Type']]
@@ -84,87 +145,107 @@ class ExportManager:
             story.append(links_table)
 
         doc.build(story)
-        return filename
 
     def export_to_csv(self, analysis_result: Dict[str, Any], filename: str) -> str:
         """Export analysis to CSV format."""
-        data = []
+        with open(filename, 'w', encoding='utf-8', newline='') as f:
+            for chunk in self.iter_csv(analysis_result):
+                f.write(chunk)
+        return filename
+
+    def iter_csv(self, analysis_result: Dict[str, Any]) -> Iterator[str]:
+        """Yield the CSV export one row at a time."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, lineterminator='\n')
+        writer.writeheader()
+        for row in self.csv_rows(analysis_result):
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
 
+    def csv_rows(self, analysis_result: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Rows of the CSV export."""
         # Basic info
-        data.append({
+        yield {
             'Type': 'Info',
             'Metric': 'URL',
             'Value': analysis_result.get('url', ''),
             'Details': ''
-        })
-        data.append({
+        }
+        yield {
             'Type': 'Info',
             'Metric': 'Title',
             'Value': analysis_result.get('title', ''),
             'Details': ''
-        })
-        data.append({
+        }
+        yield {
             'Type': 'Info',
             'Metric': 'Status Code',
             'Value': analysis_result.get('status_code', ''),
             'Details': ''
-        })
+        }
 
         # Stats
-        if 'stats' in analysis_result:
+        if analysis_result.get('stats'):
             stats = analysis_result['stats']
-            data.append({
+            yield {
                 'Type': 'Stats',
                 'Metric': 'Processing Time',
                 'Value': stats.get('processing_time', 0),
                 'Details': 'seconds'
-            })
-            data.append({
+            }
+            yield {
                 'Type': 'Stats',
                 'Metric': 'Content Length',
                 'Value': stats.get('content_length', 0),
                 'Details': 'characters'
-            })
-            data.append({
+            }
+            yield {
                 'Type': 'Stats',
                 'Metric': 'Links Count',
                 'Value': stats.get('link_count', 0),
                 'Details': ''
-            })
-            data.append({
+            }
+            yield {
                 'Type': 'Stats',
                 'Metric': 'Images Count',
                 'Value': stats.get('image_count', 0),
                 'Details': ''
-            })
+            }
 
         # Links
-        if 'links' in analysis_result and analysis_result['links'].get('all'):
+        if (analysis_result.get('links') or {}).get('all'):
             for i, link in enumerate(analysis_result['links']['all']):
-                data.append({
+                yield {
                     'Type': 'Link',
                     'Metric': f'Link {i+1}',
                     'Value': link.get('text', ''),
                     'Details': link.get('href', '')
-                })
+                }
 
         # Images
-        if 'images' in analysis_result and analysis_result['images'].get('images'):
+        if (analysis_result.get('images') or {}).get('images'):
             for i, img in enumerate(analysis_result['images']['images']):
-                data.append({
+                yield {
                     'Type': 'Image',
                     'Metric': f'Image {i+1}',
                     'Value': img.get('alt', ''),
                     'Details': img.get('src', '')
-                })
-
-        df = pd.DataFrame(data)
-        df.to_csv(filename, index=False)
-        return filename
+                }
 
     def export_to_excel(self, analysis_result: Dict[str, Any], filename: str) -> str:
         """Export analysis to Excel format with multiple sheets."""
-        with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+        self.write_excel(analysis_result, filename)
+        return filename
+
+    def write_excel(self, analysis_result: Dict[str, Any], target: Union[str, BinaryIO]) -> None:
+        """Write an Excel workbook to a path or binary file object."""
+        import pandas as pd
+
+        with pd.ExcelWriter(target, engine='openpyxl') as writer:
             # Overview sheet
             overview_data = {
                 'Metric': ['URL', 'Title', 'Status Code', 'Analysis Date', 'Processing Time (s)', 'Content Length', 'Links Count', 'Images Count'],
@@ -173,16 +254,16 @@ class ExportManager:
                     analysis_result.get('title', ''),
                     analysis_result.get('status_code', ''),
                     analysis_result.get('timestamp', ''),
-                    analysis_result['stats'].get('processing_time', 0),
-                    analysis_result['stats'].get('content_length', 0),
-                    analysis_result['stats'].get('link_count', 0),
-                    analysis_result['stats'].get('image_count', 0)
+                    (analysis_result.get('stats') or {}).get('processing_time', 0),
+                    (analysis_result.get('stats') or {}).get('content_length', 0),
+                    (analysis_result.get('stats') or {}).get('link_count', 0),
+                    (analysis_result.get('stats') or {}).get('image_count', 0)
                 ]
             }
             pd.DataFrame(overview_data).to_excel(writer, sheet_name='Overview', index=False)
 
             # Links sheet
-            if 'links' in analysis_result and analysis_result['links'].get('all'):
+            if (analysis_result.get('links') or {}).get('all'):
                 links_data = []
                 for link in analysis_result['links']['all']:
                     links_data.append({
@@ -196,7 +277,7 @@ class ExportManager:
                 pd.DataFrame(links_data).to_excel(writer, sheet_name='Links', index=False)
 
             # Images sheet
-            if 'images' in analysis_result and analysis_result['images'].get('images'):
+            if (analysis_result.get('images') or {}).get('images'):
                 images_data = []
                 for img in analysis_result['images']['images']:
                     images_data.append({
@@ -211,7 +292,7 @@ class ExportManager:
                 pd.DataFrame(images_data).to_excel(writer, sheet_name='Images', index=False)
 
             # Metadata sheet
-            if 'metadata' in analysis_result:
+            if analysis_result.get('metadata'):
                 metadata = analysis_result['metadata']
                 metadata_rows = []
                 if 'meta_tags' in metadata:
@@ -222,10 +303,109 @@ class ExportManager:
                         metadata_rows.append({'Type': 'OpenGraph', 'Name': f'og:{key}', 'Value': str(value)})
                 pd.DataFrame(metadata_rows).to_excel(writer, sheet_name='Metadata', index=False)
 
-        return filename
-
     def export_to_json(self, analysis_result: Dict[str, Any], filename: str) -> str:
         """Export analysis to JSON format."""
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(analysis_result, f, indent=2, ensure_ascii=False)
+            for chunk in self.iter_json(analysis_result):
+                f.write(chunk)
         return filename
+
+    def iter_json(self, analysis_result: Dict[str, Any]) -> Iterator[str]:
+        """Yield the JSON export incrementally."""
+        encoder = json.JSONEncoder(indent=2, ensure_ascii=False, default=str)
+        return encoder.iterencode(analysis_result)
+
+class ArtifactCache:
+    """On-disk cache of generated export files.
+
+    Artifacts are keyed by analysis, format and EXPORTER_VERSION. Stored
+    analyses never change, so an artifact stays valid until the exporter
+    version is bumped. Least recently used files are evicted past `max_bytes`.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.directory = directory or os.getenv(
+            'EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'webanalyzer-exports'))
+        self.max_bytes = max_bytes or int(os.getenv('EXPORT_CACHE_MAX_MB', 512)) * 1024 * 1024
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key: str, format: str) -> str:
+        extension = EXPORT_FORMATS[format][1]
+        return os.path.join(self.directory, f"{key}-v{EXPORTER_VERSION}.{extension}")
+
+    def get(self, key: str, format: str) -> Optional[str]:
+        """Path of a cached artifact, or None."""
+        path = self.path(key, format)
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        return path
+
+    def build(self, key: str, format: str, writer) -> str:
+        """Generate an artifact with `writer(fileobj)` and cache it."""
+        path = self.path(key, format)
+        with self.open(key, format) as artifact:
+            writer(artifact.file)
+        return path
+
+    def tee(self, key: str, format: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Pass chunks through while caching them; a partial stream is not cached."""
+        with self.open(key, format) as artifact:
+            for chunk in chunks:
+                artifact.write(chunk)
+                yield chunk
+
+    def open(self, key: str, format: str) -> 'PendingArtifact':
+        """A temporary file that becomes the cached artifact when closed without error."""
+        return PendingArtifact(self, self.path(key, format))
+
+    def evict(self) -> None:
+        """Drop least recently used artifacts until under the size limit."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+class PendingArtifact:
+    """Binary file written next to its final path and renamed into place on success."""
+
+    def __init__(self, cache: ArtifactCache, path: str):
+        self.cache = cache
+        self.path = path
+        fd, self.temp_path = tempfile.mkstemp(dir=cache.directory, prefix='.partial-')
+        self.file = os.fdopen(fd, 'wb')
+
+    def write(self, data: bytes) -> int:
+        return self.file.write(data)
+
+    def commit(self) -> None:
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+        self.cache.evict()
+
+    def discard(self) -> None:
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
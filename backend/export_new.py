@@ -39,7 +39,7 @@ class ExportManager:
             stats = analysis_result['stats']
             stats_data = [
                 ['Metric', 'Value'],
-                ['Processing Time', f"{stats.get('processing_time', 0)".2f"}s"],
+                ['Processing Time', f"{stats.get('processing_time', 0):.2f}s"],
                 ['Content Length', f"{stats.get('content_length', 0):,} characters"],
                 ['Links Found', str(stats.get('link_count', 0))],
                 ['Images Found', str(stats.get('image_count', 0))],
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import zlib
+from typing import Optional, Dict, List, Tuple
+
+from fastapi.responses import Response
+
+from json_responses import FastJSONResponse
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip is offered
+    brotli = None
+
+# Responses smaller than this are sent uncompressed; it isn't worth the CPU below ~1 KB
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+# Moderate levels suit responses compressed per request; the top levels cost
+# several times the CPU for a few percent smaller output
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 4))
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/xml', 'application/javascript')
+
+# Stored results don't change, but clients revalidate every time; a 304 costs only headers
+RESULT_CACHE_CONTROL = 'private, no-cache'
+
+def supported_encodings() -> Tuple[str, ...]:
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header, or None."""
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    # Supported encodings are in order of preference, so ties go to brotli
+    for encoding in supported_encodings():
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+class _Compressor:
+    """Incremental gzip or brotli compression of a response body."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == 'br':
+            chunk = self.compressor.process(data)
+            return chunk + (self.compressor.finish() if final else self.compressor.flush())
+        chunk = self.compressor.compress(data)
+        return chunk + self.compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with gzip or brotli, as the client accepts.
+
+    Only text-like responses of at least `minimum_size` bytes are compressed.
+    Streamed responses are compressed chunk by chunk and flushed after each
+    chunk, so they keep streaming. Strong ETags get the encoding appended,
+    since the compressed bytes are a different representation; 304s get the
+    same suffix.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = dict(scope['headers']).get(b'accept-encoding', b'').decode('latin-1')
+        encoding = negotiate_encoding(accept_encoding) if accept_encoding else None
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message['type'] == 'http.response.start':
+                if message['status'] == 304 and encoding is not None:
+                    # Revalidates the compressed representation, so it carries that ETag
+                    headers = _Headers(message.get('headers', []))
+                    headers.add_vary('Accept-Encoding')
+                    headers.suffix_etag(encoding)
+                    message['headers'] = headers.raw
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+            if message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if compressor is None:
+                headers = _Headers(start_message.get('headers', []))
+                if not self._eligible(start_message['status'], headers, body, more_body):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                headers.add_vary('Accept-Encoding')
+                if encoding is None:
+                    passthrough = True
+                    start_message['headers'] = headers.raw
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers.set('content-encoding', encoding)
+                headers.suffix_etag(encoding)
+                data = compressor.compress(body, final=not more_body)
+                if more_body:
+                    headers.remove('content-length')
+                else:
+                    headers.set('content-length', str(len(data)))
+                start_message['headers'] = headers.raw
+                await send(start_message)
+                await send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+                return
+
+            await send({'type': 'http.response.body', 'body': compressor.compress(body, final=not more_body),
+                        'more_body': more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _eligible(self, status: int, headers: '_Headers', body: bytes, more_body: bool) -> bool:
+        if status < 200 or status in (204, 304) or headers.get('content-encoding'):
+            return False
+        content_type = headers.get('content-type') or ''
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        return more_body or len(body) >= self.minimum_size
+
+class _Headers:
+    """A copy of an ASGI message's raw header list, with the edits the middleware needs."""
+
+    def __init__(self, raw: List[Tuple[bytes, bytes]]):
+        self.raw = list(raw)
+
+    def get(self, name: str) -> Optional[str]:
+        key = name.encode('latin-1')
+        for header, value in self.raw:
+            if header.lower() == key:
+                return value.decode('latin-1')
+        return None
+
+    def remove(self, name: str) -> None:
+        key = name.encode('latin-1')
+        self.raw = [(header, value) for header, value in self.raw if header.lower() != key]
+
+    def set(self, name: str, value: str) -> None:
+        self.remove(name)
+        self.raw.append((name.encode('latin-1'), value.encode('latin-1')))
+
+    def add_vary(self, name: str) -> None:
+        vary = self.get('vary')
+        if not vary:
+            self.set('vary', name)
+        elif name.lower() not in [v.strip().lower() for v in vary.split(',')]:
+            self.set('vary', f"{vary}, {name}")
+
+    def suffix_etag(self, encoding: str) -> None:
+        etag = self.get('etag')
+        if etag and etag.endswith('"'):
+            self.set('etag', f'{etag[:-1]}-{encoding}"')
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag for a response body."""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+def _opaque_tag(etag: str) -> str:
+    # If-None-Match uses weak comparison, and the tag may carry the encoding
+    # suffix added by CompressionMiddleware
+    tag = etag.strip()
+    if tag.startswith('W/'):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    for encoding in ('br', 'gzip'):
+        if tag.endswith(f'-{encoding}'):
+            return tag[:-len(encoding) - 1]
+    return tag
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header matches `etag`."""
+    if if_none_match.strip() == '*':
+        return True
+    target = _opaque_tag(etag)
+    return any(_opaque_tag(candidate) == target for candidate in if_none_match.split(',') if candidate.strip())
+
+def conditional_json_response(body: bytes, if_none_match: Optional[str],
+                              cache_control: str = RESULT_CACHE_CONTROL) -> Response:
+    """Serialized JSON with a strong ETag and Cache-Control; 304 if the client's copy is current."""
+    etag = make_etag(body)
+    headers = {'ETag': etag, 'Cache-Control': cache_control}
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(body, headers=headers)
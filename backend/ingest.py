@@ -0,0 +1,343 @@
+"""Offline analysis of saved HTML and WARC archives, without fetching anything.
+
+Records are read one at a time from memory-mapped `.warc`/`.warc.gz` files,
+parsed and scored on a process pool, and stored as `Analysis` rows in bulk.
+At most a few records per worker are held at once, so memory use doesn't
+grow with the size of the archive:
+
+    cd backend
+    python ingest.py crawl-00000.warc.gz crawl-00001.warc
+    python ingest.py saved-pages/ --workers 8
+
+Saved HTML files are analyzed under their `file://` URL. `POST /api/ingest/html`
+takes raw HTML bodies over the API.
+"""
+import argparse
+import gzip
+import logging
+import mmap
+import multiprocessing
+import os
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Executor
+from typing import Optional, Dict, Any, List, Iterator, Iterable, NamedTuple, Tuple
+
+import charset
+from models import SessionLocal
+from pipeline import AnalysisSettings, parse_html, build_result, compute_stats, analysis_record
+import seo
+
+try:
+    import brotli
+except ImportError:  # optional; brotli-encoded records are skipped without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', os.cpu_count() or 2))
+# Analyses inserted per transaction
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 500))
+# Records queued per worker; bounds memory however large the archive
+INGEST_QUEUE_PER_WORKER = 4
+# Records larger than this (videos, archives) are skipped without being read into memory
+INGEST_MAX_RECORD_BYTES = int(os.getenv('INGEST_MAX_RECORD_BYTES', 20 * 1024 * 1024))
+
+SKIP_CHUNK_SIZE = 1024 * 1024
+
+class PageRecord(NamedTuple):
+    url: str
+    status_code: int
+    body: bytes
+    content_type: str = 'text/html'
+    server: str = ''
+
+def _parse_headers(lines: Iterable[bytes]) -> Dict[str, str]:
+    headers = {}
+    for line in lines:
+        name, sep, value = line.decode('latin-1').partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+def _dechunk(body: bytes) -> bytes:
+    out, pos = [], 0
+    while pos < len(body):
+        end = body.find(b'\r\n', pos)
+        if end < 0:
+            break
+        size = int(body[pos:end].split(b';')[0] or b'0', 16)
+        if size == 0:
+            break
+        out.append(body[end + 2:end + 2 + size])
+        pos = end + 2 + size + 2
+    return b''.join(out)
+
+def _decode_content(body: bytes, encoding: str) -> Optional[bytes]:
+    encoding = encoding.lower()
+    if encoding in ('', 'identity'):
+        return body
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        try:
+            return zlib.decompress(body)
+        except zlib.error:  # raw deflate, without the zlib header
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    if encoding == 'br' and brotli is not None:
+        return brotli.decompress(body)
+    return None
+
+def parse_http_response(url: str, block: bytes) -> Optional[PageRecord]:
+    """The HTML page in a WARC response record's HTTP message, or None if it isn't one."""
+    head_end = block.find(b'\r\n\r\n')
+    separator = 4
+    if head_end < 0:
+        head_end, separator = block.find(b'\n\n'), 2
+        if head_end < 0:
+            return None
+    status_line, *header_lines = block[:head_end].splitlines()
+    parts = status_line.split()
+    if len(parts) < 2 or not parts[0].startswith(b'HTTP/') or not parts[1].isdigit():
+        return None
+    headers = _parse_headers(header_lines)
+    content_type = headers.get('content-type', '')
+    if 'html' not in content_type.lower():
+        return None
+
+    body = block[head_end + separator:]
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = _dechunk(body)
+    try:
+        body = _decode_content(body, headers.get('content-encoding', ''))
+    except (zlib.error, OSError, ValueError):
+        body = None
+    if body is None:
+        return None
+    return PageRecord(url, int(parts[1]), body, content_type, headers.get('server', ''))
+
+class WarcReader:
+    """Iterates the HTML responses in a `.warc` or `.warc.gz` file, one record at a time.
+
+    The file is memory-mapped and read sequentially; gzip members are
+    decompressed as the stream advances, so only the current record is held.
+    Counts of records read and skipped are kept as it goes.
+    """
+
+    def __init__(self, path: str, max_record_bytes: int = INGEST_MAX_RECORD_BYTES):
+        self.path = path
+        self.max_record_bytes = max_record_bytes
+        self.records = 0
+        self.skipped = 0
+
+    def __iter__(self) -> Iterator[PageRecord]:
+        if os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            gzipped = mapped[:2] == b'\x1f\x8b'
+            stream = gzip.GzipFile(fileobj=mapped) if gzipped else mapped
+            try:
+                while True:
+                    header = self._read_header(stream)
+                    if header is None:
+                        return
+                    self.records += 1
+                    length = int(header.get('content-length', 0))
+                    if (header.get('warc-type') != 'response'
+                            or not header.get('content-type', '').startswith('application/http')
+                            or length > self.max_record_bytes):
+                        self._skip(stream, length)
+                        self.skipped += 1
+                        continue
+                    page = parse_http_response(header.get('warc-target-uri', ''), stream.read(length))
+                    if page is None:
+                        self.skipped += 1
+                    else:
+                        yield page
+            finally:
+                if gzipped:
+                    stream.close()
+
+    @staticmethod
+    def _read_header(stream) -> Optional[Dict[str, str]]:
+        line = stream.readline()
+        while line in (b'\r\n', b'\n'):  # the blank lines closing the previous record
+            line = stream.readline()
+        if not line:
+            return None
+        if not line.startswith(b'WARC/'):
+            raise ValueError(f"Not a WARC record header: {line[:40]!r}")
+        lines = []
+        for line in iter(stream.readline, b''):
+            if line in (b'\r\n', b'\n'):
+                break
+            lines.append(line)
+        return _parse_headers(lines)
+
+    @staticmethod
+    def _skip(stream, length: int) -> None:
+        while length > 0:
+            chunk = stream.read(min(length, SKIP_CHUNK_SIZE))
+            if not chunk:
+                return
+            length -= len(chunk)
+
+def iter_html_files(path: str) -> Iterator[PageRecord]:
+    """Saved pages: an .html file, or every .html/.htm file under a directory."""
+    if os.path.isdir(path):
+        paths = (os.path.join(root, name) for root, _, names in os.walk(path)
+                 for name in sorted(names) if name.lower().endswith(('.html', '.htm')))
+    else:
+        paths = iter([path])
+    for file_path in paths:
+        with open(file_path, 'rb') as f:
+            yield PageRecord('file://' + os.path.abspath(file_path), 200, f.read())
+
+def iter_sources(paths: Iterable[str]) -> Iterator[PageRecord]:
+    for path in paths:
+        if path.endswith(('.warc', '.warc.gz')):
+            yield from WarcReader(path)
+        else:
+            yield from iter_html_files(path)
+
+def offline_settings(settings: Optional[AnalysisSettings] = None) -> AnalysisSettings:
+    """The settings with everything that would reach the network or the database turned off.
+
+    Near-duplicate lookups would cost every worker a query per record and
+    couldn't see records not yet stored; ingested pages are still
+    fingerprinted when saved, so later analyses find them.
+    """
+    return (settings or AnalysisSettings()).copy(update={
+        'include_ai_analysis': False, 'include_page_weight': False, 'check_links': False,
+        'find_near_duplicates': False,
+    })
+
+# Per worker process, built on its first record
+_seo_engine: Optional[seo.SEOEngine] = None
+
+def analyze_record(record: PageRecord, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a saved page through the extractors and SEO scoring, as a live analysis would."""
+    global _seo_engine
+    if _seo_engine is None:
+        _seo_engine = seo.SEOEngine()
+    analysis_settings = AnalysisSettings(**settings)
+    text, encoding = charset.decode(record.body, record.content_type)
+    performance = {
+        'response_time': None,
+        'content_length': len(record.body),
+        'content_type': record.content_type,
+        'server': record.server,
+        'encoding': encoding,
+        'redirect_count': 0,
+        'network': None,
+    }
+    result = build_result(record.url, record.url, record.status_code, parse_html(text), analysis_settings,
+                          performance, _seo_engine)
+    result['stats'] = compute_stats(result, len(text))
+    return result
+
+def save_batch(results: List[Dict[str, Any]], settings: AnalysisSettings) -> List[int]:
+    """Insert analyses and their SEO scores in one transaction each."""
+    with SessionLocal() as db:
+        records = [analysis_record(result, settings) for result in results]
+        db.add_all(records)
+        db.commit()
+        seo.save_results(db, [(record.id, result['seo_analysis'])
+                              for record, result in zip(records, results) if result.get('seo_analysis')])
+        return [record.id for record in records]
+
+def ingest(records: Iterable[PageRecord], settings: Optional[AnalysisSettings] = None,
+           executor: Optional[Executor] = None, workers: int = INGEST_WORKERS,
+           batch_size: int = INGEST_BATCH_SIZE, collect_ids: bool = False) -> Dict[str, Any]:
+    """Analyze records on a process pool and store them in batches.
+
+    A record is only read once a queue slot frees up, so a lazy `records`
+    iterable is consumed at the pool's pace. Pass `executor` to reuse a pool;
+    otherwise one with `workers` processes is started for the call. Analysis
+    ids are returned with `collect_ids`, for bounded inputs.
+    """
+    settings = offline_settings(settings)
+    settings_dict = settings.dict()
+    own_executor = executor is None
+    if own_executor:
+        executor = new_pool(workers)
+    queue_limit = workers * INGEST_QUEUE_PER_WORKER
+    pending: deque = deque()
+    batch: List[Dict[str, Any]] = []
+    stats = {'analyzed': 0, 'failed': 0, 'batches': 0}
+    ids: List[int] = []
+    started = time.perf_counter()
+
+    def flush() -> None:
+        saved = save_batch(batch, settings)
+        stats['analyzed'] += len(saved)
+        stats['batches'] += 1
+        if collect_ids:
+            ids.extend(saved)
+        batch.clear()
+
+    def collect(future) -> None:
+        try:
+            batch.append(future.result())
+        except Exception as e:
+            stats['failed'] += 1
+            logger.warning("Record analysis failed: %s", e)
+        if len(batch) >= batch_size:
+            flush()
+
+    try:
+        for record in records:
+            pending.append(executor.submit(analyze_record, record, settings_dict))
+            if len(pending) >= queue_limit:
+                collect(pending.popleft())
+        while pending:
+            collect(pending.popleft())
+        if batch:
+            flush()
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    if collect_ids:
+        stats['analysis_ids'] = ids
+    return stats
+
+def new_pool(workers: int = INGEST_WORKERS) -> ProcessPoolExecutor:
+    # Spawned rather than forked: a fork of the threaded API process could inherit held locks
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+# Shared by API requests; started on first use
+_pool: Optional[ProcessPoolExecutor] = None
+
+def process_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = new_pool()
+    return _pool
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help=".warc/.warc.gz files, .html files or directories of them")
+    parser.add_argument('--workers', type=int, default=INGEST_WORKERS, help="parser processes")
+    parser.add_argument('--batch-size', type=int, default=INGEST_BATCH_SIZE, help="analyses per insert")
+    parser.add_argument('--no-seo', action='store_true', help="skip SEO scoring")
+    args = parser.parse_args()
+
+    from models import Base, engine
+    Base.metadata.create_all(bind=engine)
+    settings = AnalysisSettings(include_seo_analysis=not args.no_seo)
+    stats = ingest(iter_sources(args.paths), settings, workers=args.workers, batch_size=args.batch_size)
+    rate = stats['analyzed'] / stats['seconds'] if stats['seconds'] else 0
+    print(f"analyzed: {stats['analyzed']}  failed: {stats['failed']}  batches: {stats['batches']}  "
+          f"{stats['seconds']:.1f}s ({rate:.0f} pages/s)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+import asyncio
+import os
+import random
+import uuid
+from datetime import datetime
+from typing import Optional, Dict, List, Any
+
+import requests
+from celery import Celery, signals
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, Analysis, Job, JobItem, Monitor
+from pipeline import AnalysisSettings, fetch_and_analyze, compute_stats, analysis_record
+from crawler import Crawler, CrawlSettings
+from ai_analyzer import AIAnalyzer
+from seo import SEOEngine
+import seo
+import monitor
+import near_duplicates
+import logs
+
+# Workers scale horizontally: start as many as needed with
+#   celery -A jobs worker --concurrency 8
+# against the same broker and database. CELERY_BROKER_URL=memory:// gives an
+# in-process broker for local runs and tests.
+celery_app = Celery('webanalyzer', broker=os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0'))
+celery_app.conf.update(
+    task_ignore_result=True,
+    # Job state lives in the database, so a task is only acknowledged once it
+    # has finished and is redelivered if the worker dies mid-way.
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    broker_connection_retry_on_startup=True,
+    worker_concurrency=int(os.getenv('WORKER_CONCURRENCY', 4)),
+    # Run `celery -A jobs beat` (or a worker with --beat) to drive monitors
+    beat_schedule={
+        'dispatch-due-monitors': {
+            'task': 'jobs.dispatch_due_monitors',
+            'schedule': monitor.MONITOR_TICK,
+        },
+    },
+)
+
+@signals.setup_logging.connect
+def _setup_logging(**kwargs):
+    # Workers log through the same JSON queue pipeline as the API instead of Celery's own
+    logs.setup_logging()
+
+JOB_KINDS = ('batch', 'crawl')
+MAX_RETRIES = int(os.getenv('JOB_MAX_RETRIES', 3))
+RETRY_BACKOFF_BASE = float(os.getenv('JOB_RETRY_BACKOFF', 2))
+RETRY_BACKOFF_MAX = 300
+
+FINISHED_ITEM_STATUSES = ('completed', 'failed', 'cancelled')
+FINISHED_JOB_STATUSES = ('completed', 'failed', 'cancelled')
+
+# Per-worker components, created on first use.
+_seo_engine: Optional[SEOEngine] = None
+_ai_analyzer: Optional[AIAnalyzer] = None
+
+def _components():
+    global _seo_engine, _ai_analyzer
+    if _seo_engine is None:
+        _seo_engine = SEOEngine()
+        _ai_analyzer = AIAnalyzer()
+    return _seo_engine, _ai_analyzer
+
+def retry_delay(retries: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** retries))
+
+def is_transient(error: Exception) -> bool:
+    """Whether a fetch error is worth retrying."""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+def create_job(db: Session, kind: str, urls: List[str], settings: AnalysisSettings,
+               crawl_settings: Optional[CrawlSettings] = None) -> Job:
+    """Store a new job and its items, then hand it to the workers."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    if not urls:
+        raise ValueError("At least one URL is required")
+
+    job = Job(id=uuid.uuid4().hex, kind=kind, status='queued', params={'urls': urls, 'settings': settings.dict()})
+    if kind == 'crawl':
+        crawl_settings = crawl_settings or CrawlSettings()
+        crawl_settings.analysis = settings
+        job.params['crawl'] = crawl_settings.dict()
+        job.total = crawl_settings.max_pages
+    else:
+        job.total = len(urls)
+        job.items = [JobItem(position=i, url=url, status='queued') for i, url in enumerate(urls)]
+    db.add(job)
+    db.commit()
+
+    try:
+        if kind == 'crawl':
+            run_crawl_job.delay(job.id)
+        else:
+            for item in job.items:
+                analyze_job_item.delay(item.id)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = f"Could not enqueue job: {e}"
+        job.finished_at = datetime.utcnow()
+        db.commit()
+    return job
+
+def cancel_job(db: Session, job: Job) -> Job:
+    """Cancel a job; items already running finish, queued ones are skipped."""
+    if job.status in FINISHED_JOB_STATUSES:
+        return job
+    job.status = 'cancelled'
+    job.finished_at = datetime.utcnow()
+    db.execute(
+        update(JobItem)
+        .where(JobItem.job_id == job.id, JobItem.status.in_(('queued', 'retrying')))
+        .values(status='cancelled')
+    )
+    db.commit()
+    return job
+
+def job_progress(db: Session, job: Job) -> Dict[str, Any]:
+    """Item counts by status for a job."""
+    counts = dict(
+        db.query(JobItem.status, func.count(JobItem.id))
+        .filter(JobItem.job_id == job.id)
+        .group_by(JobItem.status)
+        .all()
+    )
+    done = sum(counts.get(status, 0) for status in FINISHED_ITEM_STATUSES)
+    total = max(job.total or 0, sum(counts.values()))
+    return {
+        'total': total,
+        'completed': counts.get('completed', 0),
+        'failed': counts.get('failed', 0),
+        'cancelled': counts.get('cancelled', 0),
+        'pending': total - done if job.status not in FINISHED_JOB_STATUSES else 0,
+        'percent': 100.0 if job.status == 'completed' else round(100.0 * done / total, 1) if total else 0.0
+    }
+
+def _mark_running(db: Session, job: Job) -> None:
+    if job.status == 'queued':
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+
+def _finish_if_done(db: Session, job_id: str) -> None:
+    """Complete a batch job once none of its items are outstanding."""
+    outstanding = db.query(func.count(JobItem.id)).filter(
+        JobItem.job_id == job_id, JobItem.status.notin_(FINISHED_ITEM_STATUSES)
+    ).scalar()
+    if outstanding == 0:
+        db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status.in_(('queued', 'running')))
+            .values(status='completed', finished_at=datetime.utcnow())
+        )
+        db.commit()
+
+def persist_item_result(db: Session, item: JobItem, result: Dict[str, Any], settings: AnalysisSettings) -> int:
+    """Save an item's analysis exactly once.
+
+    The Analysis row, its SEO scores and the item's link to it are committed
+    together, so a redelivered task finds `analysis_id` set and does not insert
+    a duplicate, and an item that fails to save keeps no analysis.
+    """
+    if item.analysis_id:
+        return item.analysis_id
+    record = analysis_record(result, settings)
+    db.add(record)
+    db.flush()
+    if result.get('seo_analysis'):
+        seo.save_result(db, record.id, result['seo_analysis'], commit=False)
+    item.analysis_id = record.id
+    item.status = 'completed'
+    item.error = None
+    db.commit()
+    return record.id
+
+@celery_app.task(bind=True, max_retries=MAX_RETRIES)
+def analyze_job_item(self, item_id: int) -> None:
+    """Analyze one URL of a batch job, retrying transient fetch errors with backoff."""
+    seo_engine, ai_analyzer = _components()
+    with SessionLocal() as db:
+        item = db.get(JobItem, item_id)
+        if item is None or item.status in FINISHED_ITEM_STATUSES or item.analysis_id:
+            return
+        job = item.job
+        if job.status == 'cancelled':
+            item.status = 'cancelled'
+            db.commit()
+            return
+
+        _mark_running(db, job)
+        item.status = 'running'
+        item.attempts = (item.attempts or 0) + 1
+        db.commit()
+        settings = AnalysisSettings(**job.params.get('settings', {}))
+
+        try:
+            result, content_length = fetch_and_analyze(item.url, settings, seo_engine)
+            if settings.include_ai_analysis and result.get('content') and ai_analyzer.is_enabled():
+                # Near-identical pages already analyzed don't go to the model again
+                result['ai_insights'] = near_duplicates.reusable_insights(result) or asyncio.run(
+                    ai_analyzer.analyze_content(
+                        result['content']['text'], result.get('metadata', {}),
+                        result.get('links', {}), result.get('images', {})
+                    ))
+            result['stats'] = compute_stats(result, content_length)
+            persist_item_result(db, item, result, settings)
+        except Exception as e:
+            db.rollback()
+            if is_transient(e) and self.request.retries < self.max_retries:
+                item.status = 'retrying'
+                item.error = str(e)
+                db.commit()
+                raise self.retry(exc=e, countdown=retry_delay(self.request.retries))
+            item.status = 'failed'
+            item.error = str(e)
+            db.commit()
+
+        _finish_if_done(db, job.id)
+
+@celery_app.task
+def run_crawl_job(job_id: str) -> None:
+    """Run a crawl job, recording each crawled page as a job item."""
+    seo_engine, ai_analyzer = _components()
+    with SessionLocal() as db:
+        job = db.get(Job, job_id)
+        if job is None or job.status in FINISHED_JOB_STATUSES:
+            return
+        _mark_running(db, job)
+        db.commit()
+        crawl_settings = CrawlSettings(**job.params['crawl'])
+        seed = job.params['urls'][0]
+
+    def save(result: Dict[str, Any]) -> int:
+        # Idempotent per URL so a redelivered crawl reuses pages it already saved.
+        with SessionLocal() as db:
+            item = db.query(JobItem).filter_by(job_id=job_id, url=result['url']).first()
+            if item is None:
+                position = db.query(func.count(JobItem.id)).filter(JobItem.job_id == job_id).scalar()
+                item = JobItem(job_id=job_id, position=position, url=result['url'], status='running', attempts=1)
+                db.add(item)
+                db.flush()
+            return persist_item_result(db, item, result, crawl_settings.analysis)
+
+    def should_stop() -> bool:
+        with SessionLocal() as db:
+            return db.query(Job.status).filter(Job.id == job_id).scalar() == 'cancelled'
+
+    try:
+        crawler = Crawler(seed, crawl_settings, seo_engine=seo_engine, ai_analyzer=ai_analyzer,
+                          save=save, should_stop=should_stop)
+        report = asyncio.run(crawler.run())
+        error = None
+    except Exception as e:
+        report, error = None, str(e)
+
+    with SessionLocal() as db:
+        job = db.get(Job, job_id)
+        job.report = report
+        if job.status != 'cancelled':
+            job.status = 'failed' if error else 'completed'
+            job.error = error
+            job.finished_at = datetime.utcnow()
+        db.commit()
+
+@celery_app.task
+def dispatch_due_monitors() -> int:
+    """Scheduler pass: claim due monitors and queue a check for each."""
+    with SessionLocal() as db:
+        monitor_ids = monitor.claim_due_monitors(db)
+    for monitor_id in monitor_ids:
+        run_monitor_check.delay(monitor_id)
+    return len(monitor_ids)
+
+@celery_app.task
+def run_monitor_check(monitor_id: int) -> None:
+    """Check one monitored URL."""
+    seo_engine, _ = _components()
+    with SessionLocal() as db:
+        record = db.get(Monitor, monitor_id)
+        if record is not None and record.is_active:
+            monitor.run_monitor(db, record, seo_engine)
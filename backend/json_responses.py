@@ -0,0 +1,27 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+# Numeric dict keys and NumPy values occur in analysis results; both serialize natively
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def dumps(content: Any) -> bytes:
+    """Serialize to JSON bytes with orjson. Types it doesn't know fall back to `str()`."""
+    return orjson.dumps(content, default=str, option=ORJSON_OPTIONS)
+
+def loads(data: bytes) -> Any:
+    return orjson.loads(data)
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson.
+
+    Endpoints that build plain dicts return this directly, which skips FastAPI's
+    `jsonable_encoder` pass over the whole payload. `bytes` content is taken to
+    be serialized JSON already (e.g. a cached result) and sent unchanged.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
@@ -0,0 +1,144 @@
+"""Broken-link checking for the links an analysis extracts.
+
+Links are checked concurrently, at most `LINK_CHECK_PER_HOST` at a time per
+host, with HEAD and a GET fallback. Statuses are cached by normalized URL for
+all analyses, since the same navigation and footer links appear on most pages
+of a site.
+"""
+import os
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+from typing import Optional, Dict, Any, List
+from urllib.parse import urlsplit
+
+import requests
+
+from cache import SharedCache
+
+LINK_CHECK_CONCURRENCY = int(os.getenv('LINK_CHECK_CONCURRENCY', 16))
+LINK_CHECK_PER_HOST = int(os.getenv('LINK_CHECK_PER_HOST', 2))
+LINK_CHECK_TIMEOUT = float(os.getenv('LINK_CHECK_TIMEOUT', 5))
+LINK_MAX_REDIRECTS = int(os.getenv('LINK_MAX_REDIRECTS', 5))
+LINK_STATUS_TTL = int(os.getenv('LINK_STATUS_TTL', 86400))
+# Timeouts and connection errors are often transient, so they're rechecked sooner
+LINK_FAILURE_TTL = int(os.getenv('LINK_FAILURE_TTL', 600))
+LINK_STATUS_CACHE_SIZE = int(os.getenv('LINK_STATUS_CACHE_SIZE', 50000))
+
+LINK_STATUSES = ('ok', 'redirect', 'client_error', 'server_error', 'timeout', 'error')
+BROKEN_STATUSES = ('client_error', 'server_error', 'timeout', 'error')
+TRANSIENT_STATUSES = ('timeout', 'error')
+
+# Shared across analyses; main points it at the app's Redis
+status_cache = SharedCache('linkstatus:', LINK_STATUS_TTL, LINK_STATUS_CACHE_SIZE)
+
+def classify(status_code: int, redirects: int) -> str:
+    if status_code >= 500:
+        return 'server_error'
+    if status_code >= 400:
+        return 'client_error'
+    return 'redirect' if redirects else 'ok'
+
+def check_link(session: requests.Session, url: str) -> Dict[str, Any]:
+    """Status of one link: HEAD, then GET if HEAD fails, following redirects up to the cap."""
+    try:
+        response = session.head(url, timeout=LINK_CHECK_TIMEOUT, allow_redirects=True)
+        if response.status_code >= 400:
+            # Plenty of servers refuse or mishandle HEAD; only a GET is conclusive
+            with session.get(url, timeout=LINK_CHECK_TIMEOUT, allow_redirects=True, stream=True) as response:
+                pass
+    except requests.Timeout:
+        return {'status': 'timeout', 'status_code': None, 'final_url': None, 'redirects': 0}
+    except requests.TooManyRedirects:
+        return {'status': 'error', 'status_code': None, 'final_url': None, 'redirects': LINK_MAX_REDIRECTS,
+                'error': f"More than {LINK_MAX_REDIRECTS} redirects"}
+    except requests.RequestException as e:
+        return {'status': 'error', 'status_code': None, 'final_url': None, 'redirects': 0, 'error': str(e)}
+    redirects = len(response.history)
+    return {
+        'status': classify(response.status_code, redirects),
+        'status_code': response.status_code,
+        'final_url': response.url if redirects else None,
+        'redirects': redirects,
+    }
+
+def _interleave_hosts(urls: List[str]) -> List[str]:
+    # Round-robin over hosts, so workers aren't all queued behind one host's limit
+    by_host: Dict[str, List[str]] = defaultdict(list)
+    for url in urls:
+        by_host[urlsplit(url).netloc].append(url)
+    return [url for batch in zip_longest(*by_host.values()) for url in batch if url is not None]
+
+def check_links(urls: List[str], user_agent: str, adapter: Optional[requests.adapters.BaseAdapter] = None,
+                concurrency: int = LINK_CHECK_CONCURRENCY, per_host: int = LINK_CHECK_PER_HOST,
+                cache: Optional[SharedCache] = None) -> Dict[str, Dict[str, Any]]:
+    """Statuses of the links by normalized URL, from the cache where possible.
+
+    Non-HTTP(S) links (mailto:, tel:, ...) are skipped.
+    """
+    from crawler import normalize_url  # crawler imports the pipeline, which imports this module
+
+    cache = cache or status_cache
+    normalized = list(dict.fromkeys(filter(None, (normalize_url(url) for url in urls))))
+    statuses = {url: dict(status, cached=True) for url, status in cache.get_many(normalized).items()}
+    to_check = _interleave_hosts([url for url in normalized if url not in statuses])
+    if not to_check:
+        return statuses
+
+    host_slots: Dict[str, threading.BoundedSemaphore] = defaultdict(lambda: threading.BoundedSemaphore(per_host))
+    slots_lock = threading.Lock()
+
+    def check(url: str) -> Dict[str, Any]:
+        with slots_lock:
+            slot = host_slots[urlsplit(url).netloc]
+        with slot:
+            return check_link(session, url)
+
+    with requests.Session() as session:
+        session.headers['User-Agent'] = user_agent
+        session.max_redirects = LINK_MAX_REDIRECTS
+        if adapter is None:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=per_host)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(to_check))),
+                                thread_name_prefix='link-check') as pool:
+            checked = dict(zip(to_check, pool.map(check, to_check)))
+
+    cache.set_many({url: status for url, status in checked.items() if status['status'] not in TRANSIENT_STATUSES})
+    cache.set_many({url: status for url, status in checked.items() if status['status'] in TRANSIENT_STATUSES},
+                   ttl=LINK_FAILURE_TTL)
+    statuses.update((url, dict(status, cached=False)) for url, status in checked.items())
+    return statuses
+
+def annotate_links(links: Dict[str, Any], user_agent: str,
+                   adapter: Optional[requests.adapters.BaseAdapter] = None) -> Dict[str, Any]:
+    """Check the extracted links, marking each with its status, and summarize.
+
+    `links` is `extract_links` output; its entries get `status` and
+    `status_code` set in place.
+    """
+    from crawler import normalize_url
+
+    entries = links.get('all', [])
+    statuses = check_links([link['full_url'] for link in entries], user_agent, adapter)
+    broken = {}
+    for link in entries:
+        url = normalize_url(link['full_url'])
+        status = statuses.get(url) if url else None
+        if status is None:
+            continue
+        link['status'] = status['status']
+        link['status_code'] = status['status_code']
+        if status['status'] in BROKEN_STATUSES and url not in broken:
+            broken[url] = {'url': link['full_url'], 'text': link['text'], **status}
+
+    counts = Counter({status: 0 for status in LINK_STATUSES})
+    counts.update(status['status'] for status in statuses.values())
+    return {
+        'checked': len(statuses),
+        'cache_hits': sum(1 for status in statuses.values() if status['cached']),
+        'counts': dict(counts),
+        'broken': list(broken.values()),
+    }
@@ -0,0 +1,96 @@
+"""Outbound links of every stored analysis, as rows of `link_edges`.
+
+`Analysis.links` keeps each page's links as JSON, which can't be queried
+across analyses. Edges are written with each analysis (see
+`pipeline.analysis_record`) and indexed by target URL, target domain and
+source analysis, for "which pages link here" and "most-linked domains"
+queries. Analyses stored before the table existed are backfilled in chunks:
+
+    cd backend
+    python link_index.py --chunk-size 5000
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Callable
+from urllib.parse import urlsplit
+
+from sqlalchemy import select, insert, exists
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, Analysis, LinkEdge
+
+logger = logging.getLogger(__name__)
+
+LINK_BACKFILL_CHUNK_SIZE = int(os.getenv('LINK_BACKFILL_CHUNK_SIZE', 1000))
+
+def target_domain(url: str) -> str:
+    """The host a link points at, lowercased and without a leading "www."."""
+    host = (urlsplit(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+def edge_rows(links: Optional[Dict[str, Any]], created_at: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """One row per distinct HTTP(S) target in `extract_links` output."""
+    from crawler import normalize_url  # crawler imports the pipeline, which imports this module
+
+    rows: Dict[str, Dict[str, Any]] = {}
+    for link in (links or {}).get('all', []):
+        url = normalize_url(link.get('full_url') or '')
+        if url and url not in rows:
+            rows[url] = {'target_url': url, 'target_domain': target_domain(url),
+                         'is_internal': bool(link.get('is_internal')), 'created_at': created_at}
+    return list(rows.values())
+
+def edge_records(links: Optional[Dict[str, Any]]) -> List[LinkEdge]:
+    """`LinkEdge` rows for a new analysis' links."""
+    return [LinkEdge(**{key: value for key, value in row.items() if key != 'created_at'}) for row in edge_rows(links)]
+
+def backfill(chunk_size: int = LINK_BACKFILL_CHUNK_SIZE,
+             session_factory: Callable[[], Session] = SessionLocal) -> Dict[str, Any]:
+    """Write edges for stored analyses that have none, a chunk per transaction.
+
+    Only one chunk of analyses is held at a time, and an interrupted run
+    picks up where it stopped.
+    """
+    started = time.perf_counter()
+    query = (
+        select(Analysis.id, Analysis.links, Analysis.created_at)
+        .where(~exists().where(LinkEdge.analysis_id == Analysis.id))
+        .order_by(Analysis.id)
+        .limit(chunk_size)
+    )
+    analyses = edges = chunks = 0
+    last_id = 0
+    with session_factory() as db:
+        while True:
+            rows = db.execute(query.where(Analysis.id > last_id)).all()
+            if not rows:
+                break
+            chunk_edges = [dict(edge, analysis_id=analysis_id)
+                           for analysis_id, links, created_at in rows
+                           for edge in edge_rows(links, created_at)]
+            if chunk_edges:
+                db.execute(insert(LinkEdge), chunk_edges)
+            db.commit()
+            last_id = rows[-1].id
+            analyses += len(rows)
+            edges += len(chunk_edges)
+            chunks += 1
+            logger.info("Backfilled link edges", extra={'analyses': analyses, 'edges': edges, 'last_id': last_id})
+    return {'analyses': analyses, 'edges': edges, 'chunks': chunks, 'seconds': time.perf_counter() - started}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunk-size', type=int, default=LINK_BACKFILL_CHUNK_SIZE, help="analyses per transaction")
+    args = parser.parse_args()
+
+    from models import Base, engine
+    Base.metadata.create_all(bind=engine)
+    stats = backfill(args.chunk_size)
+    print(f"analyses: {stats['analyses']}  edges: {stats['edges']}  chunks: {stats['chunks']}  "
+          f"{stats['seconds']:.1f}s")
+
+if __name__ == '__main__':
+    main()
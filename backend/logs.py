@@ -0,0 +1,236 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler
+from typing import Optional, Dict
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+# Per-module overrides, e.g. "cache=WARNING,crawler=DEBUG"
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json, text
+# Fraction of high-volume messages (cache hits/misses) that are kept
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 0.01))
+# Seconds between writer passes; bounds how stale stdout can be
+LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', 0.05))
+# Records held while stdout can't keep up; beyond this new records are dropped
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_writer: Optional['LogWriter'] = None
+_handler: Optional[QueueHandler] = None
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with `extra=` fields inlined."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class RequestIdFilter(logging.Filter):
+    """Tags records with the current request id.
+
+    Attached to the queue handler, so it runs in the caller's context before
+    the record is handed to the writer thread.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+class SampledLogger(logging.LoggerAdapter):
+    """Keeps a random `rate` fraction of messages, deciding before a record is built."""
+
+    def __init__(self, logger: logging.Logger, rate: float):
+        super().__init__(logger, {'sample_rate': rate})
+        self.rate = rate
+
+    def log(self, level, msg, *args, **kwargs):
+        if self.rate >= 1 or random.random() < self.rate:
+            super().log(level, msg, *args, **kwargs)
+
+    def process(self, msg, kwargs):
+        kwargs['extra'] = {**self.extra, **(kwargs.get('extra') or {})}
+        return msg, kwargs
+
+class _QueueHandler(QueueHandler):
+    """Like `QueueHandler`, but leaves formatting to the writer thread.
+
+    Only the message is interpolated here, since its args may change after the
+    call. Tracebacks are formatted on the writer thread. When the queue is
+    full the record is dropped and counted rather than blocking the caller.
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, max_size: int = LOG_QUEUE_SIZE):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+class LogWriter:
+    """Drains the log queue on a background thread.
+
+    The queue is polled every `interval` seconds rather than waited on, so
+    logging a record never wakes the writer mid-request. Each pass formats
+    everything queued and writes it to stdout with one write and flush.
+    """
+
+    def __init__(self, handler: _QueueHandler, formatter: logging.Formatter, interval: float = LOG_FLUSH_INTERVAL):
+        self.handler = handler
+        self.queue = handler.queue
+        self.formatter = formatter
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Write everything queued so far, then end the thread."""
+        self.stopping.set()
+        self.thread.join()
+
+    def _run(self) -> None:
+        while not self.stopping.wait(self.interval):
+            self.flush()
+        self.flush()
+
+    def flush(self) -> None:
+        lines = []
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception:
+                lines.append(json.dumps({'level': 'ERROR', 'logger': 'logs',
+                                         'message': f"Could not format log record from {record.name}"}))
+        if self.handler.dropped:
+            dropped, self.handler.dropped = self.handler.dropped, 0
+            lines.append(json.dumps({'level': 'WARNING', 'logger': 'logs',
+                                     'message': f"Dropped {dropped} log records, stdout too slow"}))
+        if lines:
+            try:
+                sys.stdout.write('\n'.join(lines) + '\n')
+                sys.stdout.flush()
+            except Exception:
+                pass  # stdout gone, e.g. at interpreter shutdown
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+def sampled_logger(name: str, rate: float = LOG_SAMPLE_RATE) -> SampledLogger:
+    """A logger for high-volume messages that keeps only a sample of them."""
+    return SampledLogger(logging.getLogger(name), rate)
+
+def setup_logging(level: str = LOG_LEVEL, levels: str = LOG_LEVELS, format: str = LOG_FORMAT) -> None:
+    """Route all logging through a queue drained by a background thread.
+
+    Callers only build the record and enqueue it; formatting and the write to
+    stdout happen on the writer thread. Safe to call more than once.
+    """
+    global _writer, _handler
+    if _writer is not None:
+        return
+
+    if format == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    log_queue = queue.SimpleQueue()
+    _handler = _QueueHandler(log_queue)
+    _handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    root.addHandler(_handler)
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    # Neither format reports the caller's file, line, thread or process name,
+    # so skip collecting them for every record (the stack walk is the costliest part)
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logMultiprocessing = False
+
+    _writer = LogWriter(_handler, formatter)
+    _writer.start()
+    atexit.unregister(stop_logging)
+    atexit.register(stop_logging)
+
+def stop_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _writer, _handler
+    if _writer is not None:
+        logging.getLogger().removeHandler(_handler)
+        _writer.stop()
+        _writer, _handler = None, None
+
+class RequestIdMiddleware:
+    """ASGI middleware that sets the request id for logging and echoes it back.
+
+    An incoming `X-Request-ID` is reused so ids correlate across services.
+    """
+
+    def __init__(self, app, header: str = 'x-request-id'):
+        self.app = app
+        self.header = header.encode('latin-1')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request_id = dict(scope['headers']).get(self.header, b'').decode('latin-1')[:64] or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + [(self.header, request_id.encode('latin-1'))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
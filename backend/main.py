@@ -1,50 +1,69 @@
-from fastapi import FastAPI, HTTPException, Query, Depends, status
+from fastapi import FastAPI, HTTPException, Query, Depends, Header, Request, BackgroundTasks, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.responses import FileResponse, StreamingResponse, Response, JSONResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 import requests
-from bs4 import BeautifulSoup
-import uvicorn
-import re
-from datetime import datetime
-from urllib.parse import urlparse, urljoin
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
 import json
 import os
 from contextlib import asynccontextmanager
+import asyncio
+import functools
+import contextvars
+import shutil
+import logging
 
 # Import our new modules
-from models import Base, engine, Analysis, User
+from models import Base, engine, Analysis, User, ApiKey, SEOScore, SEORuleResult, FetchTiming, LinkEdge, Job, JobItem, Monitor, MonitorRun
 from cache import CacheManager
 from ai_analyzer import AIAnalyzer
-from export import ExportManager
+from export import ExportManager, ArtifactCache, EXPORT_FORMATS, STREAMING_FORMATS
+from bulk_export import BulkExportFilter, BULK_FORMATS, export_bulk
+from pipeline import AnalysisSettings, USER_AGENT, fetch_and_analyze, compute_stats, analysis_record, analysis_result
+from logs import setup_logging, RequestIdMiddleware
+import metrics
+import capture
+import json_responses
+from json_responses import FastJSONResponse, dumps
+from http_caching import CompressionMiddleware, conditional_json_response
+from admission import AdmissionController, Rejected, MAX_BATCH_SIZE, client_id
+import auth
+from auth import TokenUser, current_user
+from metrics import Timings, MetricsMiddleware
+import seo
+from seo import SEOEngine
+import page_weight
+import link_checker
+import link_index
+import near_duplicates
+import ingest
+from ingest import PageRecord
+import search
+from crawler import Crawler, CrawlSettings, normalize_url
+import monitor
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-import secrets
-from passlib.context import CryptContext
-import redis
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # Create database tables
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Create database tables
     Base.metadata.create_all(bind=engine)
+    capture.start()
+    if WARM_UP_ON_STARTUP:
+        # Off the startup path: the app serves while clients are built
+        asyncio.get_running_loop().run_in_executor(None, warm_up)
     yield
-
-# Settings Model
-class AnalysisSettings(BaseModel):
-    include_metadata: bool = True
-    include_links: bool = True
-    include_images: bool = True
-    include_content: bool = True
-    include_ai_analysis: bool = True
-    include_seo_analysis: bool = True
-    max_content_length: int = 5000
-    max_links: int = 50
-    include_headers: bool = True
-    include_meta_tags: bool = True
-    include_performance: bool = True
-    follow_redirects: bool = True
-    export_format: Optional[str] = None  # pdf, csv, excel, json
+    # In-flight requests have finished by now; write out what they queued and release the pools
+    capture.stop()
+    ingest.shutdown()
+    engine.dispose()
 
 # Authentication models
 class UserCreate(BaseModel):
@@ -56,12 +75,40 @@ class UserLogin(BaseModel):
     username: str
     password: str
 
-# Initialize components
+class ApiKeyCreate(BaseModel):
+    name: Optional[str] = None
+
+# Initialize components. Constructing them is cheap: the Redis and OpenAI
+# clients, and the libraries behind exports and jobs, are loaded on first use.
 cache_manager = CacheManager()
 ai_analyzer = AIAnalyzer()
 export_manager = ExportManager()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-security = HTTPBasic()
+admission = AdmissionController(lambda: cache_manager.redis_client)
+# Page-weight asset measurements and link statuses are shared between workers through the same Redis
+page_weight.asset_cache.get_redis = lambda: cache_manager.redis_client
+link_checker.status_cache.get_redis = lambda: cache_manager.redis_client
+artifact_cache = ArtifactCache()
+# PDF and Excel exports are built here, off the event loop
+export_executor = metrics.QueuedExecutor('exports', max_workers=int(os.getenv('EXPORT_WORKERS', 2)),
+                                         thread_name_prefix='export')
+# Fetching, parsing and scoring a page blocks, so analyses run here rather than on the event loop;
+# admission slots bound how many are accepted, this how many run at once
+analysis_executor = metrics.QueuedExecutor('analyses', max_workers=int(os.getenv('ANALYSIS_WORKERS', 16)),
+                                           thread_name_prefix='analysis')
+seo_engine = SEOEngine()
+
+# Build the service clients in the background after startup, so the first
+# requests don't pay for them
+WARM_UP_ON_STARTUP = os.getenv('WARM_UP_ON_STARTUP', 'true').lower() == 'true'
+
+def warm_up() -> None:
+    """Create the lazily built clients ahead of the first request that needs them."""
+    try:
+        cache_manager.redis_client
+        ai_analyzer.client
+        export_manager.styles
+    except Exception:
+        logger.warning("Warm-up failed", exc_info=True)
 
 # Database dependency
 def get_db():
@@ -71,12 +118,6 @@ def get_db():
     finally:
         db.close()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
 app = FastAPI(
     title="WebAnalyzer Pro 10x",
     description="Advanced web analysis with AI insights, caching, and comprehensive reporting",
@@ -84,6 +125,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Innermost, so metrics include compression time
+app.add_middleware(CompressionMiddleware)
+
 # CORS middleware configuration
 app.add_middleware(
     CORSMiddleware,
@@ -92,14 +136,41 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
 class URLRequest(BaseModel):
     url: str
     settings: Optional[AnalysisSettings] = Field(default_factory=AnalysisSettings)
 
 class BatchAnalysisRequest(BaseModel):
+    urls: List[str] = Field(max_length=MAX_BATCH_SIZE)
+    settings: Optional[AnalysisSettings] = Field(default_factory=AnalysisSettings)
+
+class CrawlRequest(BaseModel):
+    url: str
+    settings: Optional[CrawlSettings] = Field(default_factory=CrawlSettings)
+
+class JobRequest(BaseModel):
+    kind: str = "batch"  # batch, crawl
     urls: List[str]
     settings: Optional[AnalysisSettings] = Field(default_factory=AnalysisSettings)
+    crawl: Optional[CrawlSettings] = None
+
+class MonitorRequest(BaseModel):
+    url: str
+    settings: Optional[AnalysisSettings] = Field(default_factory=AnalysisSettings)
+    interval_seconds: int = 3600
+    full_snapshot_every: int = 10
+
+class IngestPage(BaseModel):
+    url: str
+    html: str
+    status_code: int = 200
+
+class IngestRequest(BaseModel):
+    pages: List[IngestPage] = Field(max_length=int(os.getenv('INGEST_MAX_PAGES', 1000)))
+    settings: Optional[AnalysisSettings] = Field(default_factory=AnalysisSettings)
 
 class ExportRequest(BaseModel):
     analysis_id: int
@@ -120,6 +191,21 @@ async def root():
         ]
     }
 
+@app.get("/metrics")
+async def prometheus_metrics(db: Session = Depends(get_db)):
+    """Prometheus scrape endpoint; under server.py it reports all workers together."""
+    queue_depths = None
+    try:
+        queue_depths = metrics.queue_depths(db)
+    except Exception as e:
+        logger.warning("Queue depth error: %s", e)
+    return Response(content=metrics.render(queue_depths), media_type=metrics.CONTENT_TYPE_LATEST)
+
+@app.exception_handler(Rejected)
+async def admission_rejected(request: Request, exc: Rejected):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail},
+                        headers={"Retry-After": str(exc.retry_after)})
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint with system status."""
@@ -127,7 +213,8 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
         "cache": cache_manager.get_stats(),
-        "ai_enabled": ai_analyzer.is_enabled()
+        "ai_enabled": ai_analyzer.is_enabled(),
+        "admission": admission.status()
     }
 
 @app.post("/auth/register")
@@ -142,7 +229,7 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Email or username already registered")
 
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await auth.hash_password_async(user.password)
     db_user = User(
         email=user.email,
         username=user.username,
@@ -157,323 +244,405 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
 
 @app.post("/auth/login")
 async def login_user(credentials: UserLogin, db: Session = Depends(get_db)):
-    """Login user and return token."""
+    """Login user and return a bearer token (JWT) for the API."""
     user = db.query(User).filter(User.username == credentials.username).first()
 
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    if not user or not user.is_active or not await auth.verify_password_async(credentials.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    # Generate token (in production, use JWT)
-    token = secrets.token_urlsafe(32)
-    return {"access_token": token, "token_type": "bearer", "user_id": user.id}
-
-def extract_metadata(soup, base_url: str) -> Dict[str, Any]:
-    """Extract metadata from the page."""
-    meta_tags = {}
-    for meta in soup.find_all('meta'):
-        name = meta.get('name') or meta.get('property') or meta.get('http-equiv')
-        if name and meta.get('content'):
-            meta_tags[name.lower()] = meta['content']
-
-    # Extract OpenGraph data
-    og_data = {}
-    for meta in soup.find_all('meta', property=re.compile(r'^og:')):
-        og_data[meta['property'][3:]] = meta['content']
-
-    # Extract Twitter card data
-    twitter_data = {}
-    for meta in soup.find_all('meta', attrs={'name': re.compile(r'^twitter:', re.I)}):
-        twitter_data[meta['name'].lower()] = meta.get('content', '')
-
-    # Extract canonical URL
-    canonical = soup.find('link', rel='canonical')
-
-    return {
-        'meta_tags': meta_tags,
-        'opengraph': og_data,
-        'twitter': twitter_data,
-        'canonical': canonical['href'] if canonical else None,
-        'language': soup.get('lang') or soup.html.get('lang', 'en'),
-        'charset': soup.meta.get('charset') if soup.meta else None,
-        'title': soup.title.string if soup.title else None
-    }
-
-def extract_links(soup, base_url: str, max_links: int = 50) -> Dict[str, Any]:
-    """Extract and categorize links from the page."""
-    all_links = []
-    internal_links = []
-    external_links = []
-
-    base_domain = urlparse(base_url).netloc
-
-    for link in soup.find_all('a', href=True):
-        href = link['href']
-        full_url = urljoin(base_url, href)
-        is_internal = urlparse(full_url).netloc == base_domain
-
-        link_data = {
-            'text': link.get_text(strip=True)[:100],
-            'href': href,
-            'full_url': full_url,
-            'title': link.get('title', ''),
-            'rel': link.get('rel', []),
-            'target': link.get('target', ''),
-            'is_internal': is_internal
-        }
-
-        all_links.append(link_data)
-        if is_internal:
-            internal_links.append(link_data)
-        else:
-            external_links.append(link_data)
-
-    return {
-        'all': all_links[:max_links],
-        'internal': internal_links[:max_links//2],
-        'external': external_links[:max_links//2],
-        'total': len(all_links),
-        'total_internal': len(internal_links),
-        'total_external': len(external_links)
-    }
-
-def extract_images(soup, base_url: str) -> Dict[str, Any]:
-    """Extract images from the page."""
-    images = []
-    for img in soup.find_all('img'):
-        src = img.get('src', '')
-        if src:
-            images.append({
-                'src': src,
-                'full_url': urljoin(base_url, src),
-                'alt': img.get('alt', ''),
-                'title': img.get('title', ''),
-                'width': img.get('width'),
-                'height': img.get('height'),
-                'loading': img.get('loading', 'eager')
-            })
-
-    return {
-        'images': images[:100],  # Limit to first 100 images
-        'total': len(images),
-        'with_alt': len([img for img in images if img['alt']]),
-        'without_alt': len([img for img in images if not img['alt']])
-    }
-
-def extract_headings(soup) -> Dict[str, Any]:
-    """Extract and count heading levels."""
-    headings = {}
-    for level in range(1, 7):
-        h_tags = soup.find_all(f'h{level}')
-        headings[f'h{level}'] = [{
-            'text': h.get_text(strip=True),
-            'id': h.get('id')
-        } for h in h_tags]
-    return headings
-
-def extract_performance_metrics(response) -> Dict[str, Any]:
-    """Extract performance metrics."""
-    return {
-        'response_time': response.elapsed.total_seconds(),
-        'content_length': len(response.content),
-        'content_type': response.headers.get('content-type', ''),
-        'server': response.headers.get('server', ''),
-        'encoding': response.encoding,
-        'redirect_count': len(response.history)
-    }
-
-@app.post("/api/analyze")
-async def analyze_url(request: URLRequest, db: Session = Depends(get_db)):
-    """Enhanced analysis endpoint with caching and AI insights."""
-    print(f"📝 Received analysis request for: {request.url}")
+    token, expires_in = auth.create_access_token(user.id, user.username)
+    return {"access_token": token, "token_type": "bearer", "expires_in": expires_in, "user_id": user.id}
+
+@app.get("/auth/me")
+async def read_current_user(user: Optional[TokenUser] = Depends(current_user)):
+    """The user the bearer token belongs to."""
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return {"user_id": user.id, "username": user.username}
+
+@app.post("/auth/api-keys")
+async def create_api_key(request: ApiKeyCreate, db: Session = Depends(get_db),
+                         user: Optional[TokenUser] = Depends(current_user)):
+    """Issue an API key for the signed-in user. The key is only shown here."""
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    key, key_hash = auth.generate_api_key()
+    api_key = ApiKey(key_hash=key_hash, user_id=user.id, name=request.name)
+    db.add(api_key)
+    db.commit()
+    auth.api_keys.forget(key_hash)
+    return {"id": api_key.id, "key": key, "name": api_key.name}
+
+@app.delete("/auth/api-keys/{key_id}")
+async def revoke_api_key(key_id: int, db: Session = Depends(get_db),
+                         user: Optional[TokenUser] = Depends(current_user)):
+    """Revoke one of the signed-in user's API keys."""
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    api_key = db.query(ApiKey).filter(ApiKey.id == key_id, ApiKey.user_id == user.id).first()
+    if not api_key:
+        raise HTTPException(status_code=404, detail="API key not found")
+    api_key.is_active = False
+    db.commit()
+    auth.api_keys.forget(api_key.key_hash)
+    return {"success": True}
+
+async def _client_id(http_request: Request, user_id: Optional[int]) -> str:
+    """The admission identity: the signed-in user, a registered API key's owner, else the address."""
+    api_key = http_request.headers.get('x-api-key')
+    if user_id is None and api_key:
+        user_id = await asyncio.get_running_loop().run_in_executor(None, auth.api_keys.owner, api_key)
+    return client_id(http_request, user_id)
+
+@app.post("/api/analyze", response_class=FastJSONResponse)
+async def analyze_url(request: URLRequest, http_request: Request, db: Session = Depends(get_db),
+                      user: Optional[TokenUser] = Depends(current_user),
+                      include_timings: bool = False, if_none_match: Optional[str] = Header(None)):
+    """Enhanced analysis endpoint with caching and AI insights.
+
+    With `include_timings`, `stats.timings` holds this request's per-stage
+    durations in milliseconds. Results answered from the cache carry an ETag,
+    and a matching `If-None-Match` gets a 304.
+    """
+    user_id = user.id if user else None
+    admission.admit_client(await _client_id(http_request, user_id))
+    with admission.slot():
+        result, body = await run_analysis(request, db, include_timings, user_id)
+    if body is None:
+        return FastJSONResponse(result)
+    return conditional_json_response(body, if_none_match)
+
+async def run_analysis(request: URLRequest, db: Session, include_timings: bool = False,
+                       user_id: Optional[int] = None) -> Tuple[Dict[str, Any], Optional[bytes]]:
+    """Analyze a URL, or answer from the cache, storing the analysis for `user_id`.
+
+    Returns the result and, on a cache hit, its serialized JSON as cached, which
+    can be sent as the response body without encoding the result again.
+    """
+    arrived = datetime.utcnow()
+    logger.info("Analysis requested", extra={'url': request.url})
     settings = request.settings or AnalysisSettings()
+    timings = Timings()
 
     # Check cache first
-    cached_result = cache_manager.get(request.url, settings.dict())
-    if cached_result:
-        # Save to database if user is authenticated
+    with timings.stage('cache_get'):
+        cached_body = cache_manager.get_raw(request.url, settings.dict())
+    if cached_body:
+        cached_result = json_responses.loads(cached_body)
+        # Save to database, under the signed-in user if there is one
         try:
-            # In a real app, you'd get user from token
-            # For now, we'll save as anonymous
-            analysis_record = Analysis(
-                url=request.url,
-                final_url=cached_result.get('final_url', request.url),
-                title=cached_result.get('title', ''),
-                status_code=cached_result.get('status_code', 200),
-                processing_time=cached_result.get('stats', {}).get('processing_time', 0),
-                metadata=cached_result.get('metadata'),
-                links=cached_result.get('links'),
-                images=cached_result.get('images'),
-                content=cached_result.get('content'),
-                headings=cached_result.get('headings'),
-                stats=cached_result.get('stats'),
-                analysis_settings=settings.dict()
-            )
-            db.add(analysis_record)
-            db.commit()
+            with timings.stage('db'):
+                # No fetch happened, so there are no network timings to store
+                record = analysis_record(dict(cached_result, url=request.url, performance=None), settings, user_id)
+                db.add(record)
+                db.flush()
+                if cached_result.get('seo_analysis'):
+                    seo.save_result(db, record.id, cached_result['seo_analysis'], commit=False)
+                db.commit()
         except Exception as e:
-            print(f"⚠️ Database save error: {e}")
+            db.rollback()
+            logger.exception("Database save error", extra={'url': request.url})
 
-        return cached_result
+        if include_timings:
+            cached_result['stats'] = dict(cached_result.get('stats') or {}, timings=timings.as_dict())
+            cached_body = None
+        _capture_request(request, settings, 200, 'hit', timings, arrived)
+        return cached_result, cached_body
 
+    # Only fetches count against the target domain's limit; cache hits don't reach it
+    admission.admit_domain(request.url)
     try:
-        # Fetch the webpage
-        print(f"🌐 Fetching URL: {request.url}")
-        response = requests.get(
-            request.url,
-            timeout=15,
-            allow_redirects=settings.follow_redirects,
-            headers={
-                'User-Agent': 'WebAnalyzerPro/2.0 (Advanced Web Analysis Tool)'
-            }
+        # Fetch the webpage, parse it and run the extractors
+        # The context carries the request id into the thread's log records
+        result, content_length = await asyncio.get_running_loop().run_in_executor(
+            analysis_executor, functools.partial(contextvars.copy_context().run, fetch_and_analyze,
+                                                 request.url, settings, seo_engine, timings=timings)
         )
-        response.raise_for_status()
-
-        final_url = response.url
-        print(f"✅ Successfully fetched URL, status: {response.status_code}, final URL: {final_url}")
-
-        # Parse the HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Extract basic information
-        title = soup.title.string if soup.title else "No title found"
-        print(f"📄 Page title: {title}")
-
-        # Initialize result with basic info
-        result = {
-            'url': request.url,
-            'final_url': final_url,
-            'status_code': response.status_code,
-            'title': title,
-            'timestamp': datetime.utcnow().isoformat(),
-            'analysis_settings': settings.dict(),
-            'performance': extract_performance_metrics(response)
-        }
-
-        # Extract metadata if enabled
-        if settings.include_metadata:
-            result['metadata'] = extract_metadata(soup, final_url)
-
-        # Extract links if enabled
-        if settings.include_links:
-            result['links'] = extract_links(soup, final_url, settings.max_links)
-
-        # Extract images if enabled
-        if settings.include_images:
-            result['images'] = extract_images(soup, final_url)
-
-        # Extract content if enabled
-        if settings.include_content:
-            # Remove scripts and styles
-            for element in soup(["script", "style"]):
-                element.decompose()
-
-            # Get clean text content
-            text = soup.get_text()
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            content = '\n'.join(chunk for chunk in chunks if chunk)
-
-            result['content'] = {
-                'text': content[:settings.max_content_length],
-                'length': len(content),
-                'truncated': len(content) > settings.max_content_length
-            }
-
-        # Extract headers if enabled
-        if settings.include_headers:
-            result['headings'] = extract_headings(soup)
-
-        # SEO Analysis
-        if settings.include_seo_analysis and result.get('metadata') and result.get('content'):
-            from ai_analyzer import AIAnalyzer
-            ai = AIAnalyzer()
-            result['seo_analysis'] = ai.analyze_seo(
-                result['metadata'],
-                result['content'],
-                result['headings']
-            )
+        logger.debug("Fetched page", extra={'url': request.url, 'status_code': result['status_code'],
+                                            'final_url': result['final_url']})
 
         # AI Analysis
         if settings.include_ai_analysis and result.get('content') and ai_analyzer.is_enabled():
             try:
-                ai_insights = await ai_analyzer.analyze_content(
-                    result['content']['text'],
-                    result['metadata'],
-                    result['links'],
-                    result['images']
-                )
+                with timings.stage('ai'):
+                    # Near-identical pages already analyzed don't go to the model again
+                    ai_insights = await asyncio.get_running_loop().run_in_executor(
+                        None, near_duplicates.reusable_insights, result
+                    ) or await ai_analyzer.analyze_content(
+                        result['content']['text'],
+                        result['metadata'],
+                        result['links'],
+                        result['images']
+                    )
                 result['ai_insights'] = ai_insights
             except Exception as e:
-                print(f"⚠️ AI analysis failed: {e}")
+                logger.warning("AI analysis failed: %s", e, extra={'url': request.url})
                 result['ai_insights'] = {"error": "AI analysis temporarily unavailable"}
 
         # Add stats
-        result['stats'] = {
-            'processing_time': (datetime.utcnow() - datetime.fromisoformat(result['timestamp'])).total_seconds(),
-            'content_length': len(response.text),
-            'link_count': len(result.get('links', {}).get('all', [])) if 'links' in result else 0,
-            'image_count': len(result.get('images', {}).get('images', [])) if 'images' in result else 0,
-            'cache_used': False
-        }
+        result['stats'] = compute_stats(result, content_length, timings=timings)
 
         # Cache the result
-        cache_manager.set(request.url, settings.dict(), result, ttl=3600)  # 1 hour cache
+        with timings.stage('cache_set'):
+            cache_manager.set(request.url, settings.dict(), result, ttl=3600)  # 1 hour cache
 
         # Save to database
         try:
-            analysis_record = Analysis(
-                url=request.url,
-                final_url=final_url,
-                title=title,
-                status_code=response.status_code,
-                processing_time=result['stats']['processing_time'],
-                metadata=result.get('metadata'),
-                links=result.get('links'),
-                images=result.get('images'),
-                content=result.get('content'),
-                headings=result.get('headings'),
-                stats=result.get('stats'),
-                ai_insights=result.get('ai_insights'),
-                analysis_settings=settings.dict()
-            )
-            db.add(analysis_record)
-            db.commit()
-            result['analysis_id'] = analysis_record.id
+            with timings.stage('db'):
+                record = analysis_record(result, settings, user_id)
+                db.add(record)
+                db.flush()
+                if result.get('seo_analysis'):
+                    seo.save_result(db, record.id, result['seo_analysis'], commit=False)
+                db.commit()
+                result['analysis_id'] = record.id
         except Exception as e:
-            print(f"⚠️ Database save error: {e}")
+            db.rollback()
+            logger.exception("Database save error", extra={'url': request.url})
 
-        print(f"✅ Enhanced analysis complete for {request.url}")
-        return result
+        if include_timings:
+            # A fresh dict, so the cached and stored stats stay without timings
+            result['stats'] = dict(result['stats'], timings=timings.as_dict())
+        logger.info("Analysis complete", extra={'url': request.url, 'status_code': result['status_code'],
+                                                'duration_ms': round(result['stats']['processing_time'] * 1000, 1)})
+        _capture_request(request, settings, 200, 'miss', timings, arrived)
+        return result, None
 
     except requests.RequestException as e:
-        print(f"❌ Request error: {str(e)}")
+        logger.info("Fetch failed: %s", e, extra={'url': request.url})
+        _capture_request(request, settings, 400, 'miss', timings, arrived, str(e))
         raise HTTPException(status_code=400, detail=f"Error fetching URL: {str(e)}")
     except Exception as e:
-        print(f"❌ Unexpected error: {str(e)}")
+        logger.exception("Analysis failed", extra={'url': request.url})
+        _capture_request(request, settings, 500, 'miss', timings, arrived, str(e))
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
-@app.post("/api/analyze/batch")
-async def analyze_batch(request: BatchAnalysisRequest, db: Session = Depends(get_db)):
-    """Batch analysis for multiple URLs."""
+def _capture_request(request: URLRequest, settings: AnalysisSettings, status: int, cache: str,
+                     timings: Timings, arrived: datetime, error: Optional[str] = None) -> None:
+    if capture.recorder is not None:
+        capture.recorder.record_request('/api/analyze', request.url, settings.dict(), status, cache,
+                                        timings.as_dict(), error, ts=arrived)
+
+@app.post("/api/analyze/batch", response_class=FastJSONResponse)
+async def analyze_batch(request: BatchAnalysisRequest, http_request: Request, db: Session = Depends(get_db),
+                        user: Optional[TokenUser] = Depends(current_user)):
+    """Batch analysis for multiple URLs.
+
+    Each URL counts against the client's rate limit. URLs whose domain is
+    over its limit fail individually.
+    """
     results = []
     settings = request.settings or AnalysisSettings()
+    user_id = user.id if user else None
+    admission.admit_client(await _client_id(http_request, user_id), cost=len(request.urls))
 
-    for url in request.urls:
-        try:
-            # Reuse the single analysis logic
-            single_request = URLRequest(url=url, settings=settings)
-            result = await analyze_url(single_request, db)
-            results.append({"url": url, "success": True, "result": result})
-        except Exception as e:
-            results.append({"url": url, "success": False, "error": str(e)})
+    with admission.slot():
+        for url in request.urls:
+            try:
+                # Reuse the single analysis logic
+                single_request = URLRequest(url=url, settings=settings)
+                result, _ = await run_analysis(single_request, db, user_id=user_id)
+                results.append({"url": url, "success": True, "result": result})
+            except Exception as e:
+                results.append({"url": url, "success": False, "error": str(e)})
 
-    return {
+    return FastJSONResponse({
         "total": len(request.urls),
         "successful": len([r for r in results if r["success"]]),
         "failed": len([r for r in results if not r["success"]]),
         "results": results
+    })
+
+@app.post("/api/ingest/html")
+async def ingest_html(request: IngestRequest):
+    """Analyze raw HTML bodies without fetching them, storing each as an analysis."""
+    records = [PageRecord(page.url, page.status_code, page.html.encode('utf-8'), 'text/html; charset=utf-8')
+               for page in request.pages]
+    return await asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(ingest.ingest, records, request.settings, ingest.process_pool(), collect_ids=True)
+    )
+
+@app.post("/api/crawl")
+async def crawl_site(request: CrawlRequest, http_request: Request,
+                     user: Optional[TokenUser] = Depends(current_user)):
+    """Breadth-first crawl of a site's internal links with a site-level report.
+
+    The crawl runs within the request, so it costs the client one token per
+    page it may fetch and holds an in-flight slot until done. Queue large
+    crawls with `POST /api/jobs` instead.
+    """
+    settings = request.settings or CrawlSettings()
+    try:
+        crawler = Crawler(
+            request.url,
+            settings,
+            seo_engine=seo_engine,
+            ai_analyzer=ai_analyzer,
+            user_agent=USER_AGENT
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    admission.admit_client(await _client_id(http_request, user.id if user else None), cost=settings.max_pages)
+    logger.info("Crawl started", extra={'url': crawler.seed})
+    with admission.slot():
+        report = await crawler.run()
+    logger.info("Crawl complete", extra={'url': crawler.seed, 'pages': report['pages_crawled']})
+    return report
+
+def serialize_job(job: Job, db: Session, skip: int = 0, limit: int = 100) -> Dict[str, Any]:
+    import jobs  # Celery is only loaded once jobs are used
+
+    items = (
+        db.query(JobItem)
+        .filter(JobItem.job_id == job.id)
+        .order_by(JobItem.position)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": jobs.job_progress(db, job),
+        "results": [{
+            "url": item.url,
+            "status": item.status,
+            "attempts": item.attempts,
+            "analysis_id": item.analysis_id,
+            "error": item.error
+        } for item in items],
+        "report": job.report,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+@app.post("/api/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_job(request: JobRequest, db: Session = Depends(get_db)):
+    """Queue a batch or crawl job for the worker pool."""
+    import jobs
+
+    try:
+        job = jobs.create_job(db, request.kind, request.urls, request.settings or AnalysisSettings(), request.crawl)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if job.status == 'failed':
+        raise HTTPException(status_code=503, detail=job.error)
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, skip: int = 0, limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_db)):
+    """Job status, progress and the results completed so far."""
+    job = db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return serialize_job(job, db, skip, limit)
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, db: Session = Depends(get_db)):
+    """Cancel a queued or running job."""
+    job = db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    import jobs
+
+    jobs.cancel_job(db, job)
+    return {"job_id": job.id, "status": job.status}
+
+def serialize_monitor(record: Monitor) -> Dict[str, Any]:
+    return {
+        "id": record.id,
+        "url": record.url,
+        "interval_seconds": record.interval_seconds,
+        "full_snapshot_every": record.full_snapshot_every,
+        "is_active": record.is_active,
+        "next_run_at": record.next_run_at.isoformat() if record.next_run_at else None,
+        "last_run_at": record.last_run_at.isoformat() if record.last_run_at else None,
+        "settings": record.settings
     }
 
+def serialize_monitor_run(run: MonitorRun) -> Dict[str, Any]:
+    return {
+        "id": run.id,
+        "created_at": run.created_at.isoformat(),
+        "kind": run.kind,
+        "status_code": run.status_code,
+        "analysis_id": run.analysis_id,
+        "diff": run.diff,
+        "seo_score": run.seo_score,
+        "seo_score_delta": run.seo_score_delta,
+        "error": run.error
+    }
+
+def get_monitor_or_404(monitor_id: int, db: Session) -> Monitor:
+    record = db.get(Monitor, monitor_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Monitor not found")
+    return record
+
+@app.post("/api/monitors")
+async def create_monitor(request: MonitorRequest, db: Session = Depends(get_db)):
+    """Re-analyze a URL on a schedule, recording what changes."""
+    try:
+        record = monitor.create_monitor(
+            db, request.url, request.settings or AnalysisSettings(),
+            request.interval_seconds, request.full_snapshot_every
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return serialize_monitor(record)
+
+@app.get("/api/monitors")
+async def list_monitors(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    """List monitors."""
+    records = db.query(Monitor).order_by(Monitor.id).offset(skip).limit(limit).all()
+    return [serialize_monitor(record) for record in records]
+
+@app.delete("/api/monitors/{monitor_id}")
+async def deactivate_monitor(monitor_id: int, db: Session = Depends(get_db)):
+    """Stop scheduling a monitor; its history is kept."""
+    record = get_monitor_or_404(monitor_id, db)
+    record.is_active = False
+    db.commit()
+    return serialize_monitor(record)
+
+@app.post("/api/monitors/{monitor_id}/run")
+async def run_monitor_now(monitor_id: int, db: Session = Depends(get_db)):
+    """Queue an immediate check of a monitor."""
+    get_monitor_or_404(monitor_id, db)
+    import jobs
+
+    jobs.run_monitor_check.delay(monitor_id)
+    return {"monitor_id": monitor_id, "queued": True}
+
+@app.get("/api/monitors/{monitor_id}/history")
+async def get_monitor_history(monitor_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    """Runs of a monitor, newest first, with their diffs."""
+    get_monitor_or_404(monitor_id, db)
+    runs = (
+        db.query(MonitorRun)
+        .filter(MonitorRun.monitor_id == monitor_id)
+        .order_by(MonitorRun.id.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    return [serialize_monitor_run(run) for run in runs]
+
+@app.get("/api/monitors/{monitor_id}/snapshots/{run_id}")
+async def get_monitor_snapshot(monitor_id: int, run_id: int, db: Session = Depends(get_db)):
+    """Page state as of a run, rebuilt from the last full snapshot and diffs."""
+    run = db.get(MonitorRun, run_id)
+    if not run or run.monitor_id != monitor_id:
+        raise HTTPException(status_code=404, detail="Run not found")
+    view = monitor.reconstruct_view(db, run)
+    if view is None:
+        raise HTTPException(status_code=404, detail="No snapshot available for this run")
+    return dict(serialize_monitor_run(run), snapshot=view)
+
 @app.get("/api/analyses")
 async def get_analyses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Get analysis history from database."""
@@ -488,14 +657,32 @@ async def get_analyses(skip: int = 0, limit: int = 100, db: Session = Depends(ge
         "stats": a.stats
     } for a in analyses]
 
-@app.get("/api/analysis/{analysis_id}")
-async def get_analysis(analysis_id: int, db: Session = Depends(get_db)):
-    """Get specific analysis by ID."""
+@app.get("/api/search")
+async def search_analyses(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Full-text search over stored analyses' titles, headings and page text, best match first.
+
+    Pass a response's `next_cursor` back as `cursor` for the next page.
+    """
+    try:
+        return search.search(db.connection(), q, limit, cursor)
+    except search.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+@app.get("/api/analysis/{analysis_id}", response_class=FastJSONResponse)
+async def get_analysis(analysis_id: int, db: Session = Depends(get_db), if_none_match: Optional[str] = Header(None)):
+    """Get specific analysis by ID; revalidate with `If-None-Match` against its ETag."""
     analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found")
 
-    return {
+    return conditional_json_response(dumps({
         "id": analysis.id,
         "url": analysis.url,
         "final_url": analysis.final_url,
@@ -503,7 +690,7 @@ async def get_analysis(analysis_id: int, db: Session = Depends(get_db)):
         "status_code": analysis.status_code,
         "processing_time": analysis.processing_time,
         "created_at": analysis.created_at.isoformat(),
-        "metadata": analysis.metadata,
+        "metadata": analysis.page_metadata,
         "links": analysis.links,
         "images": analysis.images,
         "content": analysis.content,
@@ -511,64 +698,257 @@ async def get_analysis(analysis_id: int, db: Session = Depends(get_db)):
         "stats": analysis.stats,
         "ai_insights": analysis.ai_insights,
         "analysis_settings": analysis.analysis_settings
-    }
+    }), if_none_match)
+
+def _run_bulk_export(export_filter: BulkExportFilter, format: str) -> Dict[str, Any]:
+    # Runs on an export thread, so it uses its own session rather than the request's
+    with Session(engine) as db:
+        return export_bulk(db, export_filter, format)
+
+# Registered before /api/export/{analysis_id} so "bulk" isn't taken for an id
+@app.post("/api/export/bulk")
+async def export_bulk_analyses(export_filter: BulkExportFilter, format: str = 'parquet'):
+    """Export every analysis matching a filter as Parquet, Arrow or an Excel workbook."""
+    format = format.lower()
+    if format not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported format")
+
+    try:
+        export = await asyncio.get_running_loop().run_in_executor(
+            export_executor, _run_bulk_export, export_filter, format
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+
+    path = export["path"]
+    media_type = EXPORT_FORMATS['excel'][0] if format == 'excel' else "application/zip"
+    filename = f"analyses_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{path.rsplit('.', 1)[1]}"
+    return FileResponse(
+        path, media_type=media_type, filename=filename,
+        headers={"X-Export-Rows": ",".join(f"{name}={count}" for name, count in export["rows"].items())},
+        background=BackgroundTask(shutil.rmtree, os.path.dirname(path), ignore_errors=True)
+    )
 
 @app.post("/api/export/{analysis_id}")
 async def export_analysis(analysis_id: int, format: str, db: Session = Depends(get_db)):
-    """Export analysis in various formats."""
+    """Export analysis in various formats, streamed as a download."""
+    format = format.lower()
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported format")
+
     analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found")
 
-    # Convert analysis record to result format
-    result = {
-        "url": analysis.url,
-        "final_url": analysis.final_url,
-        "title": analysis.title,
-        "status_code": analysis.status_code,
-        "timestamp": analysis.created_at.isoformat(),
-        "metadata": analysis.metadata,
-        "links": analysis.links,
-        "images": analysis.images,
-        "content": analysis.content,
-        "headings": analysis.headings,
-        "stats": analysis.stats,
-        "ai_insights": analysis.ai_insights,
-        "analysis_settings": analysis.analysis_settings
-    }
-
     # Generate filename
+    media_type, extension = EXPORT_FORMATS[format]
     timestamp = analysis.created_at.strftime("%Y%m%d_%H%M%S")
-    filename = f"analysis_{analysis_id}_{timestamp}.{format}"
+    filename = f"analysis_{analysis_id}_{timestamp}.{extension}"
+    # created_at guards against a reused id serving another analysis' artifact
+    key = f"{analysis.id}-{analysis.created_at.strftime('%Y%m%d%H%M%S%f')}"
+
+    cached = artifact_cache.get(key, format)
+    if cached:
+        return FileResponse(cached, media_type=media_type, filename=filename)
+
+    result = analysis_result(analysis)
+    if format in STREAMING_FORMATS:
+        return StreamingResponse(
+            artifact_cache.tee(key, format, export_manager.stream(result, format)),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
 
     try:
-        if format.lower() == 'pdf':
-            filepath = export_manager.export_to_pdf(result, filename)
-        elif format.lower() == 'csv':
-            filepath = export_manager.export_to_csv(result, filename)
-        elif format.lower() == 'excel' or format.lower() == 'xlsx':
-            filepath = export_manager.export_to_excel(result, filename)
-        elif format.lower() == 'json':
-            filepath = export_manager.export_to_json(result, filename)
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported format")
-
-        return {"filename": filename, "path": filepath}
+        path = await asyncio.get_running_loop().run_in_executor(
+            export_executor, artifact_cache.build, key, format,
+            functools.partial(export_manager.write, result, format)
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+    return FileResponse(path, media_type=media_type, filename=filename)
+
+def _run_rescore(stale_only: bool, chunk_size: int) -> Dict[str, Any]:
+    # Runs on an executor thread, so it uses its own session rather than the request's
+    with Session(engine) as db:
+        return seo.rescore_analyses(db, seo_engine, chunk_size=chunk_size, stale_only=stale_only)
+
+@app.post("/api/seo/rescore")
+async def rescore_seo(stale_only: bool = True, chunk_size: int = Query(1000, ge=1, le=10000)):
+    """Re-score stored analyses with the current SEO rules, off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, _run_rescore, stale_only, chunk_size)
+
+@app.get("/api/seo/scores")
+async def get_seo_scores(
+    grade: Optional[str] = None,
+    min_score: Optional[int] = None,
+    max_score: Optional[int] = None,
+    failed_rule: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """Filter stored SEO scores by grade, score range or failed rule."""
+    query = db.query(SEOScore, Analysis.url).join(Analysis, Analysis.id == SEOScore.analysis_id)
+    if grade:
+        query = query.filter(SEOScore.grade == grade.upper())
+    if min_score is not None:
+        query = query.filter(SEOScore.score >= min_score)
+    if max_score is not None:
+        query = query.filter(SEOScore.score <= max_score)
+    if failed_rule:
+        failed = db.query(SEORuleResult.analysis_id).filter(
+            SEORuleResult.rule_id == failed_rule,
+            SEORuleResult.passed.is_(False)
+        )
+        query = query.filter(SEOScore.analysis_id.in_(failed))
+
+    rows = query.order_by(SEOScore.analysis_id).offset(skip).limit(limit).all()
+    return [{
+        "analysis_id": score.analysis_id,
+        "url": url,
+        "score": score.score,
+        "grade": score.grade,
+        "ruleset_version": score.ruleset_version,
+        "scored_at": score.scored_at.isoformat()
+    } for score, url in rows]
+
+@app.get("/api/performance/timings")
+async def get_fetch_timings(
+    url: Optional[str] = None,
+    since: Optional[datetime] = None,
+    final_only: bool = True,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Stored per-hop network timings, oldest first, for trends over time.
+
+    `url` matches the analyzed URL; `final_only` leaves out redirect hops.
+    """
+    query = db.query(FetchTiming, Analysis.url).join(Analysis, Analysis.id == FetchTiming.analysis_id)
+    if url:
+        query = query.filter(Analysis.url == url)
+    if since:
+        query = query.filter(FetchTiming.created_at >= since)
+    if final_only:
+        query = query.filter(FetchTiming.url == Analysis.final_url)
+
+    rows = query.order_by(FetchTiming.created_at, FetchTiming.id).offset(skip).limit(limit).all()
+    return [{
+        "analysis_id": timing.analysis_id,
+        "analyzed_url": analyzed_url,
+        "hop": timing.hop,
+        "url": timing.url,
+        "status_code": timing.status_code,
+        "http_version": timing.http_version,
+        "reused_connection": timing.reused_connection,
+        "dns_ms": timing.dns_ms,
+        "connect_ms": timing.connect_ms,
+        "tls_ms": timing.tls_ms,
+        "ttfb_ms": timing.ttfb_ms,
+        "download_ms": timing.download_ms,
+        "total_ms": timing.total_ms,
+        "bytes": timing.bytes,
+        "throughput_bps": timing.throughput_bps,
+        "created_at": timing.created_at.isoformat()
+    } for timing, analyzed_url in rows]
+
+@app.get("/api/links/inbound")
+async def get_inbound_links(
+    url: Optional[str] = None,
+    domain: Optional[str] = None,
+    since: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Analyzed pages linking to a URL or to any page of a domain, newest first."""
+    query = db.query(LinkEdge, Analysis.url, Analysis.title).join(Analysis, Analysis.id == LinkEdge.analysis_id)
+    if url:
+        query = query.filter(LinkEdge.target_url == normalize_url(url))
+    elif domain:
+        query = query.filter(LinkEdge.target_domain == link_index.target_domain(f"//{domain.strip()}"))
+    else:
+        raise HTTPException(status_code=400, detail="Either url or domain is required")
+    if since:
+        query = query.filter(LinkEdge.created_at >= since)
+
+    rows = query.order_by(LinkEdge.created_at.desc(), LinkEdge.id.desc()).offset(skip).limit(limit).all()
+    return [{
+        "analysis_id": edge.analysis_id,
+        "source_url": source_url,
+        "source_title": source_title,
+        "target_url": edge.target_url,
+        "is_internal": edge.is_internal,
+        "created_at": edge.created_at.isoformat()
+    } for edge, source_url, source_title in rows]
+
+@app.get("/api/links/top-domains")
+async def get_top_linked_domains(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    external_only: bool = True,
+    limit: int = Query(20, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Most-linked domains across analyses, over the last week unless `since` is given."""
+    since = since or datetime.utcnow() - timedelta(days=7)
+    linking_pages = func.count(func.distinct(LinkEdge.analysis_id))
+    query = db.query(LinkEdge.target_domain, linking_pages, func.count(LinkEdge.id)).filter(LinkEdge.created_at >= since)
+    if until:
+        query = query.filter(LinkEdge.created_at < until)
+    if external_only:
+        query = query.filter(LinkEdge.is_internal.is_(False))
+
+    rows = query.group_by(LinkEdge.target_domain).order_by(linking_pages.desc(), LinkEdge.target_domain).limit(limit).all()
+    return [{"domain": domain, "linking_pages": pages, "links": links} for domain, pages, links in rows]
+
+@app.post("/api/links/backfill")
+async def backfill_link_edges(chunk_size: int = Query(link_index.LINK_BACKFILL_CHUNK_SIZE, ge=1, le=10000)):
+    """Index the links of analyses stored before link edges were recorded, a chunk at a time."""
+    return await asyncio.get_running_loop().run_in_executor(None, link_index.backfill, chunk_size)
+
+def _clear_caches() -> None:
+    cache_manager.clear_all()
+    page_weight.asset_cache.clear()
+    link_checker.status_cache.clear()
 
 @app.delete("/api/cache/clear")
-async def clear_cache():
-    """Clear all cached analysis results."""
-    success = cache_manager.clear_all()
-    return {"success": success, "message": "Cache cleared"}
+async def clear_cache(background_tasks: BackgroundTasks):
+    """Clear all cached analysis results, asset sizes and link statuses.
+
+    Keys are scanned and unlinked in batches after the response is sent;
+    anything else in the Redis database is left alone.
+    """
+    background_tasks.add_task(_clear_caches)
+    return {"success": True, "message": "Cache clearing"}
+
+@app.post("/api/cache/invalidate")
+async def invalidate_cache(background_tasks: BackgroundTasks, url: Optional[str] = None, domain: Optional[str] = None):
+    """Drop the cached results of a URL under every analysis setting, or of every URL on a domain.
+
+    A URL's entries are few and deleted before responding; a domain's are
+    unlinked in batches after the response is sent.
+    """
+    if not url and not domain:
+        raise HTTPException(status_code=400, detail="Pass url or domain")
+    invalidated = None
+    if url:
+        invalidated = await asyncio.get_running_loop().run_in_executor(None, cache_manager.invalidate_url, url)
+    if domain:
+        background_tasks.add_task(cache_manager.invalidate_domain, domain)
+    return {"success": True, "url": url, "domain": domain, "invalidated": invalidated}
 
 @app.get("/api/cache/stats")
 async def get_cache_stats():
-    """Get cache statistics."""
-    return cache_manager.get_stats()
+    """Get cache statistics, counting the cached analyses."""
+    return cache_manager.get_stats(count_entries=True)
 
+# Development server with auto-reload; server.py runs the API in production
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
         app,
         host="0.0.0.0",
@@ -0,0 +1,179 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Optional, Dict
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.metrics_core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from prometheus_client.samples import Sample
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import JobItem, Monitor
+
+# Own registry so /metrics only carries the app's metrics, not the client's defaults
+REGISTRY = CollectorRegistry()
+# Set by server.py for its workers: each one writes its metrics to files there,
+# and a scrape served by any of them reports the sum over all of them
+MULTIPROCESS_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = Histogram(
+    'webanalyzer_stage_duration_seconds', 'Time spent in each analysis pipeline stage',
+    ['stage'], buckets=STAGE_BUCKETS, registry=REGISTRY
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'webanalyzer_http_request_duration_seconds', 'API request latency by handler',
+    ['method', 'handler', 'status'], buckets=STAGE_BUCKETS, registry=REGISTRY
+)
+HTTP_IN_FLIGHT = Gauge(
+    'webanalyzer_http_requests_in_flight', 'API requests currently being served', registry=REGISTRY,
+    multiprocess_mode='livesum'
+)
+CACHE_REQUESTS = Counter(
+    'webanalyzer_cache_requests_total', 'Analysis cache lookups by result (hit, miss, expired, error)',
+    ['result'], registry=REGISTRY
+)
+FETCH_RESPONSES = Counter(
+    'webanalyzer_fetch_responses_total', 'Outbound page fetches by status code or error type',
+    ['status'], registry=REGISTRY
+)
+QUEUE_DEPTH = Gauge(
+    'webanalyzer_queue_depth', 'Work waiting to be picked up, by queue', ['queue'], registry=REGISTRY,
+    multiprocess_mode='livesum'
+)
+ADMISSION_REJECTIONS = Counter(
+    'webanalyzer_admission_rejections_total', 'Requests refused by admission control, by reason',
+    ['reason'], registry=REGISTRY
+)
+
+class Timings:
+    """Per-request stage timings on the monotonic clock.
+
+    Every stage is also observed in `STAGE_SECONDS`, so callers that don't
+    report timings still feed the histograms.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            STAGE_SECONDS.labels(name).observe(elapsed)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> Dict[str, float]:
+        """Stage durations and the total so far, in milliseconds."""
+        timings = {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+        timings['total'] = round(self.elapsed() * 1000, 3)
+        return timings
+
+def record_fetch(status: Optional[int] = None, error: Optional[Exception] = None) -> None:
+    FETCH_RESPONSES.labels(str(status) if status is not None else type(error).__name__).inc()
+
+class QueuedExecutor(ThreadPoolExecutor):
+    """A thread pool whose waiting tasks are counted in `QUEUE_DEPTH` under `queue`.
+
+    Counted as they're submitted and started rather than read from the
+    pool's queue, so the gauge also adds up across server workers.
+    """
+
+    def __init__(self, queue: str, **kwargs):
+        super().__init__(**kwargs)
+        self.depth = QUEUE_DEPTH.labels(queue)
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        def started():
+            self.depth.dec()
+            return fn(*args, **kwargs)
+
+        self.depth.inc()
+        try:
+            return super().submit(started)
+        except BaseException:
+            self.depth.dec()
+            raise
+
+def queue_depths(db: Session) -> Dict[str, int]:
+    """Depths of the database-backed queues; read on each scrape."""
+    return {
+        'job_items': db.query(func.count(JobItem.id)).filter(JobItem.status.in_(('queued', 'retrying'))).scalar(),
+        'monitors_due': db.query(func.count(Monitor.id)).filter(
+            Monitor.is_active.is_(True), Monitor.next_run_at <= datetime.utcnow()
+        ).scalar(),
+    }
+
+class WorkersCollector:
+    """Every server worker's metrics, from the files in `MULTIPROCESS_DIR`.
+
+    Database-backed queue depths are the same whichever worker reads them,
+    so they're added at scrape time instead of summed over workers.
+    """
+
+    def __init__(self, queue_depths: Dict[str, int]):
+        self.queue_depths = queue_depths
+
+    def collect(self):
+        extra = [Sample('webanalyzer_queue_depth', {'queue': queue}, float(depth))
+                 for queue, depth in self.queue_depths.items()]
+        for family in MultiProcessCollector(None, MULTIPROCESS_DIR).collect():
+            if family.name == 'webanalyzer_queue_depth':
+                family.samples.extend(extra)
+                extra = []
+            yield family
+        if extra:
+            family = GaugeMetricFamily('webanalyzer_queue_depth', QUEUE_DEPTH._documentation, labels=['queue'])
+            family.samples.extend(extra)
+            yield family
+
+def render(queue_depths: Optional[Dict[str, int]] = None) -> bytes:
+    if MULTIPROCESS_DIR is None:
+        for queue, depth in (queue_depths or {}).items():
+            QUEUE_DEPTH.labels(queue).set(depth)
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    registry.register(WorkersCollector(queue_depths or {}))
+    return generate_latest(registry)
+
+class MetricsMiddleware:
+    """ASGI middleware counting in-flight requests and timing them per handler."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # Label by handler name rather than path to keep cardinality bounded
+            endpoint = scope.get('endpoint')
+            handler = getattr(endpoint, '__name__', 'unmatched')
+            HTTP_REQUEST_SECONDS.labels(scope['method'], handler, str(status)).observe(time.perf_counter() - start)
@@ -1,7 +1,16 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, Float, JSON, ForeignKey
+from sqlalchemy import event, create_engine, Column, Integer, BigInteger, String, DateTime, Text, Boolean, Float, JSON, LargeBinary, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
+import os
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./webanalyzer.db')
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+)
+SessionLocal = sessionmaker(bind=engine)
 
 Base = declarative_base()
 
@@ -17,6 +26,17 @@ class User(Base):
 
     analyses = relationship("Analysis", back_populates="user")
 
+# Keys clients send as X-API-Key; only their SHA-256 is stored
+class ApiKey(Base):
+    __tablename__ = "api_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    key_hash = Column(String(64), unique=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    name = Column(String)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Analysis(Base):
     __tablename__ = "analyses"
 
@@ -29,7 +49,8 @@ class Analysis(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Analysis results stored as JSON
-    metadata = Column(JSON)
+    # ("metadata" is reserved by declarative models, so the attribute is renamed)
+    page_metadata = Column("metadata", JSON)
     links = Column(JSON)
     images = Column(JSON)
     content = Column(JSON)
@@ -42,3 +63,191 @@ class Analysis(Base):
 
     user_id = Column(Integer, ForeignKey("users.id"))
     user = relationship("User", back_populates="analyses")
+
+    seo_score = relationship("SEOScore", back_populates="analysis", uselist=False)
+    fetch_timings = relationship("FetchTiming", back_populates="analysis", order_by="FetchTiming.hop")
+    link_edges = relationship("LinkEdge", back_populates="analysis")
+    content_fingerprint = relationship("ContentFingerprint", back_populates="analysis", uselist=False)
+    content_buckets = relationship("ContentBucket", back_populates="analysis")
+
+class SEOScore(Base):
+    __tablename__ = "seo_scores"
+
+    id = Column(Integer, primary_key=True, index=True)
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), unique=True, index=True)
+    score = Column(Integer, index=True)
+    grade = Column(String(1), index=True)
+    ruleset_version = Column(String, index=True)
+    scored_at = Column(DateTime, default=datetime.utcnow)
+
+    analysis = relationship("Analysis", back_populates="seo_score")
+
+class SEORuleResult(Base):
+    __tablename__ = "seo_rule_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), index=True)
+    rule_id = Column(String)
+    passed = Column(Boolean)
+    points = Column(Integer)
+    issue = Column(Text)
+
+    __table_args__ = (
+        Index("ix_seo_rule_results_rule_passed", "rule_id", "passed"),
+    )
+
+# Network timing of each hop, redirects included, of the fetch behind an analysis
+class FetchTiming(Base):
+    __tablename__ = "fetch_timings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), index=True)
+    hop = Column(Integer)  # 0 is the requested URL, the last hop the final response
+    url = Column(String)
+    status_code = Column(Integer)
+    http_version = Column(String(8))
+    reused_connection = Column(Boolean)
+    # Milliseconds; setup phases are null on reused connections, tls_ms also on plain HTTP
+    dns_ms = Column(Float)
+    connect_ms = Column(Float)
+    tls_ms = Column(Float)
+    ttfb_ms = Column(Float)
+    download_ms = Column(Float)
+    total_ms = Column(Float)
+    bytes = Column(Integer)
+    throughput_bps = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    analysis = relationship("Analysis", back_populates="fetch_timings")
+
+    __table_args__ = (
+        Index("ix_fetch_timings_url_created", "url", "created_at"),
+    )
+
+# One outbound link of an analyzed page, for querying links across analyses
+class LinkEdge(Base):
+    __tablename__ = "link_edges"
+
+    id = Column(Integer, primary_key=True)
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), index=True)
+    target_url = Column(String)  # normalized, as crawler.normalize_url
+    target_domain = Column(String)  # host without a leading "www."
+    is_internal = Column(Boolean)
+    created_at = Column(DateTime, default=datetime.utcnow)  # the analysis' time
+
+    analysis = relationship("Analysis", back_populates="link_edges")
+
+    __table_args__ = (
+        Index("ix_link_edges_domain_created", "target_domain", "created_at"),
+        Index("ix_link_edges_url_created", "target_url", "created_at"),
+        # Covers the top-domains aggregate over a time range
+        Index("ix_link_edges_created_domain", "created_at", "is_internal", "target_domain", "analysis_id"),
+    )
+
+# MinHash signature of an analysis' page text, see near_duplicates.py
+class ContentFingerprint(Base):
+    __tablename__ = "content_fingerprints"
+
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), primary_key=True)
+    signature = Column(LargeBinary)  # little-endian uint32s
+
+    analysis = relationship("Analysis", back_populates="content_fingerprint")
+
+# One LSH band of a content fingerprint; analyses sharing a bucket are near-duplicate candidates
+class ContentBucket(Base):
+    __tablename__ = "content_buckets"
+
+    id = Column(Integer, primary_key=True)
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), index=True)
+    band = Column(Integer)
+    bucket = Column(BigInteger)
+
+    analysis = relationship("Analysis", back_populates="content_buckets")
+
+    __table_args__ = (
+        # Newest candidates first within a bucket
+        Index("ix_content_buckets_band_bucket", "band", "bucket", "analysis_id"),
+    )
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(String, index=True)  # batch, crawl
+    status = Column(String, index=True, default="queued")  # queued, running, completed, failed, cancelled
+    params = Column(JSON)
+    total = Column(Integer, default=0)
+    report = Column(JSON)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    items = relationship("JobItem", back_populates="job", order_by="JobItem.position")
+
+class JobItem(Base):
+    __tablename__ = "job_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(32), ForeignKey("jobs.id"), index=True)
+    position = Column(Integer)
+    url = Column(String)
+    status = Column(String, index=True, default="queued")  # queued, running, retrying, completed, failed, cancelled
+    attempts = Column(Integer, default=0)
+    analysis_id = Column(Integer, ForeignKey("analyses.id"))
+    error = Column(Text)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    job = relationship("Job", back_populates="items")
+
+    __table_args__ = (
+        UniqueConstraint("job_id", "position", name="uq_job_items_job_position"),
+        Index("ix_job_items_job_url", "job_id", "url"),
+    )
+
+class Monitor(Base):
+    __tablename__ = "monitors"
+
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String, index=True)
+    settings = Column(JSON)
+    interval_seconds = Column(Integer)
+    full_snapshot_every = Column(Integer, default=10)
+    is_active = Column(Boolean, default=True, index=True)
+    next_run_at = Column(DateTime, index=True)
+    last_run_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # State of the latest run, used to skip unchanged pages and diff changed ones
+    last_content_hash = Column(String(64))
+    last_etag = Column(String)
+    last_modified = Column(String)
+    last_view = Column(JSON)
+    runs_since_full = Column(Integer, default=0)
+
+    runs = relationship("MonitorRun", back_populates="monitor", order_by="MonitorRun.id")
+
+class MonitorRun(Base):
+    __tablename__ = "monitor_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    monitor_id = Column(Integer, ForeignKey("monitors.id"), index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    kind = Column(String)  # full, diff, unchanged, error
+    status_code = Column(Integer)
+    content_hash = Column(String(64))
+    analysis_id = Column(Integer, ForeignKey("analyses.id"))  # full snapshots only
+    diff = Column(JSON)  # diff runs only
+    seo_score = Column(Integer)
+    seo_score_delta = Column(Integer)
+    error = Column(Text)
+
+    monitor = relationship("Monitor", back_populates="runs")
+
+# The full-text index isn't a mapped table, so it's created here along with
+# the tables, by whichever entry point creates them
+@event.listens_for(Base.metadata, 'after_create')
+def _create_search_index(target, connection, **kw) -> None:
+    import search  # search imports this module
+
+    search.install(connection)
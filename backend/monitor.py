@@ -0,0 +1,232 @@
+import hashlib
+import os
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Any
+from urllib.parse import urlparse
+
+import requests
+from sqlalchemy.orm import Session
+
+from models import Analysis, Monitor, MonitorRun
+from pipeline import AnalysisSettings, fetch_page, analyze_response, compute_stats, analysis_record
+import seo
+
+MONITOR_TICK = int(os.getenv('MONITOR_TICK', 30))  # seconds between scheduler passes
+MONITOR_HOST_CAP = int(os.getenv('MONITOR_HOST_CAP', 2))  # runs per host per pass
+MONITOR_JITTER = float(os.getenv('MONITOR_JITTER', 0.1))  # fraction of the interval
+MIN_INTERVAL = 60
+
+# Fields of a snapshot view, by how they are diffed.
+SCALAR_FIELDS = ('title', 'canonical', 'seo_score')
+MAPPING_FIELDS = ('meta_tags',)
+SET_FIELDS = ('links', 'images')
+
+def make_view(title: Optional[str], metadata: Optional[Dict[str, Any]], links: Optional[Dict[str, Any]],
+              images: Optional[Dict[str, Any]], seo_score: Optional[int]) -> Dict[str, Any]:
+    """The compact, diffable state of a page that monitors track."""
+    metadata = metadata or {}
+    return {
+        'title': title,
+        'canonical': metadata.get('canonical'),
+        'seo_score': seo_score,
+        'meta_tags': dict(metadata.get('meta_tags') or {}),
+        'links': sorted({link['full_url'] for link in (links or {}).get('all', [])}),
+        'images': sorted({image['full_url'] for image in (images or {}).get('images', [])}),
+    }
+
+def view_from_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    return make_view(
+        result.get('title'), result.get('metadata'), result.get('links'), result.get('images'),
+        (result.get('seo_analysis') or {}).get('score')
+    )
+
+def view_from_analysis(analysis: Analysis) -> Dict[str, Any]:
+    return make_view(
+        analysis.title, analysis.page_metadata, analysis.links, analysis.images,
+        analysis.seo_score.score if analysis.seo_score else None
+    )
+
+def diff_views(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact diff holding only the fields that changed."""
+    diff = {}
+    for field in SCALAR_FIELDS:
+        if old.get(field) != new.get(field):
+            diff[field] = {'old': old.get(field), 'new': new.get(field)}
+    for field in MAPPING_FIELDS:
+        before, after = old.get(field) or {}, new.get(field) or {}
+        changed = {key: value for key, value in after.items() if before.get(key) != value}
+        removed = sorted(key for key in before if key not in after)
+        if changed or removed:
+            diff[field] = {'set': changed, 'removed': removed}
+    for field in SET_FIELDS:
+        before, after = set(old.get(field) or []), set(new.get(field) or [])
+        if before != after:
+            diff[field] = {'added': sorted(after - before), 'removed': sorted(before - after)}
+    return diff
+
+def apply_diff(view: Dict[str, Any], diff: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of `diff_views`: apply a diff to the older view."""
+    view = dict(view)
+    for field in SCALAR_FIELDS:
+        if field in diff:
+            view[field] = diff[field]['new']
+    for field in MAPPING_FIELDS:
+        if field in diff:
+            mapping = dict(view.get(field) or {})
+            mapping.update(diff[field]['set'])
+            for key in diff[field]['removed']:
+                mapping.pop(key, None)
+            view[field] = mapping
+    for field in SET_FIELDS:
+        if field in diff:
+            values = set(view.get(field) or [])
+            values.difference_update(diff[field]['removed'])
+            values.update(diff[field]['added'])
+            view[field] = sorted(values)
+    return view
+
+def next_run_time(monitor: Monitor, now: datetime) -> datetime:
+    """Next run after `now`, jittered so monitors created together drift apart."""
+    jitter = monitor.interval_seconds * MONITOR_JITTER
+    return now + timedelta(seconds=monitor.interval_seconds + random.uniform(-jitter, jitter))
+
+def create_monitor(db: Session, url: str, settings: AnalysisSettings, interval_seconds: int,
+                   full_snapshot_every: int = 10) -> Monitor:
+    if interval_seconds < MIN_INTERVAL:
+        raise ValueError(f"Interval must be at least {MIN_INTERVAL} seconds")
+    if full_snapshot_every < 1:
+        raise ValueError("full_snapshot_every must be at least 1")
+    monitor = Monitor(
+        url=url,
+        settings=settings.dict(),
+        interval_seconds=interval_seconds,
+        full_snapshot_every=full_snapshot_every,
+        # Spread first runs over a scheduler pass rather than all at once
+        next_run_at=datetime.utcnow() + timedelta(seconds=random.uniform(0, MONITOR_TICK)),
+        runs_since_full=0
+    )
+    db.add(monitor)
+    db.commit()
+    return monitor
+
+def claim_due_monitors(db: Session, now: Optional[datetime] = None, limit: int = 500,
+                       host_cap: int = MONITOR_HOST_CAP) -> List[int]:
+    """Pick due monitors for this pass and move their next run forward.
+
+    At most `host_cap` monitors per host are claimed per pass; the rest are
+    pushed back by a random fraction of a tick so one site isn't hit in a burst.
+    """
+    now = now or datetime.utcnow()
+    due = (
+        db.query(Monitor)
+        .filter(Monitor.is_active.is_(True), Monitor.next_run_at <= now)
+        .order_by(Monitor.next_run_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    per_host = Counter()
+    claimed = []
+    for monitor in due:
+        host = urlparse(monitor.url).netloc
+        if per_host[host] >= host_cap:
+            monitor.next_run_at = now + timedelta(seconds=random.uniform(1, MONITOR_TICK))
+            continue
+        per_host[host] += 1
+        monitor.next_run_at = next_run_time(monitor, now)
+        claimed.append(monitor.id)
+    db.commit()
+    return claimed
+
+def run_monitor(db: Session, monitor: Monitor, seo_engine=None) -> MonitorRun:
+    """Check a monitored URL once and record a full snapshot, a diff or nothing new."""
+    settings = AnalysisSettings(**(monitor.settings or {}))
+    run = MonitorRun(monitor_id=monitor.id, created_at=datetime.utcnow())
+    monitor.last_run_at = run.created_at
+
+    headers = {}
+    if monitor.last_etag:
+        headers['If-None-Match'] = monitor.last_etag
+    if monitor.last_modified:
+        headers['If-Modified-Since'] = monitor.last_modified
+
+    try:
+        response = fetch_page(monitor.url, settings, headers=headers)
+    except requests.RequestException as e:
+        run.kind = 'error'
+        run.error = str(e)
+        run.status_code = e.response.status_code if getattr(e, 'response', None) is not None else None
+        db.add(run)
+        db.commit()
+        return run
+
+    run.status_code = response.status_code
+    last_score = (monitor.last_view or {}).get('seo_score')
+    if response.status_code == 304:
+        content_hash = monitor.last_content_hash
+    else:
+        content_hash = hashlib.sha256(response.content).hexdigest()
+    run.content_hash = content_hash
+
+    if monitor.last_view is not None and content_hash == monitor.last_content_hash:
+        # Unchanged: skip parsing and extraction entirely
+        run.kind = 'unchanged'
+        run.seo_score = last_score
+        run.seo_score_delta = 0
+    else:
+        result, content_length = analyze_response(monitor.url, response, settings, seo_engine)
+        result['stats'] = compute_stats(result, content_length)
+        view = view_from_result(result)
+        run.seo_score = view['seo_score']
+        if last_score is not None and view['seo_score'] is not None:
+            run.seo_score_delta = view['seo_score'] - last_score
+
+        if monitor.last_view is None or (monitor.runs_since_full or 0) + 1 >= monitor.full_snapshot_every:
+            record = analysis_record(result, settings)
+            db.add(record)
+            db.flush()
+            if result.get('seo_analysis'):
+                seo.save_result(db, record.id, result['seo_analysis'], commit=False)
+            run.kind = 'full'
+            run.analysis_id = record.id
+            monitor.runs_since_full = 0
+        else:
+            run.kind = 'diff'
+            run.diff = diff_views(monitor.last_view, view)
+            monitor.runs_since_full = (monitor.runs_since_full or 0) + 1
+        monitor.last_view = view
+        monitor.last_content_hash = content_hash
+
+    if response.status_code != 304:
+        monitor.last_etag = response.headers.get('etag')
+        monitor.last_modified = response.headers.get('last-modified')
+    db.add(run)
+    db.commit()
+    return run
+
+def reconstruct_view(db: Session, run: MonitorRun) -> Optional[Dict[str, Any]]:
+    """Rebuild the page state as of `run` from the last full snapshot and later diffs."""
+    full = (
+        db.query(MonitorRun)
+        .filter(MonitorRun.monitor_id == run.monitor_id, MonitorRun.kind == 'full', MonitorRun.id <= run.id)
+        .order_by(MonitorRun.id.desc())
+        .first()
+    )
+    if full is None:
+        return None
+    analysis = db.get(Analysis, full.analysis_id)
+    if analysis is None:
+        return None
+
+    view = view_from_analysis(analysis)
+    diffs = (
+        db.query(MonitorRun.diff)
+        .filter(MonitorRun.monitor_id == run.monitor_id, MonitorRun.kind == 'diff',
+                MonitorRun.id > full.id, MonitorRun.id <= run.id)
+        .order_by(MonitorRun.id)
+    )
+    for (diff,) in diffs:
+        view = apply_diff(view, diff)
+    return view
@@ -0,0 +1,279 @@
+"""Near-duplicate detection over the text of analyzed pages.
+
+Each page's text is reduced to a MinHash signature: for each of
+`MINHASH_PERMUTATIONS` hash functions, the smallest hash of any of the page's
+word shingles. The share of positions at which two signatures agree estimates
+the Jaccard similarity of the two pages' shingle sets. Signatures are cut into
+`LSH_BANDS` bands, and each band's hash is stored in `content_buckets`. Pages
+sharing a bucket in any band are candidates, and only candidates' signatures
+are compared, so a lookup is a few index probes however many pages are stored.
+
+Hashing is vectorized with NumPy: shingle hashes are built from token hashes
+a word position at a time, and every hash function runs over all shingles at
+once. Signatures are stored, so the hash functions are derived from fixed
+constants rather than a random generator and must not change.
+"""
+import argparse
+import logging
+import os
+import re
+import time
+import zlib
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Callable, Iterable, Tuple, TYPE_CHECKING
+
+from sqlalchemy import select, insert, exists
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, Analysis, ContentFingerprint, ContentBucket
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# NumPy is imported on first use rather than at startup, as in seo.py
+
+logger = logging.getLogger(__name__)
+
+MINHASH_PERMUTATIONS = 128
+# 16 bands of 8 rows: pages with 80% of their shingles in common share a
+# bucket 95% of the time, pages with 50% in common only 6% of the time
+LSH_BANDS = 16
+SHINGLE_WORDS = int(os.getenv('NEAR_DUPLICATE_SHINGLE_WORDS', 5))
+# Estimated Jaccard similarity from which pages count as near-duplicates
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', 0.8))
+# Similarity from which one page's AI insights are reused for the other
+NEAR_DUPLICATE_AI_REUSE_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_AI_REUSE_THRESHOLD', 0.95))
+# Most recent candidates compared per band, so heavily templated pages stay cheap to look up
+NEAR_DUPLICATE_MAX_CANDIDATES = int(os.getenv('NEAR_DUPLICATE_MAX_CANDIDATES', 500))
+NEAR_DUPLICATE_LIMIT = 10
+FINGERPRINT_BACKFILL_CHUNK_SIZE = int(os.getenv('FINGERPRINT_BACKFILL_CHUNK_SIZE', 1000))
+
+WORD = re.compile(r'\w+')
+# Shingles hashed per block, bounding memory to block x permutations
+HASH_BLOCK = 4096
+SHINGLE_MULTIPLIER = 0x100000001B3
+# As stored in `content_fingerprints.signature`
+SIGNATURE_DTYPE = '<u4'
+
+def _mix(x: 'np.ndarray') -> 'np.ndarray':
+    """splitmix64's finalizer, spreading every input bit over the output."""
+    import numpy as np
+
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+@lru_cache(maxsize=None)
+def _hash_functions() -> Tuple['np.ndarray', 'np.ndarray']:
+    """Multiply-shift hash functions h(x) = (a * x + b) >> 32, with a odd, as columns of a and b."""
+    import numpy as np
+
+    seeds = np.arange(1, 2 * MINHASH_PERMUTATIONS + 1, dtype=np.uint64)
+    a = _mix(seeds[:MINHASH_PERMUTATIONS]) | np.uint64(1)
+    b = _mix(seeds[MINHASH_PERMUTATIONS:])
+    return a[:, np.newaxis], b[:, np.newaxis]
+
+def shingle_hashes(text: str) -> 'np.ndarray':
+    """Distinct 64-bit hashes of the text's overlapping `SHINGLE_WORDS`-word shingles."""
+    import numpy as np
+
+    tokens = WORD.findall(text.lower())
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    token_hashes = np.fromiter((zlib.crc32(token.encode()) for token in tokens), dtype=np.uint64, count=len(tokens))
+    width = min(SHINGLE_WORDS, len(tokens))
+    count = len(tokens) - width + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(width):
+        hashes = hashes * np.uint64(SHINGLE_MULTIPLIER) + token_hashes[offset:offset + count]
+    return np.unique(_mix(hashes))
+
+@lru_cache(maxsize=256)
+def signature(text: str) -> Optional['np.ndarray']:
+    """MinHash signature of a page's text as `MINHASH_PERMUTATIONS` uint32s, or None without words.
+
+    Cached, as the same text is looked up during analysis and stored with it.
+    """
+    import numpy as np
+
+    a, b = _hash_functions()
+    hashes = shingle_hashes(text)
+    if not len(hashes):
+        return None
+    minimum = np.full(MINHASH_PERMUTATIONS, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(hashes), HASH_BLOCK):
+        block = (a * hashes[start:start + HASH_BLOCK] + b) >> np.uint64(32)
+        np.minimum(minimum, block.min(axis=1), out=minimum)
+    result = minimum.astype(SIGNATURE_DTYPE)
+    result.flags.writeable = False
+    return result
+
+def band_keys(sig: 'np.ndarray') -> List[int]:
+    """One signed 64-bit bucket key per LSH band of a signature."""
+    import numpy as np
+
+    bands = sig.reshape(LSH_BANDS, -1).astype(np.uint64)
+    keys = np.zeros(LSH_BANDS, dtype=np.uint64)
+    for column in bands.T:
+        keys = _mix(keys * np.uint64(SHINGLE_MULTIPLIER) + column)
+    return keys.view(np.int64).tolist()
+
+def similarity(sig: 'np.ndarray', others: 'np.ndarray') -> 'np.ndarray':
+    """Estimated Jaccard similarity of a signature to each row of `others`."""
+    return (others == sig).mean(axis=1)
+
+def _page_text(result: Dict[str, Any]) -> str:
+    return (result.get('content') or {}).get('text') or ''
+
+def fingerprint_record(result: Dict[str, Any]) -> Optional[ContentFingerprint]:
+    """The signature row for a new analysis, if its result has page text."""
+    sig = signature(_page_text(result))
+    return ContentFingerprint(signature=sig.tobytes()) if sig is not None else None
+
+def bucket_records(result: Dict[str, Any]) -> List[ContentBucket]:
+    """The LSH bucket rows for a new analysis."""
+    sig = signature(_page_text(result))
+    if sig is None:
+        return []
+    return [ContentBucket(band=band, bucket=key) for band, key in enumerate(band_keys(sig))]
+
+def find(db: Session, sig: 'np.ndarray', exclude_urls: Iterable[str] = (), threshold: float = NEAR_DUPLICATE_THRESHOLD,
+         limit: int = NEAR_DUPLICATE_LIMIT) -> List[Dict[str, Any]]:
+    """Stored analyses whose text is a near-duplicate of `sig`'s, most similar first.
+
+    Analyses of the URLs in `exclude_urls` are left out: a page analyzed
+    again is not a duplicate of itself. Each other URL appears once, as its
+    most similar analysis.
+    """
+    import numpy as np
+
+    candidates = set()
+    for band, key in enumerate(band_keys(sig)):
+        candidates.update(db.execute(
+            select(ContentBucket.analysis_id)
+            .where(ContentBucket.band == band, ContentBucket.bucket == key)
+            .order_by(ContentBucket.analysis_id.desc())
+            .limit(NEAR_DUPLICATE_MAX_CANDIDATES)
+        ).scalars())
+    if not candidates:
+        return []
+
+    rows = db.execute(
+        select(ContentFingerprint.analysis_id, ContentFingerprint.signature, Analysis.url, Analysis.final_url)
+        .join(Analysis, Analysis.id == ContentFingerprint.analysis_id)
+        .where(ContentFingerprint.analysis_id.in_(candidates))
+        .order_by(ContentFingerprint.analysis_id.desc())
+    ).all()
+    signatures = np.frombuffer(b''.join(row.signature for row in rows), dtype=SIGNATURE_DTYPE).reshape(len(rows), -1)
+    scores = similarity(sig, signatures)
+
+    excluded = set(exclude_urls)
+    matches: Dict[str, Dict[str, Any]] = {}
+    for row, score in zip(rows, scores.tolist()):
+        if score < threshold or row.url in excluded or row.final_url in excluded:
+            continue
+        best = matches.get(row.url)
+        if best is None or score > best['similarity']:
+            matches[row.url] = {'analysis_id': row.analysis_id, 'url': row.url, 'similarity': round(score, 3)}
+    return sorted(matches.values(), key=lambda match: (-match['similarity'], -match['analysis_id']))[:limit]
+
+def lookup(text: str, url: str, final_url: Optional[str] = None,
+           session_factory: Callable[[], Session] = SessionLocal) -> List[Dict[str, Any]]:
+    """Near-duplicates of a page being analyzed, for `content['near_duplicates']`.
+
+    A failed lookup is logged and finds nothing, rather than failing the analysis.
+    """
+    sig = signature(text)
+    if sig is None:
+        return []
+    try:
+        with session_factory() as db:
+            return find(db, sig, (url, final_url or url))
+    except SQLAlchemyError:
+        logger.warning("Near-duplicate lookup failed", exc_info=True, extra={'url': url})
+        return []
+
+def reusable_insights(result: Dict[str, Any],
+                      session_factory: Callable[[], Session] = SessionLocal) -> Optional[Dict[str, Any]]:
+    """Stored AI insights of a near-identical page, to use instead of asking the model again.
+
+    Only successful insights of matches at `NEAR_DUPLICATE_AI_REUSE_THRESHOLD`
+    or above are reused; `reused_from` names the analysis they came from.
+    """
+    matches = [match for match in (result.get('content') or {}).get('near_duplicates') or []
+               if match['similarity'] >= NEAR_DUPLICATE_AI_REUSE_THRESHOLD]
+    if not matches:
+        return None
+    try:
+        with session_factory() as db:
+            insights = dict(db.execute(
+                select(Analysis.id, Analysis.ai_insights).where(Analysis.id.in_([m['analysis_id'] for m in matches]))
+            ).all())
+    except SQLAlchemyError:
+        logger.warning("Loading reusable AI insights failed", exc_info=True, extra={'url': result.get('url')})
+        return None
+    for match in matches:
+        stored = insights.get(match['analysis_id'])
+        if stored and stored.get('success'):
+            return dict(stored, reused_from=match['analysis_id'])
+    return None
+
+def backfill(chunk_size: int = FINGERPRINT_BACKFILL_CHUNK_SIZE,
+             session_factory: Callable[[], Session] = SessionLocal) -> Dict[str, Any]:
+    """Fingerprint stored analyses that have no fingerprint, a chunk per transaction.
+
+    Like `link_index.backfill`, an interrupted run picks up where it stopped.
+    Analyses without page text are looked at again on every run.
+    """
+    started = time.perf_counter()
+    query = (
+        select(Analysis.id, Analysis.content)
+        .where(~exists().where(ContentFingerprint.analysis_id == Analysis.id))
+        .order_by(Analysis.id)
+        .limit(chunk_size)
+    )
+    analyses = fingerprints = chunks = 0
+    last_id = 0
+    with session_factory() as db:
+        while True:
+            rows = db.execute(query.where(Analysis.id > last_id)).all()
+            if not rows:
+                break
+            chunk_fingerprints, chunk_buckets = [], []
+            for analysis_id, content in rows:
+                sig = signature((content or {}).get('text') or '')
+                if sig is None:
+                    continue
+                chunk_fingerprints.append({'analysis_id': analysis_id, 'signature': sig.tobytes()})
+                chunk_buckets += [{'analysis_id': analysis_id, 'band': band, 'bucket': key}
+                                  for band, key in enumerate(band_keys(sig))]
+            if chunk_fingerprints:
+                db.execute(insert(ContentFingerprint), chunk_fingerprints)
+                db.execute(insert(ContentBucket), chunk_buckets)
+            db.commit()
+            last_id = rows[-1].id
+            analyses += len(rows)
+            fingerprints += len(chunk_fingerprints)
+            chunks += 1
+            logger.info("Backfilled content fingerprints",
+                        extra={'analyses': analyses, 'fingerprints': fingerprints, 'last_id': last_id})
+    return {'analyses': analyses, 'fingerprints': fingerprints, 'chunks': chunks,
+            'seconds': time.perf_counter() - started}
+
+def main():
+    parser = argparse.ArgumentParser(description="Fingerprint stored analyses for near-duplicate lookups.")
+    parser.add_argument('--chunk-size', type=int, default=FINGERPRINT_BACKFILL_CHUNK_SIZE,
+                        help="analyses per transaction")
+    args = parser.parse_args()
+
+    from models import Base, engine
+    Base.metadata.create_all(bind=engine)
+    stats = backfill(args.chunk_size)
+    print(f"analyses: {stats['analyses']}  fingerprints: {stats['fingerprints']}  chunks: {stats['chunks']}  "
+          f"{stats['seconds']:.1f}s")
+
+if __name__ == '__main__':
+    main()
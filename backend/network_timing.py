@@ -0,0 +1,152 @@
+"""Per-hop network timings for `requests` fetches.
+
+`TimingAdapter` breaks every response, redirect hops included, into DNS
+resolution, TCP connect, TLS handshake, time to first byte and body download,
+and notes whether the connection was reused and the HTTP version spoken. The
+breakdown is left on each `requests.Response` as `network_timing`.
+"""
+import socket
+import time
+from typing import Optional, Dict, Any, List
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import HTTPError
+
+HTTP_VERSIONS = {9: 'HTTP/0.9', 10: 'HTTP/1.0', 11: 'HTTP/1.1', 20: 'HTTP/2', 30: 'HTTP/3'}
+
+# Summed over the hops of a fetch in `summarize`
+PHASES = ('dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'download_ms', 'total_ms')
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+class _TimedConnection:
+    """Mixin timing the connection setup and each response's headers."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Set by connect() and consumed by the next response, so later responses count as reused
+        self._setup_timing: Optional[Dict[str, Optional[float]]] = None
+        self._request_sent = 0.0
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)
+        except socket.gaierror:
+            addresses = None
+        if not addresses:
+            return super()._new_conn()  # fails again, with urllib3's own error
+        resolved = time.perf_counter()
+
+        # Connect to the resolved addresses in turn, as socket.create_connection would
+        host = self._dns_host
+        try:
+            for i, address in enumerate(addresses):
+                self._dns_host = address[4][0]
+                try:
+                    sock = super()._new_conn()
+                    break
+                except HTTPError:
+                    if i == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+        connected = time.perf_counter()
+
+        self._setup_timing = {'dns': resolved - started, 'connect': connected - resolved, 'tls': None}
+        self._connected_at = connected
+        return sock
+
+    def connect(self):
+        self._setup_timing = None
+        super().connect()
+        if self._setup_timing is not None and isinstance(self, HTTPSConnection):
+            # Everything after the TCP connect: the TLS handshake (and any proxy tunnel)
+            self._setup_timing['tls'] = time.perf_counter() - self._connected_at
+
+    def request(self, *args, **kwargs):
+        super().request(*args, **kwargs)
+        self._request_sent = time.perf_counter()
+
+    def getresponse(self, *args, **kwargs):
+        response = super().getresponse(*args, **kwargs)
+        setup, self._setup_timing = self._setup_timing, None
+        response.network_timing = {
+            'http_version': HTTP_VERSIONS.get(getattr(response, 'version', None), 'HTTP/?'),
+            'reused_connection': setup is None,
+            'dns_ms': _ms(setup and setup['dns']),
+            'connect_ms': _ms(setup and setup['connect']),
+            'tls_ms': _ms(setup and setup['tls']),
+            'ttfb_ms': _ms(time.perf_counter() - self._request_sent),
+        }
+        return response
+
+class TimedHTTPConnection(_TimedConnection, HTTPConnection):
+    pass
+
+class TimedHTTPSConnection(_TimedConnection, HTTPSConnection):
+    pass
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class TimingAdapter(HTTPAdapter):
+    """`requests` transport recording `network_timing` on every response.
+
+    Unless streaming, the body is read here so its download is timed too.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+
+    def send(self, request, stream=False, **kwargs):
+        started = time.perf_counter()
+        response = super().send(request, stream=stream, **kwargs)
+        timing = getattr(response.raw, 'network_timing', None)
+        if timing is None:
+            return response
+
+        timing = dict(timing, url=request.url, status_code=response.status_code)
+        if not stream:
+            headers_at = time.perf_counter()
+            response.content
+            finished = time.perf_counter()
+            # Bytes as received, before any content decoding
+            received = response.raw.tell() if hasattr(response.raw, 'tell') else len(response.content)
+            download = finished - headers_at
+            timing.update(
+                download_ms=_ms(download),
+                total_ms=_ms(finished - started),
+                bytes=received,
+                throughput_bps=round(received / download) if download > 0 else None,
+            )
+        response.network_timing = timing
+        return response
+
+def hop_timings(response) -> List[Dict[str, Any]]:
+    """Timings of each hop that led to `response`, redirects first."""
+    return [hop.network_timing for hop in [*response.history, response] if getattr(hop, 'network_timing', None)]
+
+def summarize(hops: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The `performance.network` entry: per-hop timings and their totals."""
+    if not hops:
+        return None
+    totals = {phase: round(sum(hop.get(phase) or 0 for hop in hops), 3) for phase in PHASES}
+    final = hops[-1]
+    return {
+        **totals,
+        'http_version': final['http_version'],
+        'reused_connections': sum(1 for hop in hops if hop['reused_connection']),
+        'throughput_bps': final.get('throughput_bps'),
+        'hops': hops,
+    }
@@ -0,0 +1,180 @@
+"""Page-weight audit: size, compression and caching of a page's subresources.
+
+Stylesheets, scripts, images and fonts referenced by the page are fetched
+concurrently with HEAD requests, falling back to a ranged GET where HEAD is
+refused or gives no size. Per-asset results are cached by URL, so pages that
+share assets don't fetch them again.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import requests
+
+from cache import SharedCache
+
+# Assets fetched at once per audit
+PAGE_WEIGHT_CONCURRENCY = int(os.getenv('PAGE_WEIGHT_CONCURRENCY', 8))
+# Assets beyond this many per page are counted but not fetched
+PAGE_WEIGHT_MAX_ASSETS = int(os.getenv('PAGE_WEIGHT_MAX_ASSETS', 200))
+PAGE_WEIGHT_TIMEOUT = float(os.getenv('PAGE_WEIGHT_TIMEOUT', 10))
+ASSET_CACHE_TTL = int(os.getenv('ASSET_CACHE_TTL', 86400))
+ASSET_CACHE_SIZE = int(os.getenv('ASSET_CACHE_SIZE', 5000))
+
+# Bodies read to measure assets whose server reports no size
+MAX_MEASURED_BYTES = 10 * 1024 * 1024
+LARGEST_ASSETS = 10
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/x-javascript', 'application/json',
+                      'application/xml', 'image/svg+xml', 'font/ttf', 'font/otf', 'application/vnd.ms-fontobject')
+FONT_EXTENSIONS = ('.woff2', '.woff', '.ttf', '.otf', '.eot')
+CSS_URL = re.compile(r'url\(\s*[\'"]?([^\'")]+)[\'"]?\s*\)')
+CONTENT_RANGE_TOTAL = re.compile(r'/\s*(\d+)\s*$')
+
+def collect_subresources(soup, base_url: str) -> List[Tuple[str, str]]:
+    """The page's stylesheet, script, image and font URLs with their type, deduplicated in page order."""
+    found: Dict[str, str] = {}
+
+    def add(url: Optional[str], kind: str) -> None:
+        if not url or url.startswith(('data:', 'javascript:', '#')):
+            return
+        full_url = urljoin(base_url, url.strip()).split('#', 1)[0]
+        if urlsplit(full_url).scheme in ('http', 'https'):
+            found.setdefault(full_url, kind)
+
+    for link in soup.find_all('link', href=True):
+        rel = [value.lower() for value in link.get('rel', [])]
+        if 'stylesheet' in rel:
+            add(link['href'], 'stylesheet')
+        elif 'preload' in rel or 'prefetch' in rel:
+            kind = {'style': 'stylesheet', 'script': 'script', 'image': 'image', 'font': 'font'}.get(link.get('as', ''))
+            if kind:
+                add(link['href'], kind)
+        elif 'icon' in rel:
+            add(link['href'], 'image')
+    for script in soup.find_all('script', src=True):
+        add(script['src'], 'script')
+    for img in soup.find_all(['img', 'source']):
+        add(img.get('src'), 'image')
+        for candidate in (img.get('srcset') or '').split(','):
+            add(candidate.strip().split(' ')[0], 'image')
+    for style in soup.find_all('style'):
+        for url in CSS_URL.findall(style.get_text()):
+            path = urlsplit(url).path.lower()
+            add(url, 'font' if path.endswith(FONT_EXTENSIONS) else 'image')
+    return list(found.items())
+
+def _max_age(cache_control: str) -> Optional[int]:
+    match = re.search(r'(?:s-maxage|max-age)\s*=\s*(\d+)', cache_control)
+    return int(match.group(1)) if match else None
+
+def _describe(url: str, kind: str, response: requests.Response, size: Optional[int]) -> Dict[str, Any]:
+    headers = response.headers
+    content_type = headers.get('content-type', '').split(';')[0].strip().lower()
+    encoding = headers.get('content-encoding', '').lower() or None
+    cache_control = headers.get('cache-control', '')
+    max_age = _max_age(cache_control.lower())
+    no_store = 'no-store' in cache_control.lower()
+    return {
+        'url': url,
+        'type': kind,
+        'status_code': response.status_code,
+        'size': size,
+        'content_type': content_type,
+        'content_encoding': encoding,
+        'compressible': content_type.startswith(COMPRESSIBLE_TYPES),
+        'cache_control': cache_control or None,
+        'max_age': max_age,
+        'etag': headers.get('etag'),
+        'last_modified': headers.get('last-modified'),
+        # Browsers can reuse it without a full download: fresh for a while, or revalidatable
+        'cacheable': not no_store and (bool(max_age) or 'etag' in headers or 'last-modified' in headers),
+    }
+
+def measure_asset(session: requests.Session, url: str, kind: str) -> Dict[str, Any]:
+    """Size, compression and cache headers of one asset, as transferred."""
+    try:
+        response = session.head(url, timeout=PAGE_WEIGHT_TIMEOUT, allow_redirects=True)
+        size = response.headers.get('content-length')
+        if response.ok and size is not None:
+            return _describe(url, kind, response, int(size))
+
+        # HEAD refused or sizeless: ask for the first byte and read the total from Content-Range
+        with session.get(url, timeout=PAGE_WEIGHT_TIMEOUT, allow_redirects=True, stream=True,
+                         headers={'Range': 'bytes=0-0'}) as response:
+            total = CONTENT_RANGE_TOTAL.search(response.headers.get('content-range', ''))
+            if response.status_code == 206 and total:
+                size = int(total.group(1))
+            elif not response.ok:
+                size = None
+            elif 'content-length' in response.headers:
+                size = int(response.headers['content-length'])
+            else:
+                # Range ignored and no length given (e.g. chunked): count the bytes as sent
+                size = 0
+                for chunk in response.raw.stream(64 * 1024, decode_content=False):
+                    size += len(chunk)
+                    if size >= MAX_MEASURED_BYTES:
+                        break
+            return _describe(url, kind, response, size)
+    except (requests.RequestException, ValueError) as e:
+        return {'url': url, 'type': kind, 'status_code': None, 'size': None, 'error': str(e)}
+
+# Shared across analyses; main points it at the app's Redis
+asset_cache = SharedCache('asset:', ASSET_CACHE_TTL, ASSET_CACHE_SIZE)
+
+def audit(subresources: List[Tuple[str, str]], user_agent: str,
+          adapter: Optional[requests.adapters.BaseAdapter] = None,
+          concurrency: int = PAGE_WEIGHT_CONCURRENCY, max_assets: int = PAGE_WEIGHT_MAX_ASSETS,
+          cache: Optional[SharedCache] = None) -> Dict[str, Any]:
+    """Measure the subresources and summarize the page weight.
+
+    Error responses are cached like the rest; assets that couldn't be fetched
+    at all (timeouts, connection errors) aren't, so they're retried next time.
+    """
+    cache = cache or asset_cache
+    audited = subresources[:max_assets]
+    cached = cache.get_many([url for url, _ in audited])
+    to_fetch = [(url, kind) for url, kind in audited if url not in cached]
+
+    fetched: Dict[str, Dict[str, Any]] = {}
+    if to_fetch:
+        with requests.Session() as session:
+            session.headers.update({'User-Agent': user_agent, 'Accept-Encoding': 'gzip, deflate, br'})
+            if adapter is None:
+                adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(to_fetch))),
+                                    thread_name_prefix='page-weight') as pool:
+                for asset in pool.map(lambda item: measure_asset(session, *item), to_fetch):
+                    fetched[asset['url']] = asset
+        cache.set_many({url: asset for url, asset in fetched.items() if not asset.get('error')})
+
+    assets = [dict(cached.get(url) or fetched[url], type=kind) for url, kind in audited]
+    return summarize(assets, total_found=len(subresources), cache_hits=len(cached))
+
+def summarize(assets: List[Dict[str, Any]], total_found: int, cache_hits: int = 0) -> Dict[str, Any]:
+    """Page-weight totals by asset type, with the assets worth fixing."""
+    by_type: Dict[str, Dict[str, int]] = {}
+    for asset in assets:
+        totals = by_type.setdefault(asset['type'], {'count': 0, 'bytes': 0})
+        totals['count'] += 1
+        totals['bytes'] += asset.get('size') or 0
+    measured = [asset for asset in assets if not asset.get('error') and asset['status_code'] < 400]
+    return {
+        'total_bytes': sum(totals['bytes'] for totals in by_type.values()),
+        'asset_count': total_found,
+        'audited': len(assets),
+        'failed': len(assets) - len(measured),
+        'cache_hits': cache_hits,
+        'by_type': by_type,
+        'uncompressed': [asset['url'] for asset in measured
+                         if asset['compressible'] and not asset['content_encoding'] and asset['size']],
+        'uncached': [asset['url'] for asset in measured if not asset['cacheable']],
+        'largest': [{'url': asset['url'], 'type': asset['type'], 'size': asset['size']}
+                    for asset in sorted(measured, key=lambda a: a['size'] or 0, reverse=True)[:LARGEST_ASSETS]],
+        'assets': assets,
+    }
@@ -0,0 +1,386 @@
+from pydantic import BaseModel
+from typing import Optional, Dict, Any, Tuple, List
+from bs4 import BeautifulSoup
+import requests
+import re
+from datetime import datetime
+from urllib.parse import urlparse, urljoin
+
+from models import Analysis, FetchTiming
+from metrics import Timings, record_fetch
+from network_timing import TimingAdapter, hop_timings, summarize
+import capture
+import charset
+import page_weight
+import link_checker
+import link_index
+import near_duplicates
+
+USER_AGENT = 'WebAnalyzerPro/2.0 (Advanced Web Analysis Tool)'
+
+# Transport for outbound fetches instead of the network, e.g. `capture.ReplayAdapter`
+fetch_adapter: Optional[requests.adapters.BaseAdapter] = None
+
+class AnalysisSettings(BaseModel):
+    include_metadata: bool = True
+    include_links: bool = True
+    include_images: bool = True
+    include_content: bool = True
+    include_ai_analysis: bool = True
+    include_seo_analysis: bool = True
+    max_content_length: int = 5000
+    max_links: int = 50
+    include_headers: bool = True
+    include_meta_tags: bool = True
+    include_performance: bool = True
+    follow_redirects: bool = True
+    include_page_weight: bool = False  # fetches every subresource, so off by default
+    check_links: bool = False  # requests every extracted link, so off by default
+    find_near_duplicates: bool = True  # looks the page text up among stored analyses
+    export_format: Optional[str] = None  # pdf, csv, excel, json
+
+def extract_metadata(soup, base_url: str) -> Dict[str, Any]:
+    """Extract metadata from the page."""
+    meta_tags = {}
+    for meta in soup.find_all('meta'):
+        name = meta.get('name') or meta.get('property') or meta.get('http-equiv')
+        if name and meta.get('content'):
+            meta_tags[name.lower()] = meta['content']
+
+    # Extract OpenGraph data
+    og_data = {}
+    for meta in soup.find_all('meta', property=re.compile(r'^og:')):
+        og_data[meta['property'][3:]] = meta['content']
+
+    # Extract Twitter card data
+    twitter_data = {}
+    for meta in soup.find_all('meta', attrs={'name': re.compile(r'^twitter:', re.I)}):
+        twitter_data[meta['name'].lower()] = meta.get('content', '')
+
+    # Extract canonical URL
+    canonical = soup.find('link', rel='canonical')
+
+    return {
+        'meta_tags': meta_tags,
+        'opengraph': og_data,
+        'twitter': twitter_data,
+        'canonical': canonical['href'] if canonical else None,
+        'language': soup.get('lang') or soup.html.get('lang', 'en'),
+        'charset': soup.meta.get('charset') if soup.meta else None,
+        'title': soup.title.string if soup.title else None
+    }
+
+def extract_links(soup, base_url: str, max_links: int = 50) -> Dict[str, Any]:
+    """Extract and categorize links from the page."""
+    all_links = []
+    internal_links = []
+    external_links = []
+
+    base_domain = urlparse(base_url).netloc
+
+    for link in soup.find_all('a', href=True):
+        href = link['href']
+        full_url = urljoin(base_url, href)
+        is_internal = urlparse(full_url).netloc == base_domain
+
+        link_data = {
+            'text': link.get_text(strip=True)[:100],
+            'href': href,
+            'full_url': full_url,
+            'title': link.get('title', ''),
+            'rel': link.get('rel', []),
+            'target': link.get('target', ''),
+            'is_internal': is_internal
+        }
+
+        all_links.append(link_data)
+        if is_internal:
+            internal_links.append(link_data)
+        else:
+            external_links.append(link_data)
+
+    return {
+        'all': all_links[:max_links],
+        'internal': internal_links[:max_links//2],
+        'external': external_links[:max_links//2],
+        'total': len(all_links),
+        'total_internal': len(internal_links),
+        'total_external': len(external_links)
+    }
+
+def extract_images(soup, base_url: str) -> Dict[str, Any]:
+    """Extract images from the page."""
+    images = []
+    for img in soup.find_all('img'):
+        src = img.get('src', '')
+        if src:
+            images.append({
+                'src': src,
+                'full_url': urljoin(base_url, src),
+                'alt': img.get('alt', ''),
+                'title': img.get('title', ''),
+                'width': img.get('width'),
+                'height': img.get('height'),
+                'loading': img.get('loading', 'eager')
+            })
+
+    return {
+        'images': images[:100],  # Limit to first 100 images
+        'total': len(images),
+        'with_alt': len([img for img in images if img['alt']]),
+        'without_alt': len([img for img in images if not img['alt']])
+    }
+
+def extract_headings(soup) -> Dict[str, Any]:
+    """Extract and count heading levels."""
+    headings = {}
+    for level in range(1, 7):
+        h_tags = soup.find_all(f'h{level}')
+        headings[f'h{level}'] = [{
+            'text': h.get_text(strip=True),
+            'id': h.get('id')
+        } for h in h_tags]
+    return headings
+
+def extract_performance_metrics(response, encoding: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Extract performance metrics.
+
+    `encoding` is the `{'name', 'source'}` from `charset.decode`. `network`
+    has the per-hop timing breakdown when the response was fetched through
+    `TimingAdapter`, else None.
+    """
+    return {
+        'response_time': response.elapsed.total_seconds(),
+        'content_length': len(response.content),
+        'content_type': response.headers.get('content-type', ''),
+        'server': response.headers.get('server', ''),
+        'encoding': encoding,
+        'redirect_count': len(response.history),
+        'network': summarize(hop_timings(response))
+    }
+
+def extract_content(soup, max_content_length: int) -> Dict[str, Any]:
+    """Extract clean text content, dropping scripts and styles."""
+    # Remove scripts and styles
+    for element in soup(["script", "style"]):
+        element.decompose()
+
+    # Get clean text content
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    content = '\n'.join(chunk for chunk in chunks if chunk)
+
+    return {
+        'text': content[:max_content_length],
+        'length': len(content),
+        'truncated': len(content) > max_content_length
+    }
+
+def parse_html(html):
+    """Parse an HTML document."""
+    return BeautifulSoup(html, 'html.parser')
+
+def build_result(url: str, final_url: str, status_code: int, soup, settings: AnalysisSettings,
+                 performance: Dict[str, Any], seo_engine=None, timings: Optional[Timings] = None) -> Dict[str, Any]:
+    """Run the extractors, the optional audits, the near-duplicate lookup and SEO scoring over a parsed page.
+
+    AI insights and stats are left to the caller.
+    """
+    timings = timings or Timings()
+    # Collected first: extract_content strips the scripts from the soup
+    subresources = page_weight.collect_subresources(soup, final_url) if settings.include_page_weight else None
+    with timings.stage('extract'):
+        result = _extract(url, final_url, status_code, soup, settings, performance)
+
+    if subresources is not None:
+        with timings.stage('page_weight'):
+            result['page_weight'] = page_weight.audit(subresources, USER_AGENT, fetch_adapter)
+
+    if settings.check_links and result.get('links'):
+        with timings.stage('link_check'):
+            result['link_check'] = link_checker.annotate_links(result['links'], USER_AGENT, fetch_adapter)
+
+    # Before SEO scoring, which reports near-duplicate content
+    if settings.find_near_duplicates and result.get('content'):
+        with timings.stage('near_duplicates'):
+            result['content']['near_duplicates'] = near_duplicates.lookup(result['content']['text'], url, final_url)
+
+    # SEO Analysis
+    if seo_engine and settings.include_seo_analysis and result.get('metadata') and result.get('content'):
+        with timings.stage('seo'):
+            result['seo_analysis'] = seo_engine.score(result)
+
+    return result
+
+def _extract(url: str, final_url: str, status_code: int, soup, settings: AnalysisSettings,
+             performance: Dict[str, Any]) -> Dict[str, Any]:
+    title = soup.title.string if soup.title else "No title found"
+
+    # Initialize result with basic info
+    result = {
+        'url': url,
+        'final_url': final_url,
+        'status_code': status_code,
+        'title': title,
+        'timestamp': datetime.utcnow().isoformat(),
+        'analysis_settings': settings.dict(),
+        'performance': performance
+    }
+
+    # Extract metadata if enabled
+    if settings.include_metadata:
+        result['metadata'] = extract_metadata(soup, final_url)
+
+    # Extract links if enabled
+    if settings.include_links:
+        result['links'] = extract_links(soup, final_url, settings.max_links)
+
+    # Extract images if enabled
+    if settings.include_images:
+        result['images'] = extract_images(soup, final_url)
+
+    # Extract content if enabled
+    if settings.include_content:
+        result['content'] = extract_content(soup, settings.max_content_length)
+
+    # Extract headers if enabled
+    if settings.include_headers:
+        result['headings'] = extract_headings(soup)
+
+    return result
+
+def fetch_page(url: str, settings: AnalysisSettings, user_agent: str = USER_AGENT,
+               headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    """Fetch a page, raising `requests.RequestException` on failure."""
+    try:
+        with requests.Session() as session:
+            adapter = fetch_adapter if fetch_adapter is not None else TimingAdapter()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            response = session.get(
+                url,
+                timeout=15,
+                allow_redirects=settings.follow_redirects,
+                headers={
+                    'User-Agent': user_agent,
+                    **(headers or {})
+                }
+            )
+    except requests.RequestException as e:
+        record_fetch(error=e)
+        raise
+    record_fetch(response.status_code)
+    if capture.recorder is not None:
+        capture.recorder.record_response(response)
+    response.raise_for_status()
+    return response
+
+def analyze_response(url: str, response: requests.Response, settings: AnalysisSettings,
+                     seo_engine=None, timings: Optional[Timings] = None) -> Tuple[Dict[str, Any], int]:
+    """Parse a fetched page and run it through `build_result`.
+
+    Returns the result and the length of the page text, for `compute_stats`.
+    The body is decoded by `charset.decode` rather than `response.text`,
+    which would run charset detection over the whole page.
+    """
+    timings = timings or Timings()
+    with timings.stage('decode'):
+        text, encoding = charset.decode(response.content, response.headers.get('content-type', ''))
+    with timings.stage('parse'):
+        soup = parse_html(text)
+    result = build_result(
+        url, response.url, response.status_code, soup, settings,
+        extract_performance_metrics(response, encoding), seo_engine, timings
+    )
+    return result, len(text)
+
+def fetch_and_analyze(url: str, settings: AnalysisSettings, seo_engine=None, user_agent: str = USER_AGENT,
+                      timings: Optional[Timings] = None) -> Tuple[Dict[str, Any], int]:
+    """Fetch a page and analyze it; see `analyze_response`."""
+    timings = timings or Timings()
+    with timings.stage('fetch'):
+        response = fetch_page(url, settings, user_agent)
+    return analyze_response(url, response, settings, seo_engine, timings)
+
+def compute_stats(result: Dict[str, Any], content_length: int, cache_used: bool = False,
+                  timings: Optional[Timings] = None) -> Dict[str, Any]:
+    """Summary stats for a finished result.
+
+    Processing time comes from `timings` when given, otherwise from the
+    result's timestamp.
+    """
+    if timings:
+        processing_time = timings.elapsed()
+    else:
+        processing_time = (datetime.utcnow() - datetime.fromisoformat(result['timestamp'])).total_seconds()
+    return {
+        'processing_time': processing_time,
+        'content_length': content_length,
+        'link_count': len(result.get('links', {}).get('all', [])) if 'links' in result else 0,
+        'image_count': len(result.get('images', {}).get('images', [])) if 'images' in result else 0,
+        'cache_used': cache_used
+    }
+
+def analysis_record(result: Dict[str, Any], settings: AnalysisSettings, user_id: Optional[int] = None) -> Analysis:
+    """Build the database row for an analysis result."""
+    return Analysis(
+        user_id=user_id,
+        url=result['url'],
+        final_url=result.get('final_url', result['url']),
+        title=result.get('title', ''),
+        status_code=result.get('status_code', 200),
+        processing_time=result.get('stats', {}).get('processing_time', 0),
+        page_metadata=result.get('metadata'),
+        links=result.get('links'),
+        images=result.get('images'),
+        content=result.get('content'),
+        headings=result.get('headings'),
+        stats=result.get('stats'),
+        ai_insights=result.get('ai_insights'),
+        analysis_settings=settings.dict(),
+        fetch_timings=fetch_timing_records(result),
+        link_edges=link_index.edge_records(result.get('links')),
+        content_fingerprint=near_duplicates.fingerprint_record(result),
+        content_buckets=near_duplicates.bucket_records(result)
+    )
+
+def fetch_timing_records(result: Dict[str, Any]) -> List[FetchTiming]:
+    """Rows for the result's per-hop network timings, if it has any."""
+    network = (result.get('performance') or {}).get('network') or {}
+    return [
+        FetchTiming(
+            hop=hop,
+            url=timing['url'],
+            status_code=timing['status_code'],
+            http_version=timing['http_version'],
+            reused_connection=timing['reused_connection'],
+            dns_ms=timing['dns_ms'],
+            connect_ms=timing['connect_ms'],
+            tls_ms=timing['tls_ms'],
+            ttfb_ms=timing['ttfb_ms'],
+            download_ms=timing.get('download_ms'),
+            total_ms=timing.get('total_ms'),
+            bytes=timing.get('bytes'),
+            throughput_bps=timing.get('throughput_bps')
+        )
+        for hop, timing in enumerate(network.get('hops', []))
+    ]
+
+def analysis_result(analysis: Analysis) -> Dict[str, Any]:
+    """Convert a stored analysis back to the result format."""
+    return {
+        "url": analysis.url,
+        "final_url": analysis.final_url,
+        "title": analysis.title,
+        "status_code": analysis.status_code,
+        "timestamp": analysis.created_at.isoformat(),
+        "metadata": analysis.page_metadata,
+        "links": analysis.links,
+        "images": analysis.images,
+        "content": analysis.content,
+        "headings": analysis.headings,
+        "stats": analysis.stats,
+        "ai_insights": analysis.ai_insights,
+        "analysis_settings": analysis.analysis_settings
+    }
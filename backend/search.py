@@ -0,0 +1,225 @@
+"""Full-text search over stored analyses.
+
+Titles, headings and page text are indexed by the database itself: an FTS5
+table on SQLite and a `tsvector` table with a GIN index on Postgres. Triggers
+on `analyses` keep the index in sync however rows are written (the API, jobs,
+crawls, ingestion or bulk inserts). `install`, which `models` runs whenever
+the tables are created, creates the index and backfills it from existing
+analyses.
+
+Results are ranked with title matches weighted above headings, and headings
+above body text. Pages are fetched with keyset pagination on (rank, id), so
+deep pages cost no more than the first.
+"""
+import base64
+import html
+import os
+import re
+from typing import Optional, Dict, Any, List, Tuple
+
+import orjson
+from sqlalchemy import inspect, text, Integer, Float, String, DateTime
+from sqlalchemy.engine import Connection
+
+SNIPPET_TOKENS = 24
+# Marks matched terms in snippets before the text is escaped
+MATCH_START, MATCH_END = '\x02', '\x03'
+
+SQLITE_ROW = """{row}.id, {row}.title, (SELECT group_concat(json_extract(h.value, '$.text'), ' ')
+        FROM json_each({row}.headings) AS level, json_each(level.value) AS h), json_extract({row}.content, '$.text')"""
+
+SQLITE_DDL = [
+    # Keeps its own copy of the text: FTS5 can't read external content through json_each
+    """CREATE VIRTUAL TABLE IF NOT EXISTS analysis_search USING fts5(
+    title, headings, body, tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    "INSERT INTO analysis_search(analysis_search, rank) VALUES ('rank', 'bm25(10.0, 4.0, 1.0)')",
+    f"""CREATE TRIGGER IF NOT EXISTS analysis_search_insert AFTER INSERT ON analyses BEGIN
+    INSERT INTO analysis_search(rowid, title, headings, body) SELECT {SQLITE_ROW.format(row='new')};
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS analysis_search_delete AFTER DELETE ON analyses BEGIN
+    DELETE FROM analysis_search WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS analysis_search_update AFTER UPDATE OF title, headings, content ON analyses BEGIN
+    DELETE FROM analysis_search WHERE rowid = old.id;
+    INSERT INTO analysis_search(rowid, title, headings, body) SELECT {SQLITE_ROW.format(row='new')};
+    END""",
+]
+
+POSTGRES_DDL = [
+    """CREATE TABLE IF NOT EXISTS analysis_search (
+    analysis_id integer PRIMARY KEY REFERENCES analyses (id) ON DELETE CASCADE,
+    document tsvector NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_analysis_search_document ON analysis_search USING GIN (document)",
+    # title, headings, content
+    """CREATE OR REPLACE FUNCTION analysis_search_document(text, json, json) RETURNS tsvector
+    LANGUAGE sql IMMUTABLE AS $$
+    SELECT setweight(to_tsvector('english', coalesce($1, '')), 'A')
+        || setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(h ->> 'text', ' ')
+            FROM json_each(CASE WHEN json_typeof($2) = 'object' THEN $2 ELSE '{}' END) AS level,
+                json_array_elements(CASE WHEN json_typeof(level.value) = 'array' THEN level.value ELSE '[]' END) AS h
+        ), '')), 'B')
+        || setweight(to_tsvector('english', coalesce(CASE WHEN json_typeof($3) = 'object' THEN $3 ->> 'text' END, '')), 'D')
+    $$""",
+    """CREATE OR REPLACE FUNCTION analysis_search_sync() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO analysis_search (analysis_id, document)
+        VALUES (NEW.id, analysis_search_document(NEW.title, NEW.headings, NEW.content))
+        ON CONFLICT (analysis_id) DO UPDATE SET document = EXCLUDED.document;
+        RETURN NULL;
+    END
+    $$""",
+    "DROP TRIGGER IF EXISTS analysis_search_sync ON analyses",
+    """CREATE TRIGGER analysis_search_sync AFTER INSERT OR UPDATE OF title, headings, content ON analyses
+    FOR EACH ROW EXECUTE FUNCTION analysis_search_sync()""",
+]
+
+SQLITE_BACKFILL = f"""INSERT INTO analysis_search(rowid, title, headings, body)
+SELECT {SQLITE_ROW.format(row='analyses')} FROM analyses"""
+POSTGRES_BACKFILL = """INSERT INTO analysis_search (analysis_id, document)
+SELECT id, analysis_search_document(title, headings, content) FROM analyses
+ON CONFLICT (analysis_id) DO NOTHING"""
+
+# The most recent matches past this many aren't ranked: scoring every match of
+# a common word costs time in proportion to the corpus, and ranks it poorly anyway
+SEARCH_RANK_WINDOW = int(os.getenv('SEARCH_RANK_WINDOW', 20000))
+
+# Lowest id still inside the ranking window, if there are more matches than fit
+SQLITE_FLOOR = """SELECT rowid FROM analysis_search WHERE analysis_search MATCH :query
+ORDER BY rowid DESC LIMIT 1 OFFSET :window"""
+# bm25 is lower-is-better; Postgres' ts_rank_cd is negated to match, so both sort ascending.
+# Snippets are made for the page of results only, looking rows up again by rowid.
+SQLITE_SEARCH = f"""WITH page AS (
+    SELECT rowid AS id, rank FROM analysis_search
+    WHERE analysis_search MATCH :query AND rowid >= :floor {{after}}
+    ORDER BY rank, rowid
+    LIMIT :limit
+)
+SELECT page.id, page.rank, a.url, a.title, a.created_at,
+    snippet(analysis_search, -1, char(2), char(3), '…', {SNIPPET_TOKENS}) AS snippet
+FROM page CROSS JOIN analysis_search ON analysis_search.rowid = page.id CROSS JOIN analyses AS a ON a.id = page.id
+WHERE analysis_search MATCH :query
+ORDER BY page.rank, page.id"""
+SQLITE_AFTER = "AND (rank > :rank OR (rank = :rank AND rowid > :id))"
+
+POSTGRES_FLOOR = """SELECT analysis_id FROM analysis_search
+WHERE document @@ websearch_to_tsquery('english', :query)
+ORDER BY analysis_id DESC OFFSET :window LIMIT 1"""
+POSTGRES_SEARCH = f"""WITH q AS (SELECT websearch_to_tsquery('english', :query) AS query),
+page AS (
+    SELECT ranked.id, ranked.rank FROM (
+        SELECT s.analysis_id AS id, -ts_rank_cd(s.document, q.query) AS rank
+        FROM analysis_search AS s, q WHERE s.document @@ q.query AND s.analysis_id >= :floor
+    ) AS ranked
+    WHERE true {{after}}
+    ORDER BY ranked.rank, ranked.id
+    LIMIT :limit
+)
+SELECT page.id, page.rank, a.url, a.title, a.created_at,
+    ts_headline('english', coalesce(a.content ->> 'text', ''), q.query,
+        'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxWords={SNIPPET_TOKENS}, MinWords=10, MaxFragments=2') AS snippet
+FROM page JOIN analyses AS a ON a.id = page.id, q
+ORDER BY page.rank, page.id"""
+POSTGRES_AFTER = "AND (ranked.rank > CAST(:rank AS real) OR (ranked.rank = CAST(:rank AS real) AND ranked.id > :id))"
+
+QUERY_TERM = re.compile(r'(-?)"([^"]*)"|(\S+)')
+WORD = re.compile(r'\w+')
+
+class InvalidCursor(ValueError):
+    pass
+
+def supported(dialect: str) -> bool:
+    return dialect in ('sqlite', 'postgresql')
+
+def install(connection: Connection) -> None:
+    """Create the search index and its triggers if missing, backfilling a new index from existing analyses."""
+    dialect = connection.dialect.name
+    if not supported(dialect):
+        return
+    exists = inspect(connection).has_table('analysis_search')
+    for statement in SQLITE_DDL if dialect == 'sqlite' else POSTGRES_DDL:
+        connection.exec_driver_sql(statement)
+    if not exists:
+        connection.exec_driver_sql(SQLITE_BACKFILL if dialect == 'sqlite' else POSTGRES_BACKFILL)
+
+def fts5_query(query: str) -> str:
+    """Translate web-style search syntax (words, "phrases", -exclusions, OR) into an FTS5 query.
+
+    Every term is quoted, so FTS5 operators and punctuation typed by users
+    can't make the query invalid.
+    """
+    terms, excluded = [], []
+    for negated, phrase, word in QUERY_TERM.findall(query):
+        if word == 'OR':
+            if terms and terms[-1] != 'OR':
+                terms.append('OR')
+            continue
+        negated = negated or word.startswith('-')
+        words = WORD.findall(phrase or word)
+        if not words:
+            continue
+        term = '"' + ' '.join(words) + '"'
+        (excluded if negated else terms).append(term)
+    if terms and terms[-1] == 'OR':
+        terms.pop()
+    if not terms:  # FTS5 can't match on exclusions alone
+        return ''
+    return ' '.join(terms) + ''.join(f" NOT {term}" for term in excluded)
+
+def encode_cursor(rank: float, analysis_id: int, floor: int) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps([rank, analysis_id, floor])).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[float, int, int]:
+    """Rank and id of the last result on the previous page, and the ranking window's floor."""
+    try:
+        rank, analysis_id, floor = orjson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return float(rank), int(analysis_id), int(floor)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+def _snippet(raw: Optional[str]) -> str:
+    # Page text is untrusted; escape it, then turn the match markers into <mark> tags
+    return html.escape(raw or '').replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+def search(connection: Connection, query: str, limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Analyses matching `query`, best first, with highlighted snippets.
+
+    Only the `SEARCH_RANK_WINDOW` most recent matches are ranked;
+    `ranked_recent_only` says whether there were more. Pass the returned
+    `next_cursor` back as `cursor` for the following page. Raises
+    `InvalidCursor` on a malformed cursor.
+    """
+    dialect = connection.dialect.name
+    if not supported(dialect):
+        raise NotImplementedError(f"Full-text search isn't available on {dialect}")
+    if dialect == 'sqlite':
+        match = fts5_query(query)
+        floor_sql, search_sql, after = SQLITE_FLOOR, SQLITE_SEARCH, SQLITE_AFTER
+    else:
+        match = query
+        floor_sql, search_sql, after = POSTGRES_FLOOR, POSTGRES_SEARCH, POSTGRES_AFTER
+    if not match:
+        return {'query': query, 'results': [], 'next_cursor': None, 'ranked_recent_only': False}
+
+    params: Dict[str, Any] = {'query': match, 'limit': limit}
+    if cursor:
+        # The first page's window, so later pages rank the same set of matches
+        params['rank'], params['id'], params['floor'] = decode_cursor(cursor)
+    else:
+        params['floor'] = connection.execute(text(floor_sql), {'query': match, 'window': SEARCH_RANK_WINDOW - 1}).scalar() or 0
+
+    statement = text(search_sql.format(after=after if cursor else '')).columns(
+        id=Integer, rank=Float, url=String, title=String, created_at=DateTime, snippet=String)
+    rows = connection.execute(statement, params).all()
+    results: List[Dict[str, Any]] = [{
+        'analysis_id': row.id,
+        'url': row.url,
+        'title': row.title,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'score': -row.rank,
+        'snippet': _snippet(row.snippet),
+    } for row in rows]
+    next_cursor = encode_cursor(rows[-1].rank, rows[-1].id, params['floor']) if len(rows) == limit else None
+    return {'query': query, 'results': results, 'next_cursor': next_cursor, 'ranked_recent_only': params['floor'] > 0}
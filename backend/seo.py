@@ -0,0 +1,289 @@
+import hashlib
+import operator
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Any, Iterable, Tuple, TYPE_CHECKING
+
+from sqlalchemy import select, delete, insert, or_
+from sqlalchemy.orm import Session
+
+from models import Analysis, SEOScore, SEORuleResult
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# NumPy and pandas are only needed for bulk scoring, so they're imported there
+# rather than at startup; inline scoring works on plain Python values.
+
+# Comparison operators usable in rule definitions. They work on plain
+# Python numbers (inline scoring) and on NumPy arrays (bulk scoring) alike.
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+}
+
+# Feature names every rule can refer to, in frame column order.
+FEATURES = (
+    'title_length',
+    'meta_description_length',
+    'h1_count',
+    'content_length',
+    'images_without_alt',
+    'internal_links',
+    'near_duplicates',
+)
+
+GRADE_THRESHOLDS = ((80, 'A'), (70, 'B'), (60, 'C'), (50, 'D'))
+
+@dataclass(frozen=True)
+class Finding:
+    """A failing condition of a rule: `feature <op> value`."""
+    op: str
+    value: float
+    issue: Optional[str] = None
+    recommendation: Optional[str] = None
+
+    def matches(self, values):
+        return OPERATORS[self.op](values, self.value)
+
+@dataclass(frozen=True)
+class SEORule:
+    """A declarative SEO check over a single feature.
+
+    Findings are tried in order and the first match fails the rule, costing
+    `penalty` points. A rule with no matching finding awards `points`.
+    """
+    id: str
+    feature: str
+    findings: Tuple[Finding, ...]
+    points: int = 0
+    penalty: int = 0
+
+DEFAULT_RULES = (
+    SEORule('title_length', 'title_length', (
+        Finding('==', 0, "Missing page title"),
+        Finding('<', 30, "Title too short (should be 30-60 characters)", "Expand title to 30-60 characters for better SEO"),
+        Finding('>', 60, "Title too long (should be 30-60 characters)", "Shorten title to under 60 characters"),
+    ), points=25),
+    SEORule('meta_description', 'meta_description_length', (
+        Finding('==', 0, "Missing meta description", "Add meta description (120-160 characters)"),
+        Finding('<', 120, "Meta description too short", "Expand meta description to 120-160 characters"),
+        Finding('>', 160, "Meta description too long", "Shorten meta description to under 160 characters"),
+    ), points=25),
+    SEORule('single_h1', 'h1_count', (
+        Finding('==', 0, "Missing H1 tag", "Add an H1 tag with your main keyword"),
+        Finding('>', 1, "Multiple H1 tags found", "Use only one H1 tag per page"),
+    ), points=20),
+    SEORule('content_length', 'content_length', (
+        Finding('<', 300, "Content too short for good SEO", "Add more content (aim for 300+ words)"),
+    ), points=15),
+    SEORule('image_alt_text', 'images_without_alt', (
+        Finding('>', 0, "{value} images missing alt text", "Add descriptive alt text to all images"),
+    ), penalty=10),
+    SEORule('internal_links', 'internal_links', (
+        Finding('<', 3, None, "Add more internal links to improve site structure"),
+    ), points=5),
+    SEORule('duplicate_content', 'near_duplicates', (
+        Finding('>', 0, "Content nearly duplicates {value} other analyzed pages",
+                "Make the content distinct, or point a canonical link at the original page"),
+    ), penalty=10),
+)
+
+def extract_features(metadata: Optional[Dict[str, Any]], content: Optional[Dict[str, Any]],
+                     headings: Optional[Dict[str, Any]], links: Optional[Dict[str, Any]],
+                     images: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """Reduce the analysis sections to the numeric features rules test."""
+    metadata = metadata or {}
+    return {
+        'title_length': len(metadata.get('title') or ''),
+        'meta_description_length': len((metadata.get('meta_tags') or {}).get('description') or ''),
+        'h1_count': len((headings or {}).get('h1') or []),
+        'content_length': (content or {}).get('length', 0) or 0,
+        'images_without_alt': (images or {}).get('without_alt', 0) or 0,
+        'internal_links': (links or {}).get('total_internal', 0) or 0,
+        'near_duplicates': len((content or {}).get('near_duplicates') or []),
+    }
+
+def seo_grade(score: int) -> str:
+    """Convert SEO score to grade."""
+    for threshold, grade in GRADE_THRESHOLDS:
+        if score >= threshold:
+            return grade
+    return "F"
+
+class SEOEngine:
+    def __init__(self, rules: Iterable[SEORule] = DEFAULT_RULES):
+        self.rules = tuple(rules)
+        for rule in self.rules:
+            if rule.feature not in FEATURES:
+                raise ValueError(f"Unknown SEO feature: {rule.feature}")
+        self.version = hashlib.sha1(repr(self.rules).encode()).hexdigest()[:12]
+
+    def score(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Score a single analysis result inline."""
+        features = extract_features(
+            result.get('metadata'), result.get('content'), result.get('headings'),
+            result.get('links'), result.get('images')
+        )
+        seo_score = 0
+        issues = []
+        recommendations = []
+        rule_results = []
+
+        for rule in self.rules:
+            value = features[rule.feature]
+            finding = next((f for f in rule.findings if f.matches(value)), None)
+            if finding is None:
+                seo_score += rule.points
+                rule_results.append({'rule_id': rule.id, 'passed': True, 'points': rule.points, 'issue': None})
+                continue
+
+            issue = finding.issue.format(value=value) if finding.issue else None
+            if issue:
+                issues.append(issue)
+            if finding.recommendation:
+                recommendations.append(finding.recommendation)
+            seo_score -= rule.penalty
+            rule_results.append({'rule_id': rule.id, 'passed': False, 'points': -rule.penalty, 'issue': issue})
+
+        return {
+            "score": max(0, seo_score),
+            "grade": seo_grade(seo_score),
+            "issues": issues,
+            "recommendations": recommendations,
+            "rules": rule_results,
+            "ruleset_version": self.version
+        }
+
+    def score_frame(self, features: 'pd.DataFrame') -> Tuple['pd.DataFrame', 'pd.DataFrame']:
+        """Score many analyses at once.
+
+        `features` holds one row per analysis with an `analysis_id` column and
+        one column per feature. Returns a frame of scores and a long frame of
+        per-rule results, both keyed by `analysis_id`.
+        """
+        import numpy as np
+        import pandas as pd
+
+        ids = features['analysis_id'].to_numpy()
+        n = len(ids)
+        totals = np.zeros(n, dtype=np.int64)
+        rule_frames = []
+
+        for rule in self.rules:
+            values = features[rule.feature].to_numpy()
+            failed = np.zeros(n, dtype=bool)
+            issues = np.full(n, None, dtype=object)
+            for finding in rule.findings:
+                hit = finding.matches(values) & ~failed
+                if finding.issue and hit.any():
+                    if '{value}' in finding.issue:
+                        issues[hit] = [finding.issue.format(value=v) for v in values[hit]]
+                    else:
+                        issues[hit] = finding.issue
+                failed |= hit
+
+            points = np.where(failed, -rule.penalty, rule.points)
+            totals += points
+            rule_frames.append(pd.DataFrame({
+                'analysis_id': ids,
+                'rule_id': rule.id,
+                'passed': ~failed,
+                'points': points,
+                'issue': issues,
+            }))
+
+        conditions = [totals >= threshold for threshold, _ in GRADE_THRESHOLDS]
+        grades = np.select(conditions, [grade for _, grade in GRADE_THRESHOLDS], default='F')
+        scores = pd.DataFrame({
+            'analysis_id': ids,
+            'score': np.maximum(totals, 0),
+            'grade': grades,
+            'ruleset_version': self.version,
+        })
+        rule_results = pd.concat(rule_frames, ignore_index=True) if rule_frames else pd.DataFrame(
+            columns=['analysis_id', 'rule_id', 'passed', 'points', 'issue'])
+        return scores, rule_results
+
+def features_frame(rows: Iterable[Tuple]) -> 'pd.DataFrame':
+    """Build a feature frame from (id, metadata, content, headings, links, images) rows."""
+    import numpy as np
+    import pandas as pd
+
+    columns = {name: [] for name in ('analysis_id',) + FEATURES}
+    for analysis_id, metadata, content, headings, links, images in rows:
+        columns['analysis_id'].append(analysis_id)
+        for name, value in extract_features(metadata, content, headings, links, images).items():
+            columns[name].append(value)
+    return pd.DataFrame({name: np.asarray(values, dtype=np.int64) for name, values in columns.items()})
+
+def _records(frame: 'pd.DataFrame') -> List[Dict[str, Any]]:
+    """Frame rows as dicts of plain Python values for executemany inserts."""
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+def _replace_scores(db: Session, ids: List[int], scores: List[Dict[str, Any]],
+                    rule_results: List[Dict[str, Any]], commit: bool = True) -> None:
+    db.execute(delete(SEORuleResult).where(SEORuleResult.analysis_id.in_(ids)))
+    db.execute(delete(SEOScore).where(SEOScore.analysis_id.in_(ids)))
+    db.execute(insert(SEOScore), scores)
+    if rule_results:
+        db.execute(insert(SEORuleResult), rule_results)
+    if commit:
+        db.commit()
+
+def save_scores(db: Session, scores: 'pd.DataFrame', rule_results: 'pd.DataFrame') -> None:
+    """Replace stored scores and rule results for the analyses in `scores`."""
+    if scores.empty:
+        return
+    _replace_scores(db, scores['analysis_id'].tolist(), _records(scores), _records(rule_results))
+
+def save_result(db: Session, analysis_id: int, seo_analysis: Dict[str, Any], commit: bool = True) -> None:
+    """Persist an inline `SEOEngine.score` result for one analysis."""
+    save_results(db, [(analysis_id, seo_analysis)], commit)
+
+def save_results(db: Session, results: List[Tuple[int, Dict[str, Any]]], commit: bool = True) -> None:
+    """Persist inline `SEOEngine.score` results for many analyses in one transaction.
+
+    Without `commit`, they're left in the caller's transaction.
+    """
+    if not results:
+        return
+    scores = [{
+        'analysis_id': analysis_id,
+        'score': seo_analysis['score'],
+        'grade': seo_analysis['grade'],
+        'ruleset_version': seo_analysis['ruleset_version'],
+    } for analysis_id, seo_analysis in results]
+    rule_results = [dict(r, analysis_id=analysis_id) for analysis_id, seo_analysis in results for r in seo_analysis['rules']]
+    _replace_scores(db, [analysis_id for analysis_id, _ in results], scores, rule_results, commit)
+
+def rescore_analyses(db: Session, engine: SEOEngine, chunk_size: int = 1000, stale_only: bool = True) -> Dict[str, Any]:
+    """Re-score stored analyses in chunks, e.g. to backfill after a rules change.
+
+    With `stale_only`, analyses already scored by this ruleset version are skipped.
+    """
+    query = select(
+        Analysis.id, Analysis.page_metadata, Analysis.content,
+        Analysis.headings, Analysis.links, Analysis.images
+    ).order_by(Analysis.id).limit(chunk_size)
+    if stale_only:
+        query = query.outerjoin(SEOScore, SEOScore.analysis_id == Analysis.id).where(
+            or_(SEOScore.id.is_(None), SEOScore.ruleset_version != engine.version)
+        )
+
+    scored = 0
+    chunks = 0
+    last_id = 0
+    while True:
+        rows = db.execute(query.where(Analysis.id > last_id)).all()
+        if not rows:
+            break
+        scores, rule_results = engine.score_frame(features_frame(rows))
+        save_scores(db, scores, rule_results)
+        last_id = rows[-1][0]
+        scored += len(rows)
+        chunks += 1
+
+    return {"scored": scored, "chunks": chunks, "ruleset_version": engine.version}
@@ -0,0 +1,244 @@
+"""Production server: uvicorn workers under a prefork manager.
+
+    cd backend
+    python server.py --workers 4 --port 8000
+
+The manager binds the listening socket and starts the workers, which accept
+connections on it. Workers are spawned rather than forked, as the ingestion
+pool is: each imports the app itself and builds its own database engine,
+Redis client, process pool and log writer, so nothing is shared by accident.
+
+A worker is recycled after `SERVER_MAX_REQUESTS` requests, plus up to
+`SERVER_MAX_REQUESTS_JITTER` so workers don't all restart at once, or when
+its memory goes over `SERVER_MAX_MEMORY_MB`. It finishes its in-flight
+requests and exits, and the manager starts a replacement.
+
+SIGTERM or SIGINT drains the server. The manager stops replacing workers and
+sends each one SIGTERM. Each worker stops accepting connections and waits up
+to `SERVER_DRAIN_TIMEOUT` for in-flight requests. It then runs the app's
+shutdown, which writes out queued captures and logs, and exits. Workers still
+running after that, plus `SHUTDOWN_TIMEOUT`, are killed.
+
+Workers write their Prometheus metrics to files in `PROMETHEUS_MULTIPROC_DIR`
+(a temporary directory unless set), so `/metrics` on any worker reports the
+whole server. Counters of recycled workers keep counting towards the totals.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from multiprocessing.connection import wait
+from typing import Optional, Dict, Any, List
+
+import uvicorn
+from prometheus_client import multiprocess
+
+from logs import setup_logging
+
+logger = logging.getLogger('server')
+
+SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(os.getenv('SERVER_PORT', 8000))
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', os.cpu_count() or 1))
+# Requests a worker serves before it's replaced; 0 never recycles
+SERVER_MAX_REQUESTS = int(os.getenv('SERVER_MAX_REQUESTS', 10000))
+SERVER_MAX_REQUESTS_JITTER = int(os.getenv('SERVER_MAX_REQUESTS_JITTER', 1000))
+# Resident memory past which a worker is replaced; 0 never checks
+SERVER_MAX_MEMORY_MB = int(os.getenv('SERVER_MAX_MEMORY_MB', 1024))
+# Seconds in-flight requests get to finish once a worker is told to stop
+SERVER_DRAIN_TIMEOUT = float(os.getenv('SERVER_DRAIN_TIMEOUT', 30))
+SERVER_KEEP_ALIVE = int(os.getenv('SERVER_KEEP_ALIVE', 5))
+
+# Allowed for the app's own shutdown, after the drain
+SHUTDOWN_TIMEOUT = 10
+# Workers exiting sooner than this after starting are restarted after a pause, not in a tight loop
+MIN_WORKER_LIFETIME = 1.0
+# Memory is checked every this many of uvicorn's 0.1 s ticks
+MEMORY_CHECK_TICKS = 10
+# Seconds a stopping worker gives connections it has just accepted to send their request
+ACCEPT_GRACE = 0.2
+
+def rss_mb() -> float:
+    """Resident memory of this process in MB (the peak, where /proc isn't available)."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class WorkerServer(uvicorn.Server):
+    """A uvicorn server that also exits, gracefully, once its memory is over a limit
+    or its manager has gone away.
+
+    uvicorn closes idle connections as soon as it stops, including ones
+    accepted a moment earlier whose request hasn't been read yet. Those
+    clients would see a reset connection, so a stopping worker stops accepting
+    first and waits `ACCEPT_GRACE` before closing idle connections.
+    """
+
+    def __init__(self, config: uvicorn.Config, max_memory_mb: int = 0):
+        super().__init__(config)
+        self.max_memory_mb = max_memory_mb
+        self.manager_pid = os.getppid()
+
+    async def on_tick(self, counter: int) -> bool:
+        if not self.should_exit and counter % MEMORY_CHECK_TICKS == 0:
+            memory = rss_mb()
+            if self.max_memory_mb and memory > self.max_memory_mb:
+                logger.warning("Recycling worker over its memory limit",
+                               extra={'pid': os.getpid(), 'rss_mb': round(memory), 'limit_mb': self.max_memory_mb})
+                self.should_exit = True
+            elif os.getppid() != self.manager_pid:
+                # The manager was killed without draining; don't keep serving unsupervised
+                logger.warning("Manager gone, stopping worker", extra={'pid': os.getpid()})
+                self.should_exit = True
+        return await super().on_tick(counter)
+
+    async def shutdown(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        for server in self.servers:
+            server.close()
+        await asyncio.sleep(ACCEPT_GRACE)
+        await super().shutdown(sockets)
+
+def run_worker(sock: socket.socket, options: Dict[str, Any]) -> None:
+    """Serve the app on an inherited socket until told to stop or due for recycling."""
+    max_requests = options['max_requests']
+    if max_requests and options['max_requests_jitter']:
+        max_requests += random.randint(0, options['max_requests_jitter'])
+    config = uvicorn.Config(
+        'main:app',
+        lifespan='on',
+        # uvicorn's records go through the app's logging setup rather than its own handlers
+        log_config=None,
+        access_log=False,
+        limit_max_requests=max_requests or None,
+        timeout_keep_alive=options['keep_alive'],
+        timeout_graceful_shutdown=options['drain_timeout'],
+    )
+    WorkerServer(config, options['max_memory_mb']).run(sockets=[sock])
+
+class Manager:
+    """Keeps `workers` worker processes running on one socket until signalled to stop."""
+
+    def __init__(self, options: Dict[str, Any]):
+        self.options = options
+        self.context = multiprocessing.get_context('spawn')
+        self.workers: Dict[int, multiprocessing.Process] = {}
+        self.started_at: Dict[int, float] = {}
+        self.stopping = False
+        self.sock: Optional[socket.socket] = None
+        self.metrics_dir: Optional[str] = None
+        self.own_metrics_dir = False
+
+    def prepare_metrics_dir(self) -> None:
+        """Point the workers' metrics at an empty directory, before any of them start."""
+        self.metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+        if self.metrics_dir:
+            # Left over from an earlier run; its counts would be added to this one's
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            for name in os.listdir(self.metrics_dir):
+                if name.endswith('.db'):
+                    os.remove(os.path.join(self.metrics_dir, name))
+        else:
+            self.metrics_dir = tempfile.mkdtemp(prefix='webanalyzer-metrics-')
+            self.own_metrics_dir = True
+            os.environ['PROMETHEUS_MULTIPROC_DIR'] = self.metrics_dir
+
+    def reap(self, process: multiprocessing.Process) -> None:
+        # Drops the worker's live gauges, such as its in-flight requests; its counters stay in the totals
+        multiprocess.mark_process_dead(process.pid, self.metrics_dir)
+
+    def bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET6 if ':' in self.options['host'] else socket.AF_INET)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.options['host'], self.options['port']))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def start_worker(self, slot: int) -> None:
+        process = self.context.Process(target=run_worker, args=(self.sock, self.options), name=f"worker-{slot}")
+        process.start()
+        self.workers[slot] = process
+        self.started_at[slot] = time.monotonic()
+        logger.info("Started worker", extra={'slot': slot, 'pid': process.pid})
+
+    def handle_signal(self, signum, frame) -> None:
+        self.stopping = True
+
+    def run(self) -> None:
+        self.prepare_metrics_dir()
+        self.sock = self.bind()
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        signal.signal(signal.SIGINT, self.handle_signal)
+        logger.info("Serving", extra={'host': self.options['host'], 'port': self.sock.getsockname()[1],
+                                      'workers': self.options['workers']})
+        for slot in range(self.options['workers']):
+            self.start_worker(slot)
+
+        while not self.stopping:
+            # Wakes as soon as a worker exits; the timeout bounds how late a signal is noticed
+            wait([process.sentinel for process in self.workers.values()], timeout=0.5)
+            for slot, process in list(self.workers.items()):
+                if process.is_alive() or self.stopping:
+                    continue
+                lifetime = time.monotonic() - self.started_at[slot]
+                logger.info("Worker exited", extra={'slot': slot, 'pid': process.pid, 'exitcode': process.exitcode,
+                                                    'lifetime_s': round(lifetime, 1)})
+                self.reap(process)
+                if lifetime < MIN_WORKER_LIFETIME:
+                    time.sleep(MIN_WORKER_LIFETIME)
+                self.start_worker(slot)
+
+        self.drain()
+
+    def drain(self) -> None:
+        """Ask every worker to finish its in-flight requests and exit; kill the ones that don't in time."""
+        logger.info("Draining", extra={'workers': len(self.workers)})
+        for process in self.workers.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.options['drain_timeout'] + SHUTDOWN_TIMEOUT
+        for process in self.workers.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+        for slot, process in self.workers.items():
+            if process.is_alive():
+                logger.warning("Killing worker that didn't drain in time", extra={'slot': slot, 'pid': process.pid})
+                process.kill()
+                process.join()
+        for process in self.workers.values():
+            self.reap(process)
+        self.sock.close()
+        if self.own_metrics_dir:
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        logger.info("Stopped")
+
+def parse_args(argv=None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Run the API with several workers.")
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS)
+    parser.add_argument('--max-requests', type=int, default=SERVER_MAX_REQUESTS,
+                        help="requests before a worker is replaced, 0 for never")
+    parser.add_argument('--max-requests-jitter', type=int, default=SERVER_MAX_REQUESTS_JITTER)
+    parser.add_argument('--max-memory-mb', type=int, default=SERVER_MAX_MEMORY_MB,
+                        help="resident memory before a worker is replaced, 0 for no limit")
+    parser.add_argument('--drain-timeout', type=float, default=SERVER_DRAIN_TIMEOUT,
+                        help="seconds in-flight requests get to finish on shutdown")
+    parser.add_argument('--keep-alive', type=int, default=SERVER_KEEP_ALIVE)
+    return vars(parser.parse_args(argv))
+
+def main(argv=None):
+    setup_logging()
+    Manager(parse_args(argv)).run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from admission import AdmissionController, LocalTokenBuckets, Rejected, MAX_BATCH_SIZE
+from benchmarks.fakes import FakeRedis
+from main import app
+from test_auth import register_and_login
+
+client = TestClient(app)
+
+PAGE = '<html><head><title>Limited</title></head><body><p>Text</p></body></html>'
+
+@pytest.fixture
+def admission(monkeypatch):
+    """Swap in an enabled controller; set its limits per test."""
+    controller = AdmissionController(enabled=True)
+    monkeypatch.setattr(main, 'admission', controller)
+    return controller
+
+def test_token_bucket_refills_at_rate():
+    """A bucket allows a burst, then reports how long until the next token"""
+    buckets = LocalTokenBuckets()
+    assert [buckets.take('k', rate=2, burst=3, cost=1) for _ in range(3)] == [0, 0, 0]
+    assert 0.4 < buckets.take('k', rate=2, burst=3, cost=1) <= 0.5
+
+def test_falls_back_to_local_limits_without_redis():
+    """A Redis client that can't run the scripts doesn't fail requests"""
+    controller = AdmissionController(lambda: FakeRedis(), enabled=True, client_burst=2)
+    controller.admit_client('a')
+    controller.admit_client('a')
+    with pytest.raises(Rejected) as rejected:
+        controller.admit_client('a')
+    assert rejected.value.status_code == 429
+    assert rejected.value.retry_after >= 1
+    controller.admit_client('b')
+    assert controller.status()['backend'] == 'local'
+
+def test_in_flight_cap_sheds_load():
+    """Requests beyond the in-flight cap are shed with a 503 until a slot frees"""
+    controller = AdmissionController(enabled=True, max_in_flight=1)
+    with controller.slot():
+        with pytest.raises(Rejected) as rejected:
+            with controller.slot():
+                pass
+        assert rejected.value.status_code == 503
+    with controller.slot():
+        assert controller.status()['in_flight'] == 1
+    assert controller.status()['rejected'] == {'overloaded': 1}
+
+def test_client_limit_returns_429(admission, stub_site):
+    """A client over its rate limit gets 429 with Retry-After, visible on /health"""
+    admission.client_burst = 1
+    admission.client_rate = 0.01  # no token comes back during the test
+    token = register_and_login()['access_token']
+    stub_site.routes = {'/': PAGE}
+    payload = {'url': stub_site.url('/'), 'settings': {'include_ai_analysis': False}}
+    assert client.post("/api/analyze", json=payload).status_code == 200
+    response = client.post("/api/analyze", json=payload)
+    assert response.status_code == 429
+    assert int(response.headers['retry-after']) >= 1
+    # A made-up API key doesn't buy a fresh bucket; a registered one is its owner's
+    assert client.post("/api/analyze", json=payload, headers={'X-API-Key': 'other'}).status_code == 429
+    key = client.post("/auth/api-keys", json={}, headers={'Authorization': f"Bearer {token}"}).json()['key']
+    assert client.post("/api/analyze", json=payload, headers={'X-API-Key': key}).status_code == 200
+
+    health = client.get("/health").json()['admission']
+    assert health['rejected'] == {'client': 2}
+    assert health['in_flight'] == 0
+
+def test_crawls_spend_a_token_per_page(admission, stub_site):
+    """A crawl is charged for every page it may fetch before it starts"""
+    admission.client_burst = 5
+    admission.client_rate = 0.01
+    stub_site.routes = {'/': PAGE}
+    payload = {'url': stub_site.url('/'), 'settings': {'max_pages': 5, 'requests_per_second': 20,
+                                                         'analysis': {'include_ai_analysis': False}}}
+    with TestClient(app):
+        pass
+    assert client.post("/api/crawl", json=payload).json()['pages_crawled'] == 1
+    assert client.post("/api/crawl", json=payload).status_code == 429
+    assert stub_site.requests.count('/') == 1
+
+def test_analyses_in_flight_are_shed(admission, stub_site):
+    """Analyses run off the event loop, so a request arriving while the cap is taken gets a 503"""
+    admission.max_in_flight = 1
+    stub_site.routes = {'/slow': {'body': PAGE, 'delay': 1}, '/fast': PAGE}
+    settings = {'include_ai_analysis': False}
+    with TestClient(app) as shared:  # one event loop for both requests
+        slow = threading.Thread(target=shared.post, args=("/api/analyze",),
+                                kwargs={'json': {'url': stub_site.url('/slow'), 'settings': settings}})
+        slow.start()
+        while admission.local_in_flight == 0:
+            pass
+        response = shared.post("/api/analyze", json={'url': stub_site.url('/fast'), 'settings': settings})
+        slow.join()
+    assert response.status_code == 503
+    assert admission.status()['rejected'] == {'overloaded': 1}
+
+def test_domain_limit_applies_to_fetches(admission, stub_site):
+    """Fetches to one domain are limited; in a batch the excess URLs fail individually"""
+    admission.domain_burst = 2
+    stub_site.routes = {'/a': PAGE, '/b': PAGE, '/c': PAGE}
+    settings = {'include_ai_analysis': False}
+    response = client.post("/api/analyze/batch", json={
+        'urls': [stub_site.url(path) for path in ('/a', '/b', '/c')], 'settings': settings
+    })
+    assert response.status_code == 200
+    assert [r['success'] for r in response.json()['results']] == [True, True, False]
+    assert 'Too many requests' in response.json()['results'][2]['error']
+
+    response = client.post("/api/analyze", json={'url': stub_site.url('/c'), 'settings': settings})
+    assert response.status_code == 429
+    assert admission.status()['rejected'] == {'domain': 2}
+
+def test_batch_size_is_capped():
+    """Batches above MAX_BATCH_SIZE are refused"""
+    response = client.post("/api/analyze/batch", json={'urls': ['https://example.com'] * (MAX_BATCH_SIZE + 1)})
+    assert response.status_code == 422
@@ -0,0 +1,95 @@
+import threading
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import auth
+from auth import TokenValidator, InvalidToken, create_access_token
+from main import app
+from models import SessionLocal, Analysis
+
+client = TestClient(app)
+
+PAGE = '<html><head><title>Mine</title></head><body><p>Text</p></body></html>'
+
+def register_and_login(password='correct horse battery staple'):
+    name = f"user-{uuid.uuid4().hex[:8]}"
+    with TestClient(app):
+        pass
+    response = client.post("/auth/register", json={'email': f"{name}@example.com", 'username': name,
+                                                    'password': password})
+    assert response.status_code == 200
+    response = client.post("/auth/login", json={'username': name, 'password': password})
+    assert response.status_code == 200
+    return response.json()
+
+def test_login_issues_token_for_analyses(stub_site):
+    """A login token identifies the user on analysis requests"""
+    login = register_and_login()
+    headers = {'Authorization': f"Bearer {login['access_token']}"}
+    assert login['token_type'] == 'bearer' and login['expires_in'] > 0
+
+    me = client.get("/auth/me", headers=headers)
+    assert me.json()['user_id'] == login['user_id']
+
+    stub_site.routes = {'/': PAGE}
+    response = client.post("/api/analyze", headers=headers,
+                           json={'url': stub_site.url('/'), 'settings': {'include_ai_analysis': False}})
+    assert response.status_code == 200
+    with SessionLocal() as db:
+        assert db.get(Analysis, response.json()['analysis_id']).user_id == login['user_id']
+
+def test_bad_credentials_and_tokens_are_refused():
+    """Wrong passwords and invalid tokens get 401; no token is anonymous"""
+    login = register_and_login()
+    me = client.get("/auth/me", headers={'Authorization': f"Bearer {login['access_token']}"})
+    assert client.post("/auth/login", json={'username': me.json()['username'], 'password': 'nope'}).status_code == 401
+
+    response = client.get("/auth/me", headers={'Authorization': 'Bearer not-a-token'})
+    assert response.status_code == 401
+    assert response.headers['www-authenticate'] == 'Bearer'
+    assert client.get("/auth/me").status_code == 401
+    assert client.post("/api/analyze", headers={'Authorization': 'Bearer not-a-token'},
+                       json={'url': 'https://example.com'}).status_code == 401
+
+def test_long_passwords():
+    """Passwords over bcrypt's 72-byte limit hash and verify"""
+    register_and_login('x' * 100)
+
+def test_validated_tokens_are_cached(monkeypatch):
+    """Only the first use of a token checks its signature; expired tokens are refused"""
+    validator = TokenValidator()
+    token, _ = create_access_token(7, 'cached')
+    decode = validator._decode
+    calls = []
+    monkeypatch.setattr(validator, '_decode', lambda t: calls.append(t) or decode(t))
+
+    assert validator.validate(token) == validator.validate(token) == auth.TokenUser(7, 'cached')
+    assert len(calls) == 1
+
+    expired, _ = create_access_token(7, 'cached', expires_minutes=-1)
+    with pytest.raises(InvalidToken):
+        validator.validate(expired)
+
+def test_password_checks_run_off_the_event_loop(monkeypatch):
+    """bcrypt runs on the auth thread pool, not the event loop thread"""
+    threads = []
+    verify = auth.verify_password
+    monkeypatch.setattr(auth, 'verify_password', lambda *args: threads.append(threading.current_thread().name) or verify(*args))
+    register_and_login()
+    assert threads and all(name.startswith('auth') for name in threads)
+
+def test_api_keys_resolve_to_their_owner():
+    """A user's API keys identify them until revoked"""
+    login = register_and_login()
+    headers = {'Authorization': f"Bearer {login['access_token']}"}
+    assert client.post("/auth/api-keys", json={}).status_code == 401
+    created = client.post("/auth/api-keys", json={'name': 'ci'}, headers=headers).json()
+    assert created['name'] == 'ci'
+    assert auth.api_keys.owner(created['key']) == login['user_id']
+    assert auth.api_keys.owner('wa_unknown') is None
+
+    assert client.delete(f"/auth/api-keys/{created['id']}").status_code == 401
+    assert client.delete(f"/auth/api-keys/{created['id']}", headers=headers).json()['success']
+    assert auth.api_keys.owner(created['key']) is None
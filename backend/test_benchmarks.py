@@ -0,0 +1,33 @@
+import asyncio
+
+import main
+from benchmarks import run
+from benchmarks.fakes import FakeRedis
+
+def test_percentile():
+    """Nearest-rank percentiles"""
+    values = [float(i) for i in range(1, 101)]
+    assert run.percentile(values, 50) == 50.0
+    assert run.percentile(values, 99) == 99.0
+    assert run.percentile([3.0], 95) == 3.0
+
+def test_suite_runs_offline():
+    """A small run completes without errors and leaves the app's clients in place"""
+    redis_client, ai_client = main.cache_manager.redis_client, main.ai_analyzer.client
+    results = asyncio.run(run.run_suite(['analyze_cold', 'analyze_warm', 'export_csv'], requests=3,
+                                        concurrency=2, ai_latency=0))
+
+    assert set(results) == {'analyze_cold', 'analyze_warm', 'export_csv'}
+    for result in results.values():
+        assert result['errors'] == 0
+        assert result['latency_ms']['p50'] <= result['latency_ms']['p99']
+    assert main.cache_manager.redis_client is redis_client
+    assert main.ai_analyzer.client is ai_client
+    assert not isinstance(redis_client, FakeRedis)
+
+def test_compare_flags_regressions():
+    """Drops in throughput or p95 increases beyond the threshold are regressions"""
+    def result(throughput, p95):
+        return {'throughput': throughput, 'latency_ms': {'p95': p95}}
+    baseline = {'environment': {}, 'scenarios': {'a': result(100, 10), 'b': result(100, 10)}}
+    assert run.compare({'a': result(95, 11), 'b': result(70, 10)}, baseline, 0.2) == ['b']
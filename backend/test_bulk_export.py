@@ -0,0 +1,125 @@
+import io
+import os
+import zipfile
+from datetime import datetime
+
+import pytest
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+
+import bulk_export
+from main import app
+from models import Base, engine, SessionLocal, Analysis, SEOScore
+from bulk_export import BulkExportFilter, export_bulk
+
+client = TestClient(app)
+
+def make_analysis(url, created_at, score=None):
+    record = Analysis(
+        url=url, final_url=url, title=f"Title of {url}", status_code=200, processing_time=0.5,
+        created_at=created_at,
+        page_metadata={'language': 'en', 'meta_tags': {'description': 'Desc'}},
+        links={'all': [{'text': 'Home', 'href': '/', 'full_url': url, 'is_internal': True, 'rel': ['nofollow']},
+                       {'text': 'Out', 'href': 'https://other.test/', 'full_url': 'https://other.test/',
+                        'is_internal': False}],
+               'total': 2, 'total_internal': 1, 'total_external': 1},
+        images={'images': [{'src': '/a.png', 'full_url': url + 'a.png', 'alt': '', 'width': 100}],
+                'total': 1, 'without_alt': 1},
+        headings={'h1': [{'text': 'Main', 'id': None}], 'h2': [{'text': 'Sub', 'id': 'sub'}]},
+        stats={'content_length': 1200},
+    )
+    if score is not None:
+        record.seo_score = SEOScore(score=score, grade='B', ruleset_version='test', scored_at=created_at)
+    return record
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        records = [
+            make_analysis("https://bulk.test/", datetime(2025, 1, 1), score=80),
+            make_analysis("https://bulk.test/page", datetime(2025, 2, 1)),
+            make_analysis("https://bulk.test.evil/", datetime(2025, 2, 1)),
+            make_analysis("https://elsewhere.test/", datetime(2025, 3, 1)),
+        ]
+        db.add_all(records)
+        db.commit()
+        return [record.id for record in records]
+
+def test_parquet_tables_across_chunks(tmp_path):
+    """Every table is written in full when rows span several chunks"""
+    ids = seed()
+    with SessionLocal() as db:
+        export = export_bulk(db, BulkExportFilter(ids=ids), 'parquet', directory=str(tmp_path), chunk_size=1)
+
+    assert export['rows'] == {'pages': 4, 'links': 8, 'images': 4, 'headings': 8}
+    with zipfile.ZipFile(export['path']) as archive:
+        assert sorted(archive.namelist()) == ['headings.parquet', 'images.parquet', 'links.parquet', 'pages.parquet']
+        pages = pq.read_table(io.BytesIO(archive.read('pages.parquet'))).to_pylist()
+        links = pq.read_table(io.BytesIO(archive.read('links.parquet'))).to_pylist()
+        headings = pq.read_table(io.BytesIO(archive.read('headings.parquet'))).to_pylist()
+
+    assert [page['analysis_id'] for page in pages] == ids
+    assert pages[0]['seo_score'] == 80 and pages[1]['seo_score'] is None
+    assert pages[0]['content_length'] == 1200
+    assert links[0]['rel'] == 'nofollow'
+    assert [(h['level'], h['text']) for h in headings[:2]] == [(1, 'Main'), (2, 'Sub')]
+
+def test_filters():
+    """Domain and date filters select matching analyses only"""
+    ids = seed()
+    with SessionLocal() as db:
+        def pages(**kwargs):
+            rows = bulk_export.iter_chunks(db, BulkExportFilter(ids=ids, **kwargs))
+            return [row.id for chunk in rows for row in chunk]
+
+        assert pages(domain='bulk.test') == ids[:2]
+        # Wildcards in the filter are matched literally
+        assert pages(domain='bulk_test') == pages(domain='bulk%') == []
+        assert pages(start=datetime(2025, 2, 1), end=datetime(2025, 3, 1)) == ids[1:3]
+        # An empty id list selects nothing rather than everything
+        assert [row.id for chunk in bulk_export.iter_chunks(db, BulkExportFilter(ids=[])) for row in chunk] == []
+
+def test_failed_export_removes_its_directory(tmp_path, monkeypatch):
+    """A temporary directory holding a partly written export is removed when the export fails"""
+    ids = seed()
+    directory = tmp_path / 'export'
+    directory.mkdir()
+    monkeypatch.setattr(bulk_export.tempfile, 'mkdtemp', lambda prefix: str(directory))
+    flatten = bulk_export.flatten
+    chunks = []
+
+    def failing_flatten(rows):
+        chunks.append(rows)
+        if len(chunks) > 1:
+            raise RuntimeError("disk full")
+        return flatten(rows)
+
+    monkeypatch.setattr(bulk_export, 'flatten', failing_flatten)
+    with SessionLocal() as db, pytest.raises(RuntimeError):
+        export_bulk(db, BulkExportFilter(ids=ids), 'parquet', chunk_size=1)
+    assert not os.path.exists(directory)
+
+def test_excel_rolls_over_to_new_sheet(tmp_path, monkeypatch):
+    """Tables longer than a sheet allows continue on a numbered sheet"""
+    ids = seed()
+    monkeypatch.setattr(bulk_export, 'EXCEL_MAX_ROWS', 5)
+    with SessionLocal() as db:
+        export = export_bulk(db, BulkExportFilter(ids=ids), 'excel', directory=str(tmp_path))
+
+    workbook = load_workbook(export['path'], read_only=True)
+    assert workbook.sheetnames == ['Pages', 'Links', 'Images', 'Headings', 'Links (2)', 'Headings (2)']
+    assert sum(1 for _ in workbook['Links'].rows) + sum(1 for _ in workbook['Links (2)'].rows) == 8 + 2
+
+def test_bulk_endpoint_arrow():
+    """The endpoint returns a zip of Arrow IPC files"""
+    ids = seed()
+    response = client.post("/api/export/bulk", params={'format': 'arrow'}, json={'ids': ids})
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        table = ipc.open_file(io.BytesIO(archive.read('images.arrow'))).read_all()
+    assert table.num_rows == 4
+    assert table.column('width').to_pylist() == ['100'] * 4
+
+    assert client.post("/api/export/bulk", params={'format': 'csv'}, json={}).status_code == 400
@@ -0,0 +1,73 @@
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.fakes import FakeRedis
+from cache import CacheManager, SharedCache
+from main import app
+
+client = TestClient(app)
+
+RESULT = {'title': 'Cached'}
+
+def cache_with(*entries):
+    cache = CacheManager()
+    cache.redis_client = FakeRedis()
+    for url, settings in entries:
+        cache.set(url, settings, RESULT)
+    return cache
+
+def test_keys_are_namespaced_and_versioned():
+    """Entries and their index sets live under one prefix, apart from the rest of the database"""
+    cache = cache_with(('https://example.com/', {}))
+    assert cache.prefix == 'webanalyzer:analysis:v1:'
+    assert all(key.startswith(cache.prefix) for key in cache.redis_client.data)
+    assert len(cache.redis_client.data) == 3  # the entry, its URL set and its domain set
+
+    cache.redis_client.setex('celery-task-meta-1', 60, b'{}')
+    stats = cache.get_stats(count_entries=True)
+    assert stats['entries'] == 1 and stats['database_keys'] == 4
+    assert 'entries' not in cache.get_stats()
+
+def test_redis_calls_time_out(monkeypatch):
+    """An unreachable Redis fails fast rather than hanging requests"""
+    monkeypatch.setattr('cache.REDIS_SOCKET_TIMEOUT', 0.25)
+    kwargs = CacheManager().redis_client.connection_pool.connection_kwargs
+    assert kwargs['socket_connect_timeout'] == 0.5 and kwargs['socket_timeout'] == 0.25
+
+def test_invalidate_url_and_domain():
+    """Every settings variant of a URL goes at once; a domain takes all of its URLs, with or without www."""
+    cache = cache_with(('https://www.example.com/a?x=1&y=2', {}), ('https://www.example.com/a?y=2&x=1', {'max_links': 5}),
+                       ('https://example.com/b', {}), ('https://other.test/', {}))
+    assert cache.invalidate_url('https://WWW.example.com/a?x=1&y=2#top') == 2
+    assert cache.get('https://www.example.com/a?x=1&y=2', {}) is None
+    assert cache.get('https://example.com/b', {}) == RESULT
+
+    assert cache.invalidate_domain('WWW.Example.com') == 1
+    assert cache.get('https://example.com/b', {}) is None
+    assert cache.get('https://other.test/', {}) == RESULT
+    assert cache.invalidate_domain('example.com') == 0
+
+def test_clear_leaves_other_keys_alone(monkeypatch):
+    """Clearing unlinks the app's cache keys in batches instead of flushing the database"""
+    monkeypatch.setattr('cache.CACHE_INVALIDATE_BATCH', 2)
+    cache = cache_with(*[(f"https://example.com/{i}", {}) for i in range(5)])
+    cache.redis_client.setex('celery-task-meta-1', 60, b'{}')
+    shared = SharedCache('asset:', 60, 10, lambda: cache.redis_client)
+    shared.set_many({'https://example.com/a.css': {'size': 10}})
+
+    assert cache.clear_all() == 5 + 5 + 1
+    assert shared.clear() == 1
+    assert list(cache.redis_client.data) == ['celery-task-meta-1']
+
+def test_invalidate_endpoint():
+    """The API invalidates by URL right away and by domain in the background"""
+    saved, main.cache_manager.redis_client = main.cache_manager.redis_client, cache_with().redis_client
+    try:
+        main.cache_manager.set('https://example.com/', {'a': 1}, RESULT)
+        main.cache_manager.set('https://example.com/other', {}, RESULT)
+        assert client.post("/api/cache/invalidate", params={'url': 'https://example.com/'}).json()['invalidated'] == 1
+        assert client.post("/api/cache/invalidate", params={'domain': 'example.com'}).json()['success']
+        assert main.cache_manager.get('https://example.com/other', {}) is None
+        assert client.post("/api/cache/invalidate").status_code == 400
+    finally:
+        main.cache_manager.redis_client = saved
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+import capture
+import pipeline
+from main import app
+from benchmarks import replay
+from pipeline import AnalysisSettings, fetch_and_analyze
+
+SETTINGS = {'include_ai_analysis': False}
+
+def page(title):
+    return f"<html><head><title>{title}</title></head><body><h1>{title}</h1></body></html>"
+
+def record_traffic(stub_site, directory):
+    stub_site.routes = {
+        '/': page('Home'),
+        '/old': {'status': 301, 'headers': {'Location': '/'}},
+        '/gone': {'status': 404, 'body': 'Not found'},
+    }
+    capture.start(str(directory))
+    try:
+        with TestClient(app) as client:
+            for path in ('/', '/old', '/gone', '/'):
+                client.post("/api/analyze", json={'url': stub_site.url(path), 'settings': SETTINGS})
+    finally:
+        capture.stop()
+
+def test_capture_records_requests_and_responses(stub_site, tmp_path):
+    """Requests land in requests.jsonl and every fetched hop in the response store"""
+    record_traffic(stub_site, tmp_path)
+
+    with open(tmp_path / 'requests.jsonl') as f:
+        records = [json.loads(line) for line in f]
+    assert [record['url'] for record in records] == [stub_site.url(p) for p in ('/', '/old', '/gone', '/')]
+    assert [record['status'] for record in records] == [200, 200, 400, 200]
+    assert records[0]['settings']['include_ai_analysis'] is False
+    assert records[0]['timings']['fetch'] > 0
+    assert all(record['cache'] in ('hit', 'miss') for record in records)
+
+    store = capture.ResponseStore(str(tmp_path))
+    assert store.get(stub_site.url('/old'))['headers']['location'] == '/'
+    assert store.get(stub_site.url('/gone'))['status'] == 404
+    # The home page body is stored once however often it was fetched
+    assert len(os.listdir(tmp_path / 'responses' / 'bodies')) == 2
+
+def test_capture_records_arrival_time(stub_site, tmp_path):
+    """A request's ts is when it arrived, not when its analysis finished"""
+    stub_site.routes = {'/slow': {'body': page('Slow'), 'delay': 0.5}}
+    capture.start(str(tmp_path))
+    try:
+        with TestClient(app) as client:
+            before = datetime.utcnow()
+            client.post("/api/analyze", json={'url': stub_site.url('/slow'), 'settings': SETTINGS})
+    finally:
+        capture.stop()
+
+    with open(tmp_path / 'requests.jsonl') as f:
+        ts = datetime.fromisoformat(json.loads(f.readline())['ts'])
+    assert (ts - before).total_seconds() < 0.4
+
+def test_replay_adapter_serves_recorded_pages(stub_site, tmp_path):
+    """Recorded pages and redirects are analyzed the same with the site gone"""
+    record_traffic(stub_site, tmp_path)
+    url = stub_site.url('/old')
+    live, _ = fetch_and_analyze(url, AnalysisSettings(**SETTINGS))
+    stub_site.routes = {}
+
+    pipeline.fetch_adapter = capture.ReplayAdapter(capture.ResponseStore(str(tmp_path)))
+    try:
+        replayed, _ = fetch_and_analyze(url, AnalysisSettings(**SETTINGS))
+    finally:
+        pipeline.fetch_adapter = None
+    assert replayed['final_url'] == live['final_url'] == stub_site.url('/')
+    assert replayed['title'] == live['title'] == 'Home'
+    assert replayed['headings'] == live['headings']
+
+def test_replay_matches_captured_outcomes(stub_site, tmp_path):
+    """A scaled-rate replay reproduces the captured statuses offline"""
+    record_traffic(stub_site, tmp_path)
+    stub_site.routes = {}
+
+    result = asyncio.run(replay.replay(str(tmp_path), speed=100, concurrency=2))
+    assert result['requests'] == 4
+    assert result['status_mismatches'] == 0
+    assert result['statuses'] == {'200': 3, '400': 1}
+    assert result['cache']['hits'] == 1
+
+def test_schedule_scales_and_caps_gaps():
+    """Send times follow the capture, scaled by speed, with long idle gaps cut"""
+    records = [{'ts': '2025-01-01T00:00:00'}, {'ts': '2025-01-01T00:00:02'}, {'ts': '2025-01-01T01:00:00'}]
+    assert replay.schedule(records, speed=2, max_gap=5) == [0.0, 1.0, 3.5]
@@ -0,0 +1,57 @@
+import codecs
+
+import pytest
+from fastapi.testclient import TestClient
+
+import charset
+from charset import detect, decode
+from main import app
+
+client = TestClient(app)
+
+TEXT = 'Crème brûlée, naïve café'
+
+def page(head='', body=TEXT):
+    return f'<html><head>{head}<title>Menu</title></head><body><p>{body}</p></body></html>'
+
+@pytest.mark.parametrize('body, content_type, expected', [
+    (page().encode('cp1252'), 'text/html; charset="ISO-8859-1"', ('cp1252', 'header')),
+    (codecs.BOM_UTF8 + page().encode(), 'text/html', ('utf-8', 'bom')),
+    (codecs.BOM_UTF16_LE + page().encode('utf-16-le'), '', ('utf-16-le', 'bom')),
+    (page('<meta charset="windows-1252">').encode('cp1252'), 'text/html', ('cp1252', 'meta')),
+    (page('<meta http-equiv="Content-Type" content="text/html; charset=koi8-r">').encode(), '', ('koi8-r', 'meta')),
+    (page().encode(), 'text/html', ('utf-8', 'detected')),
+    (page().encode(), 'text/html; charset=no-such-charset', ('utf-8', 'detected')),
+])
+def test_encoding_sources_in_order(body, content_type, expected):
+    """Header, then BOM, then <meta>, then detection; unknown labels are ignored"""
+    assert detect(body, content_type) == expected
+
+def test_detection_reads_a_bounded_sample(monkeypatch):
+    """UTF-8 cut mid-character at the sample's end is still UTF-8; only the sample is sniffed"""
+    monkeypatch.setattr(charset, 'CHARSET_SAMPLE_BYTES', 1000)
+    body = ('a' + 'é' * 2000).encode()  # the 1000th byte is the first half of an é
+    assert detect(body) == ('utf-8', 'detected')
+
+    monkeypatch.setattr(charset, 'CHARSET_SNIFF_BYTES', 100)
+    late_meta = ('<!-- ' + 'x' * 200 + ' -->' + '<meta charset="koi8-r">').encode()
+    assert detect(late_meta)[1] == 'detected'
+
+def test_non_utf8_without_declaration_is_detected():
+    """Legacy-encoded pages with no declaration don't come out as UTF-8"""
+    text, encoding = decode(page(body='Привет, как дела? ' * 40).encode('cp1251'))
+    assert encoding['source'] == 'detected' and encoding['name'] != 'utf-8'
+    assert 'Привет' in text
+
+def test_decode_strips_the_bom():
+    """The BOM doesn't end up in the parsed text"""
+    text, encoding = decode(codecs.BOM_UTF8 + page().encode(), 'text/html; charset=utf-8')
+    assert text == page() and encoding == {'name': 'utf-8', 'source': 'header'}
+
+def test_analysis_reports_the_encoding(stub_site):
+    """A page served without a charset is decoded from its <meta> and reported in performance.encoding"""
+    stub_site.routes = {'/': {'body': page('<meta charset="windows-1252">').encode('cp1252'),
+                              'headers': {'Content-Type': 'text/html'}}}
+    result = client.post("/api/analyze", json={'url': stub_site.url('/'), 'settings': {'include_ai_analysis': False}}).json()
+    assert result['performance']['encoding'] == {'name': 'cp1252', 'source': 'meta'}
+    assert TEXT in result['content']['text']
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from models import Base, engine, SessionLocal, Analysis
+from crawler import Crawler, CrawlSettings, BloomFilter, normalize_url, MAX_CRAWL_PAGES, MAX_CRAWL_DEPTH
+from pipeline import AnalysisSettings
+from seo import SEOEngine
+
+def page(title, *hrefs):
+    links = ''.join(f'<a href="{href}">link</a>' for href in hrefs)
+    return f"<html><head><title>{title}</title></head><body><h1>{title}</h1>{links}</body></html>"
+
+SITE = {
+    '/robots.txt': {'body': 'User-agent: *\nDisallow: /private', 'headers': {'Content-Type': 'text/plain'}},
+    '/': page('Home', '/a', '/b', '/a#top', '/./b', '/private/secret', 'http://other.invalid/', 'mailto:x@example.com'),
+    '/a': page('Page A', '/c', '/', '/missing'),
+    '/b': page('Page B', '/a', '/data.json'),
+    '/c': page('Page C', '/d'),
+    '/d': page('Page D'),
+    '/private/secret': page('Secret'),
+    '/data.json': {'body': '{}', 'headers': {'Content-Type': 'application/json'}},
+}
+
+def crawl(stub_site, **overrides):
+    Base.metadata.create_all(bind=engine)
+    stub_site.routes = SITE
+    settings = CrawlSettings(requests_per_second=20, analysis=AnalysisSettings(include_ai_analysis=False), **overrides)
+    return asyncio.run(Crawler(stub_site.url('/'), settings, seo_engine=SEOEngine()).run())
+
+def test_normalize_url():
+    """Normalization collapses equivalent URLs and rejects non-HTTP schemes"""
+    assert normalize_url('HTTP://Example.COM:80/a/./b/../c?b=2&a=1#frag') == 'http://example.com/a/c?a=1&b=2'
+    assert normalize_url('https://example.com') == 'https://example.com/'
+    assert normalize_url('../x/', 'https://example.com/a/b') == 'https://example.com/x/'
+    assert normalize_url('mailto:someone@example.com') is None
+    assert normalize_url('javascript:void(0)') is None
+
+def test_bloom_filter():
+    """Bloom filter has no false negatives and few false positives"""
+    bloom = BloomFilter(1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"https://example.com/{i}")
+    assert all(f"https://example.com/{i}" in bloom for i in range(1000))
+    false_positives = sum(f"https://other.com/{i}" in bloom for i in range(1000))
+    assert false_positives < 50
+
+def test_crawl_breadth_first_within_depth(stub_site):
+    """Crawl follows internal links up to max depth and respects robots.txt"""
+    report = crawl(stub_site, max_depth=2)
+    crawled = {p['url'] for p in report['pages']}
+
+    assert crawled == {stub_site.url(p) for p in ('/', '/a', '/b', '/c')}
+    assert report['blocked_by_robots'] == [stub_site.url('/private/secret')]
+    assert report['skipped_non_html'] == [stub_site.url('/data.json')]
+    assert report['errors'] == [{'url': stub_site.url('/missing'), 'depth': 2, 'status_code': 404}]
+    assert report['depth_distribution'] == {0: 1, 1: 2, 2: 1}
+    assert all(p['analysis_id'] for p in report['pages'])
+    assert report['seo']['average_score'] is not None
+    assert '/secret' not in ''.join(stub_site.requests)
+    assert stub_site.requests.count('/a') == 1
+
+def test_crawl_page_limit(stub_site):
+    """Crawl stops scheduling pages once max_pages is reached"""
+    report = crawl(stub_site, max_depth=5, max_pages=3, concurrency=3)
+    assert report['pages_crawled'] == 3
+
+def test_failed_score_save_leaves_no_analysis(stub_site, monkeypatch):
+    """A page whose SEO scores can't be saved isn't stored at all"""
+    def locked(*args, **kwargs):
+        raise RuntimeError("database is locked")
+    Base.metadata.create_all(bind=engine)
+    crawler = Crawler(stub_site.url('/'), CrawlSettings(), seo_engine=SEOEngine())
+    monkeypatch.setattr('crawler.seo.save_results', locked)
+    url = stub_site.url('/unsaved')
+    with pytest.raises(RuntimeError):
+        crawler.save({'url': url, 'title': 'Unsaved', 'status_code': 200, 'seo_analysis': {'score': 1}})
+    with SessionLocal() as db:
+        assert db.query(Analysis).filter_by(url=url).count() == 0
+
+@pytest.mark.parametrize('field,value', [('max_pages', MAX_CRAWL_PAGES + 1), ('max_depth', MAX_CRAWL_DEPTH + 1),
+                                         ('requests_per_second', 0), ('requests_per_second', -1), ('timeout', 0)])
+def test_crawl_settings_are_bounded(field, value):
+    """Crawls can't ask for unbounded pages or depth, or turn off rate limiting and timeouts"""
+    with pytest.raises(ValidationError):
+        CrawlSettings(**{field: value})
@@ -0,0 +1,77 @@
+import io
+import json
+import os
+
+import pandas as pd
+from fastapi.testclient import TestClient
+
+import main
+from main import app
+from models import SessionLocal, Analysis
+from export import ExportManager
+
+client = TestClient(app)
+
+RESULT = {
+    'url': 'https://example.com',
+    'title': 'Example, "quoted"',
+    'status_code': 200,
+    'timestamp': '2025-01-01T00:00:00',
+    'stats': {'processing_time': 0.25, 'content_length': 1200, 'link_count': 2, 'image_count': 1},
+    'links': {'all': [{'text': 'Home', 'href': '/'}, {'text': 'Ünïcode', 'href': 'https://other.com/a,b'}]},
+    'images': {'images': [{'alt': '', 'src': '/logo.png'}]},
+    'metadata': {'meta_tags': {'description': 'Desc'}, 'opengraph': {}},
+}
+
+def test_csv_stream_matches_dataframe_output():
+    """Row-by-row CSV is identical to the previous DataFrame export"""
+    manager = ExportManager()
+    expected = pd.DataFrame(list(manager.csv_rows(RESULT))).to_csv(index=False)
+    assert b''.join(manager.stream(RESULT, 'csv')).decode('utf-8') == expected
+
+def test_json_stream_matches_dump():
+    """Incremental JSON is identical to json.dump output"""
+    expected = json.dumps(RESULT, indent=2, ensure_ascii=False)
+    assert b''.join(ExportManager().stream(RESULT, 'json')).decode('utf-8') == expected
+
+def create_analysis():
+    with TestClient(app):
+        pass
+    with SessionLocal() as db:
+        record = Analysis(url=RESULT['url'], final_url=RESULT['url'], title=RESULT['title'], status_code=200,
+                          page_metadata=RESULT['metadata'], links=RESULT['links'], images=RESULT['images'],
+                          stats=RESULT['stats'])
+        db.add(record)
+        db.commit()
+        return record.id
+
+def test_export_streams_and_caches(tmp_path, monkeypatch):
+    """Exports stream back, leave nothing in the CWD and are served from cache afterwards"""
+    monkeypatch.setattr(main.artifact_cache, 'directory', str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    analysis_id = create_analysis()
+
+    for format in ('csv', 'json', 'pdf', 'excel'):
+        first = client.post(f"/api/export/{analysis_id}", params={'format': format})
+        assert first.status_code == 200
+        assert 'attachment' in first.headers['content-disposition']
+
+        def fail(*args, **kwargs):
+            raise AssertionError("export regenerated despite cached artifact")
+        monkeypatch.setattr(main.export_manager, 'stream', fail)
+        monkeypatch.setattr(main.export_manager, 'write', fail)
+        second = client.post(f"/api/export/{analysis_id}", params={'format': format})
+        assert second.status_code == 200
+        assert second.content == first.content
+        monkeypatch.undo()
+        monkeypatch.setattr(main.artifact_cache, 'directory', str(tmp_path))
+        monkeypatch.chdir(tmp_path)
+
+    assert first.content.startswith(b'PK')  # xlsx is a zip archive
+    assert pd.read_excel(io.BytesIO(first.content), sheet_name='Overview')['Value'][0] == RESULT['url']
+    assert sorted(name.rsplit('.', 1)[1] for name in os.listdir(tmp_path)) == ['csv', 'json', 'pdf', 'xlsx']
+
+def test_export_unsupported_format():
+    """Unknown formats are rejected before any work is done"""
+    response = client.post("/api/export/1", params={'format': 'docx'})
+    assert response.status_code == 400
@@ -0,0 +1,86 @@
+import gzip
+
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.fakes import FakeRedis
+from http_caching import negotiate_encoding, etag_matches
+from main import app
+from models import SessionLocal, Analysis
+
+client = TestClient(app)
+
+PAGE = '<html><head><title>Cached</title></head><body><h1>Cached</h1><p>' + 'Some text. ' * 200 + '</p></body></html>'
+
+def create_analysis():
+    with TestClient(app):
+        pass
+    with SessionLocal() as db:
+        record = Analysis(url='https://example.com', final_url='https://example.com', title='Example', status_code=200,
+                          content={'text': 'Lorem ipsum dolor sit amet. ' * 200, 'length': 5600, 'truncated': True},
+                          links={'all': [{'text': f'Link {i}', 'href': f'/page/{i}'} for i in range(100)]})
+        db.add(record)
+        db.commit()
+        return record.id
+
+def test_negotiate_encoding():
+    """Brotli is preferred, q-values are honoured and q=0 refuses an encoding"""
+    assert negotiate_encoding('gzip, deflate, br') == 'br'
+    assert negotiate_encoding('gzip;q=1.0, br;q=0.5') == 'gzip'
+    assert negotiate_encoding('br;q=0, gzip') == 'gzip'
+    assert negotiate_encoding('*') == 'br'
+    assert negotiate_encoding('identity') is None
+
+def test_analysis_is_compressed_and_revalidated():
+    """Stored analyses are compressed as negotiated and answer 304 to a matching ETag"""
+    analysis_id = create_analysis()
+    plain = client.get(f"/api/analysis/{analysis_id}", headers={'Accept-Encoding': 'identity'})
+    assert 'content-encoding' not in plain.headers
+    assert plain.headers['cache-control'] == 'private, no-cache'
+    etag = plain.headers['etag']
+
+    for encoding in ('gzip', 'br'):
+        response = client.get(f"/api/analysis/{analysis_id}", headers={'Accept-Encoding': encoding})
+        assert response.headers['content-encoding'] == encoding
+        assert response.headers['vary'] == 'Accept-Encoding'
+        assert int(response.headers['content-length']) < len(plain.content)
+        assert response.json() == plain.json()
+        assert response.headers['etag'] == f'{etag[:-1]}-{encoding}"'
+
+        not_modified = client.get(f"/api/analysis/{analysis_id}",
+                                  headers={'Accept-Encoding': encoding, 'If-None-Match': response.headers['etag']})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b''
+
+    assert client.get(f"/api/analysis/{analysis_id}", headers={'If-None-Match': '"stale"'}).status_code == 200
+    assert etag_matches(f'"other", W/{etag}', etag)
+
+def test_small_responses_stay_uncompressed():
+    """Responses under the size threshold aren't compressed"""
+    response = client.get("/health", headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+
+def test_streamed_export_is_compressed():
+    """Streamed exports are compressed chunk by chunk"""
+    analysis_id = create_analysis()
+    with client.stream("POST", f"/api/export/{analysis_id}", params={'format': 'csv'},
+                       headers={'Accept-Encoding': 'gzip'}) as response:
+        raw = b''.join(response.iter_raw())
+    assert response.headers['content-encoding'] == 'gzip'
+    assert gzip.decompress(raw).decode('utf-8').startswith('Type,Metric,Value,Details')
+
+def test_cached_analyze_result_revalidates(stub_site):
+    """Cached /api/analyze results carry an ETag and answer 304 when it matches"""
+    stub_site.routes = {'/': PAGE}
+    payload = {'url': stub_site.url('/'), 'settings': {'include_ai_analysis': False}}
+    saved, main.cache_manager.redis_client = main.cache_manager.redis_client, FakeRedis()
+    try:
+        assert 'etag' not in client.post("/api/analyze", json=payload).headers
+        cached = client.post("/api/analyze", json=payload)
+        repeat = client.post("/api/analyze", json=payload, headers={'If-None-Match': cached.headers['etag']})
+    finally:
+        main.cache_manager.redis_client = saved
+
+    assert cached.headers['cache-control'] == 'private, no-cache'
+    assert repeat.status_code == 304
+    assert repeat.headers['etag'] == cached.headers['etag']
@@ -0,0 +1,116 @@
+import gzip
+import os
+import sqlite3
+import subprocess
+import sys
+import tracemalloc
+
+import pytest
+from fastapi.testclient import TestClient
+
+import ingest
+from ingest import WarcReader
+from main import app
+from models import SessionLocal, Analysis, SEOScore, ContentFingerprint
+
+def page(title, words=50):
+    return (f'<html lang="en"><head><title>{title}</title><meta name="description" content="About {title}"></head>'
+            f'<body><h1>{title}</h1><p>{"word " * words}</p></body></html>')
+
+def warc_record(warc_type, uri, block, content_type='application/http; msgtype=response'):
+    header = (f"WARC/1.0\r\nWARC-Type: {warc_type}\r\nWARC-Target-URI: {uri}\r\n"
+              f"Content-Type: {content_type}\r\nContent-Length: {len(block)}\r\n\r\n").encode()
+    return header + block + b'\r\n\r\n'
+
+def http_response(body, content_type='text/html; charset=utf-8', status='200 OK', headers=''):
+    return f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n{headers}\r\n".encode() + body
+
+def chunked(body):
+    return f"{len(body):x}\r\n".encode() + body + b"\r\n0\r\n\r\n"
+
+def sample_records():
+    return [
+        warc_record('warcinfo', '', b'software: test\r\n', 'application/warc-fields'),
+        warc_record('request', 'http://site.test/', b'GET / HTTP/1.1\r\nHost: site.test\r\n\r\n',
+                    'application/http; msgtype=request'),
+        warc_record('response', 'http://site.test/', http_response(page('Home').encode())),
+        warc_record('response', 'http://site.test/logo.png', http_response(b'\x89PNG', 'image/png')),
+        warc_record('response', 'http://site.test/gz', http_response(
+            chunked(gzip.compress(page('Zipped').encode())),
+            headers='Content-Encoding: gzip\r\nTransfer-Encoding: chunked\r\n')),
+        warc_record('response', 'http://site.test/missing', http_response(page('Missing').encode(), status='404 Not Found')),
+    ]
+
+def write_warc(path, records, compress):
+    with open(path, 'wb') as f:
+        for record in records:
+            # One gzip member per record, as crawlers write .warc.gz
+            f.write(gzip.compress(record) if compress else record)
+    return str(path)
+
+@pytest.mark.parametrize('name, compress', [('crawl.warc', False), ('crawl.warc.gz', True)])
+def test_reader_yields_html_responses(tmp_path, name, compress):
+    """Only HTML response records come out, decoded; the rest are counted as skipped"""
+    reader = WarcReader(write_warc(tmp_path / name, sample_records(), compress))
+    pages = list(reader)
+
+    assert [(p.url, p.status_code) for p in pages] == [
+        ('http://site.test/', 200), ('http://site.test/gz', 200), ('http://site.test/missing', 404)
+    ]
+    assert b'<title>Zipped</title>' in pages[1].body
+    assert (reader.records, reader.skipped) == (6, 3)
+
+def test_reading_memory_stays_flat(tmp_path):
+    """Reading a large archive holds one record at a time"""
+    body = page('Big', words=4000).encode()
+    record = warc_record('response', 'http://site.test/big', http_response(body))
+    path = write_warc(tmp_path / 'big.warc.gz', [record] * 400, compress=True)
+
+    tracemalloc.start()
+    try:
+        count = sum(1 for _ in WarcReader(path))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert count == 400
+    assert peak < 10 * len(record)  # the archive is 400 records
+
+def test_archive_is_analyzed_and_stored(tmp_path):
+    """Records are analyzed on the process pool and stored in batches with their SEO scores"""
+    with TestClient(app):  # creates the tables
+        pass
+    path = write_warc(tmp_path / 'crawl.warc.gz', sample_records() * 2, compress=True)
+    stats = ingest.ingest(WarcReader(path), workers=2, batch_size=4, collect_ids=True)
+
+    assert stats['analyzed'] == 6 and stats['failed'] == 0 and stats['batches'] == 2
+    with SessionLocal() as db:
+        rows = db.query(Analysis).filter(Analysis.id.in_(stats['analysis_ids'])).order_by(Analysis.id).all()
+        assert [row.title for row in rows] == ['Home', 'Zipped', 'Missing'] * 2
+        assert rows[2].status_code == 404
+        assert db.query(SEOScore).filter(SEOScore.analysis_id.in_(stats['analysis_ids'])).count() == 6
+        # Not looked up while ingesting, but fingerprinted for later analyses to find
+        assert all('near_duplicates' not in row.content for row in rows)
+        assert db.get(ContentFingerprint, rows[0].id) is not None
+
+def test_ingest_html_endpoint():
+    """Raw HTML bodies posted to the API are analyzed without fetching"""
+    pages = [{'url': 'https://offline.test/a', 'html': page('Offline A')},
+             {'url': 'https://offline.test/b', 'html': page('Offline B')}]
+    with TestClient(app) as client:
+        response = client.post("/api/ingest/html", json={'pages': pages, 'settings': {'include_ai_analysis': True}})
+    assert response.status_code == 200
+    ids = response.json()['analysis_ids']
+    with SessionLocal() as db:
+        assert [db.get(Analysis, i).url for i in ids] == ['https://offline.test/a', 'https://offline.test/b']
+
+def test_ingest_cli_indexes_pages_for_search(tmp_path):
+    """Pages ingested from the command line, in a fresh database, can be searched"""
+    (tmp_path / 'saved').mkdir()
+    (tmp_path / 'saved' / 'page.html').write_text(page('Archived Zeppelin'))
+    database = tmp_path / 'ingest.db'
+    subprocess.run([sys.executable, 'ingest.py', str(tmp_path / 'saved'), '--workers', '1'], check=True,
+                   cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True,
+                   env=dict(os.environ, DATABASE_URL=f"sqlite:///{database}"))
+    with sqlite3.connect(database) as connection:
+        found = connection.execute("SELECT title FROM analysis_search WHERE analysis_search MATCH 'zeppelin'").fetchall()
+    assert found == [('Archived Zeppelin',)]
@@ -0,0 +1,119 @@
+import time
+
+import pytest
+from celery.contrib.testing.worker import start_worker
+from fastapi.testclient import TestClient
+
+import jobs
+from main import app
+from models import SessionLocal, Analysis, JobItem
+
+client = TestClient(app)
+
+def page(title, *hrefs):
+    links = ''.join(f'<a href="{href}">link</a>' for href in hrefs)
+    return f"<html><head><title>{title}</title></head><body><p>Some text</p>{links}</body></html>"
+
+NO_AI = {"include_ai_analysis": False}
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(jobs, 'RETRY_BACKOFF_BASE', 0.01)
+
+@pytest.fixture
+def worker():
+    with TestClient(app):  # runs lifespan so tables exist
+        with start_worker(jobs.celery_app, perform_ping_check=False, shutdown_timeout=30):
+            yield
+
+def wait_for(job_id, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        data = client.get(f"/api/jobs/{job_id}").json()
+        if data['status'] in jobs.FINISHED_JOB_STATUSES:
+            return data
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish: {data}")
+
+def test_batch_job_with_retries(stub_site, worker):
+    """Batch jobs retry transient errors and fail permanent ones"""
+    stub_site.routes = {
+        '/ok': page('OK'),
+        '/flaky': [{'status': 503, 'body': 'busy'}, page('Recovered')],
+        '/gone': {'status': 404, 'body': 'missing'},
+    }
+    urls = [stub_site.url(p) for p in ('/ok', '/flaky', '/gone')]
+    response = client.post("/api/jobs", json={"urls": urls, "settings": NO_AI})
+    assert response.status_code == 202
+
+    data = wait_for(response.json()['job_id'])
+    assert data['status'] == 'completed'
+    assert data['progress']['completed'] == 2
+    assert data['progress']['failed'] == 1
+    results = {r['url']: r for r in data['results']}
+    assert results[urls[1]]['attempts'] == 2
+    assert results[urls[2]]['status'] == 'failed'
+    assert all(results[u]['analysis_id'] for u in urls[:2])
+
+def test_redelivered_item_is_not_persisted_twice(stub_site, worker):
+    """Re-running a finished item does not insert another Analysis"""
+    stub_site.routes = {'/ok': page('OK')}
+    job_id = client.post("/api/jobs", json={"urls": [stub_site.url('/ok')], "settings": NO_AI}).json()['job_id']
+    wait_for(job_id)
+
+    with SessionLocal() as db:
+        item = db.query(JobItem).filter_by(job_id=job_id).one()
+        before = db.query(Analysis).count()
+    jobs.analyze_job_item.apply(args=(item.id,))
+    with SessionLocal() as db:
+        assert db.query(Analysis).count() == before
+
+def test_failed_score_save_leaves_no_analysis(stub_site, monkeypatch):
+    """An item whose SEO scores can't be saved fails without an analysis attached"""
+    stub_site.routes = {'/scored': page('Scored')}
+    with TestClient(app):
+        job_id = client.post("/api/jobs", json={"urls": [stub_site.url('/scored')], "settings": NO_AI}).json()['job_id']
+    with SessionLocal() as db:
+        item_id = db.query(JobItem).filter_by(job_id=job_id).one().id
+
+    def locked(*args, **kwargs):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(jobs.seo, 'save_results', locked)
+    jobs.analyze_job_item.apply(args=(item_id,))
+
+    with SessionLocal() as db:
+        item = db.get(JobItem, item_id)
+        assert (item.status, item.analysis_id, item.error) == ('failed', None, "database is locked")
+        assert db.query(Analysis).filter_by(url=stub_site.url('/scored')).count() == 0
+
+def test_cancel_queued_job(stub_site):
+    """Cancelled jobs skip their queued items"""
+    stub_site.routes = {'/ok': page('OK')}
+    with TestClient(app):
+        job_id = client.post("/api/jobs", json={"urls": [stub_site.url('/ok')] * 3, "settings": NO_AI}).json()['job_id']
+        assert client.post(f"/api/jobs/{job_id}/cancel").json()['status'] == 'cancelled'
+        with start_worker(jobs.celery_app, perform_ping_check=False):
+            time.sleep(0.5)
+        data = client.get(f"/api/jobs/{job_id}").json()
+    assert data['status'] == 'cancelled'
+    assert data['progress']['cancelled'] == 3
+    assert '/ok' not in stub_site.requests
+
+def test_crawl_job(stub_site, worker):
+    """Crawl jobs record each crawled page as a result"""
+    stub_site.routes = {'/': page('Home', '/a'), '/a': page('A')}
+    response = client.post("/api/jobs", json={
+        "kind": "crawl",
+        "urls": [stub_site.url('/')],
+        "settings": NO_AI,
+        "crawl": {"requests_per_second": 20}
+    })
+    data = wait_for(response.json()['job_id'])
+    assert data['status'] == 'completed'
+    assert data['report']['pages_crawled'] == 2
+    assert {r['url'] for r in data['results']} == {stub_site.url('/'), stub_site.url('/a')}
+
+def test_unknown_job_kind():
+    """Unknown job kinds are rejected"""
+    response = client.post("/api/jobs", json={"kind": "bogus", "urls": ["https://example.com"]})
+    assert response.status_code == 400
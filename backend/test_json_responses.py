@@ -0,0 +1,50 @@
+import json
+from datetime import datetime
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.fakes import FakeRedis
+from cache import CacheManager
+from json_responses import FastJSONResponse, dumps
+from main import app
+
+client = TestClient(app)
+
+PAGE = '<html><head><title>Cached</title></head><body><h1>Cached</h1><a href="/a">A</a></body></html>'
+
+def test_render_plain_and_preserialized():
+    """Dicts are rendered with orjson; bytes are sent unchanged"""
+    body = FastJSONResponse({'when': datetime(2024, 1, 2, 3, 4, 5), 'counts': {1: np.int64(2)}}).body
+    assert json.loads(body) == {'when': '2024-01-02T03:04:05', 'counts': {'1': 2}}
+    assert FastJSONResponse(b'{"cached":true}').body == b'{"cached":true}'
+
+def test_cache_keeps_serialized_results():
+    """The cache hands back the stored JSON bytes; older entries count as expired"""
+    cache = CacheManager()
+    cache.redis_client = FakeRedis()
+    result = {'title': 'Cached', 'links': {'total': 1}}
+    assert cache.set('https://example.com', {}, result)
+    assert cache.get_raw('https://example.com', {}) == dumps(result)
+    assert cache.get('https://example.com', {}) == result
+
+    key = cache._generate_key('https://example.com', {})
+    cache.redis_client.setex(key, 60, json.dumps({'result': result, 'cached_at': datetime.utcnow().isoformat()}).encode())
+    assert cache.get_raw('https://example.com', {}) is None
+    assert cache.redis_client.dbsize() == 0
+
+def test_cache_hit_served_without_reencoding(stub_site):
+    """A repeat analysis answers with the cached bytes as the response body"""
+    stub_site.routes = {'/': PAGE}
+    saved, main.cache_manager.redis_client = main.cache_manager.redis_client, FakeRedis()
+    try:
+        payload = {'url': stub_site.url('/'), 'settings': {'include_ai_analysis': False}}
+        first = client.post("/api/analyze", json=payload)
+        second = client.post("/api/analyze", json=payload)
+    finally:
+        main.cache_manager.redis_client = saved
+
+    assert first.status_code == second.status_code == 200
+    assert second.content == main.json_responses.dumps({k: v for k, v in first.json().items() if k != 'analysis_id'})
+    assert second.headers['content-type'] == 'application/json'
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import link_checker
+from cache import SharedCache
+from link_checker import check_links
+from main import app
+
+client = TestClient(app)
+
+@pytest.fixture
+def status_cache(monkeypatch):
+    cache = SharedCache('linkstatus:', 60, 100)
+    monkeypatch.setattr(link_checker, 'status_cache', cache)
+    return cache
+
+def test_links_are_labelled(stub_site, status_cache, monkeypatch):
+    """Each outcome gets its label; HEAD refusals fall back to GET"""
+    monkeypatch.setattr(link_checker, 'LINK_CHECK_TIMEOUT', 0.3)
+    stub_site.routes = {
+        '/ok': 'fine',
+        '/moved': {'status': 301, 'headers': {'Location': '/ok'}},
+        '/gone': {'status': 404},
+        '/broken': {'status': 500},
+        '/no-head': {'body': 'fine', 'head': False},
+        '/slow': {'body': 'late', 'delay': 1},
+        '/loop': {'status': 302, 'headers': {'Location': '/loop'}},
+    }
+    urls = [stub_site.url(path) for path in stub_site.routes] + ['mailto:someone@example.com']
+    statuses = check_links(urls, 'test-agent')
+
+    labels = {url[len(stub_site.url('')):]: status['status'] for url, status in statuses.items()}
+    assert labels == {'/ok': 'ok', '/moved': 'redirect', '/gone': 'client_error', '/broken': 'server_error',
+                      '/no-head': 'ok', '/slow': 'timeout', '/loop': 'error'}
+    assert statuses[stub_site.url('/moved')]['final_url'] == stub_site.url('/ok')
+    assert statuses[stub_site.url('/gone')]['status_code'] == 404
+
+def test_checks_are_limited_per_host(stub_site, status_cache):
+    """No more than `per_host` requests go to one host at a time"""
+    stub_site.routes = {f"/page/{i}": {'body': 'fine', 'delay': 0.2} for i in range(6)}
+    started = time.perf_counter()
+    check_links([stub_site.url(path) for path in stub_site.routes], 'test-agent', per_host=2)
+    assert time.perf_counter() - started >= 0.6 - 0.05
+
+def test_statuses_are_cached_by_normalized_url(stub_site, status_cache):
+    """A link already checked, in any spelling, isn't requested again"""
+    stub_site.routes = {'/a': 'fine'}
+    check_links([stub_site.url('/a?x=1&y=2')], 'test-agent')
+    stub_site.requests.clear()
+
+    statuses = check_links([stub_site.url('/a?y=2&x=1#top'), stub_site.url('/./a?x=1&y=2')], 'test-agent')
+    assert len(statuses) == 1 and all(status['cached'] for status in statuses.values())
+    assert stub_site.requests == []
+
+def test_analysis_reports_broken_links(stub_site, status_cache):
+    """/api/analyze with check_links labels each link and lists the broken ones"""
+    stub_site.routes = {
+        '/': '<html><head><title>Links</title></head><body><a href="/fine">Fine</a>'
+             '<a href="/missing">Missing</a><a href="/missing">Missing again</a></body></html>',
+        '/fine': 'fine',
+    }
+    result = client.post("/api/analyze", json={'url': stub_site.url('/'), 'settings': {
+        'include_ai_analysis': False, 'check_links': True}}).json()
+
+    assert [link['status'] for link in result['links']['all']] == ['ok', 'client_error', 'client_error']
+    assert result['link_check']['checked'] == 2
+    assert result['link_check']['counts']['client_error'] == 1
+    assert [link['url'] for link in result['link_check']['broken']] == [stub_site.url('/missing')]
@@ -0,0 +1,80 @@
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+import link_index
+from link_index import edge_rows
+from main import app
+from models import SessionLocal, Analysis, LinkEdge
+
+client = TestClient(app)
+
+def links(*targets):
+    return {'all': [{'text': '', 'href': url, 'full_url': url, 'is_internal': internal} for url, internal in targets]}
+
+def test_edge_rows_are_normalized_and_deduplicated():
+    """One edge per normalized HTTP(S) target, with the domain stripped of www."""
+    rows = edge_rows(links(('https://WWW.Example.com/a?y=2&x=1#top', False), ('https://www.example.com/a?x=1&y=2', False),
+                           ('mailto:someone@example.com', False), ('http://site.test/', True)))
+    assert [(row['target_url'], row['target_domain'], row['is_internal']) for row in rows] == [
+        ('https://www.example.com/a?x=1&y=2', 'example.com', False),
+        ('http://site.test/', 'site.test', True),
+    ]
+
+def test_edges_are_written_with_each_analysis(stub_site):
+    """An analyzed page's links can be found from their target URL or domain"""
+    with TestClient(app):  # creates the tables
+        pass
+    stub_site.routes = {'/': '<html><head><title>Source</title></head><body>'
+                             '<a href="https://www.inbound-target.test/page">Out</a><a href="/local">Local</a></body></html>'}
+    result = client.post("/api/analyze", json={'url': stub_site.url('/'), 'settings': {'include_ai_analysis': False}}).json()
+
+    by_domain = client.get("/api/links/inbound", params={'domain': 'www.inbound-target.test'}).json()
+    assert [(row['analysis_id'], row['source_url'], row['source_title']) for row in by_domain] == [
+        (result['analysis_id'], stub_site.url('/'), 'Source')]
+    by_url = client.get("/api/links/inbound", params={'url': 'https://WWW.inbound-target.test/page#x'}).json()
+    assert [row['analysis_id'] for row in by_url] == [result['analysis_id']]
+    assert client.get("/api/links/inbound").status_code == 400
+
+def seed(created_at, *pages):
+    with TestClient(app):  # creates the tables
+        pass
+    with SessionLocal() as db:
+        # Inserted without the ORM, as rows stored before link edges existed
+        ids = [db.execute(insert(Analysis).values(url=f"https://source.test/{i}", title='Old', created_at=created_at,
+                                                  links=links(*targets)).returning(Analysis.id)).scalar()
+               for i, targets in enumerate(pages)]
+        db.commit()
+    return ids
+
+def test_backfill_is_chunked_and_resumable():
+    """Stored analyses without edges get them, a chunk at a time, and only once"""
+    ids = seed(datetime(2031, 1, 1), [('https://backfill.test/a', False)], [], [('https://backfill.test/b', False)])
+    stats = link_index.backfill(chunk_size=2)
+    assert stats['analyses'] >= 3 and stats['chunks'] >= 2
+
+    with SessionLocal() as db:
+        edges = db.query(LinkEdge).filter(LinkEdge.analysis_id.in_(ids)).order_by(LinkEdge.analysis_id).all()
+    assert [(edge.analysis_id, edge.target_url) for edge in edges] == [
+        (ids[0], 'https://backfill.test/a'), (ids[2], 'https://backfill.test/b')]
+    assert edges[0].created_at == datetime(2031, 1, 1)
+
+    # Only the analysis without links is looked at again
+    assert client.post("/api/links/backfill").json()['edges'] == 0
+
+def test_top_domains():
+    """Domains are ranked by linking pages over the time range; internal links are left out"""
+    seed(datetime(2032, 6, 1),
+         [('https://popular.test/1', False), ('https://popular.test/2', False), ('https://rare.test/', False)],
+         [('https://popular.test/1', False), ('https://own.test/', True)],
+         [('https://popular.test/3', False)])
+    seed(datetime(2032, 1, 1), [('https://rare.test/', False)] * 1, [('https://rare.test/x', False)])
+    link_index.backfill()
+
+    top = client.get("/api/links/top-domains", params={'since': '2032-05-01T00:00:00'}).json()
+    assert top == [{'domain': 'popular.test', 'linking_pages': 3, 'links': 4},
+                   {'domain': 'rare.test', 'linking_pages': 1, 'links': 1}]
+    everything = client.get("/api/links/top-domains", params={'since': '2032-01-01T00:00:00', 'external_only': False}).json()
+    assert [(row['domain'], row['linking_pages']) for row in everything] == [
+        ('popular.test', 3), ('rare.test', 3), ('own.test', 1)]
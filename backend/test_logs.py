@@ -0,0 +1,65 @@
+import json
+import logging
+
+from fastapi.testclient import TestClient
+
+import logs
+from main import app
+
+client = TestClient(app)
+
+def captured(capsys, action):
+    """Run `action` with a fresh pipeline and return the JSON lines it wrote."""
+    logs.stop_logging()
+    logs.setup_logging(format='json')
+    try:
+        action()
+    finally:
+        logs.stop_logging()  # drains the queue
+        logs.setup_logging()
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{')]
+
+def test_json_lines_with_extra_fields(capsys):
+    """Records come out as JSON with extras and tracebacks kept separate"""
+    logger = logging.getLogger('test_logs')
+
+    def action():
+        logger.info("Hello %s", "world", extra={'url': 'https://example.com'})
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.exception("Boom")
+
+    hello, boom = [entry for entry in captured(capsys, action) if entry['logger'] == 'test_logs']
+    assert hello['message'] == "Hello world"
+    assert hello['level'] == 'INFO'
+    assert hello['url'] == 'https://example.com'
+    assert boom['message'] == "Boom"
+    assert 'ZeroDivisionError' in boom['exc']
+
+def test_request_id_correlation(capsys, stub_site):
+    """Log lines emitted while serving a request carry its request id"""
+    stub_site.routes = {'/': '<html><head><title>Hi</title></head><body></body></html>'}
+
+    def action():
+        response = client.post("/api/analyze", headers={'X-Request-ID': 'abc123'},
+                               json={'url': stub_site.url('/'), 'settings': {'include_ai_analysis': False}})
+        assert response.headers['x-request-id'] == 'abc123'
+        assert client.get("/health").headers['x-request-id'] != 'abc123'
+
+    entries = [entry for entry in captured(capsys, action) if entry['logger'] == 'main']
+    assert {entry['message'] for entry in entries} >= {"Analysis requested", "Analysis complete"}
+    assert all(entry['request_id'] == 'abc123' for entry in entries)
+
+def test_sampling_and_module_levels(capsys):
+    """Sampled loggers keep a fraction of records; per-module levels apply"""
+    logger = logs.sampled_logger('test_logs.sampled', 0.1)
+    assert logs.parse_levels("cache=WARNING, crawler=debug") == {'cache': 'WARNING', 'crawler': 'DEBUG'}
+
+    def action():
+        for i in range(2000):
+            logger.info("Cache hit")
+
+    entries = [entry for entry in captured(capsys, action) if entry['logger'] == 'test_logs.sampled']
+    assert 100 < len(entries) < 300
+    assert all(entry['sample_rate'] == 0.1 for entry in entries)
@@ -0,0 +1,51 @@
+from fastapi.testclient import TestClient
+
+from main import app
+from metrics import REGISTRY
+
+client = TestClient(app)
+
+PAGE = ('<html><head><title>Timed</title><meta name="description" content="A page"></head>'
+        '<body><h1>Timed</h1><p>Some text</p></body></html>')
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def test_analyze_reports_stage_timings(stub_site):
+    """Timings cover each pipeline stage and feed the stage histograms"""
+    stub_site.routes = {'/': PAGE}
+    fetches = sample('webanalyzer_fetch_responses_total', status='200')
+    parses = sample('webanalyzer_stage_duration_seconds_count', stage='parse')
+
+    with TestClient(app) as test_client:
+        response = test_client.post(
+            "/api/analyze", params={'include_timings': 'true'},
+            json={'url': stub_site.url('/'), 'settings': {'include_ai_analysis': False}}
+        )
+    assert response.status_code == 200
+    timings = response.json()['stats']['timings']
+    for stage in ('cache_get', 'fetch', 'parse', 'extract', 'seo', 'cache_set', 'db'):
+        assert timings[stage] >= 0
+    assert timings['total'] >= sum(value for stage, value in timings.items() if stage != 'total')
+
+    assert sample('webanalyzer_fetch_responses_total', status='200') == fetches + 1
+    assert sample('webanalyzer_stage_duration_seconds_count', stage='parse') == parses + 1
+
+def test_timings_are_opt_in(stub_site):
+    """Without the flag the stats carry no timings"""
+    stub_site.routes = {'/': PAGE}
+    response = client.post("/api/analyze", json={'url': stub_site.url('/'), 'settings': {'include_ai_analysis': False}})
+    assert response.status_code == 200
+    assert 'timings' not in response.json()['stats']
+
+def test_metrics_endpoint():
+    """/metrics serves Prometheus text including request and queue metrics"""
+    client.get("/health")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    body = response.text
+    assert 'webanalyzer_http_request_duration_seconds_count{handler="health_check",method="GET",status="200"}' in body
+    assert 'webanalyzer_queue_depth{queue="job_items"}' in body
+    assert 'webanalyzer_queue_depth{queue="exports"}' in body
+    assert 'webanalyzer_http_requests_in_flight 1.0' in body
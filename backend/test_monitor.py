@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Base, engine, SessionLocal, Analysis, Monitor, MonitorRun
+from monitor import (
+    make_view, diff_views, apply_diff, create_monitor, claim_due_monitors,
+    run_monitor, reconstruct_view, view_from_result
+)
+from pipeline import AnalysisSettings, fetch_and_analyze
+import seo
+from seo import SEOEngine
+
+SETTINGS = AnalysisSettings(include_ai_analysis=False)
+
+def page(title, *hrefs, description="A page"):
+    links = ''.join(f'<a href="{href}">link</a>' for href in hrefs)
+    return (f'<html><head><title>{title}</title><meta name="description" content="{description}"></head>'
+            f'<body><h1>{title}</h1><img src="/logo.png">{links}</body></html>')
+
+def test_diff_round_trip():
+    """Applying a diff to the old view yields the new view"""
+    old = make_view("Old", {'meta_tags': {'description': 'a', 'robots': 'index'}},
+                    {'all': [{'full_url': 'https://x/a'}, {'full_url': 'https://x/b'}]},
+                    {'images': [{'full_url': 'https://x/1.png'}]}, 60)
+    new = make_view("New", {'meta_tags': {'description': 'b', 'author': 'me'}},
+                    {'all': [{'full_url': 'https://x/b'}, {'full_url': 'https://x/c'}]},
+                    {'images': []}, 70)
+    diff = diff_views(old, new)
+
+    assert diff['title'] == {'old': 'Old', 'new': 'New'}
+    assert diff['links'] == {'added': ['https://x/c'], 'removed': ['https://x/a']}
+    assert diff['meta_tags'] == {'set': {'description': 'b', 'author': 'me'}, 'removed': ['robots']}
+    assert 'canonical' not in diff
+    assert apply_diff(old, diff) == new
+    assert diff_views(new, new) == {}
+
+def test_run_history_and_reconstruction(stub_site):
+    """Runs store full snapshots periodically, diffs otherwise, and skip unchanged pages"""
+    Base.metadata.create_all(bind=engine)
+    seo_engine = SEOEngine()
+    stub_site.routes = {'/': page('First', '/a')}
+
+    with SessionLocal() as db:
+        record = create_monitor(db, stub_site.url('/'), SETTINGS, 3600, full_snapshot_every=3)
+        analyses_before = db.query(Analysis).count()
+
+        runs = [run_monitor(db, record, seo_engine)]
+        runs.append(run_monitor(db, record, seo_engine))
+        stub_site.routes['/'] = page('Second', '/a', '/b')
+        runs.append(run_monitor(db, record, seo_engine))
+        stub_site.routes['/'] = page('Third', '/b', description="Changed")
+        runs.append(run_monitor(db, record, seo_engine))
+        stub_site.routes['/'] = page('Fourth', '/b')
+        runs.append(run_monitor(db, record, seo_engine))
+
+        assert [run.kind for run in runs] == ['full', 'unchanged', 'diff', 'diff', 'full']
+        assert db.query(Analysis).count() == analyses_before + 2
+        assert runs[2].diff['title'] == {'old': 'First', 'new': 'Second'}
+        assert runs[2].diff['links']['added'] == [stub_site.url('/b')]
+        assert 'images' not in runs[2].diff
+        assert runs[3].diff['meta_tags'] == {'set': {'description': 'Changed'}, 'removed': []}
+
+        expected = fetch_and_analyze(stub_site.url('/'), SETTINGS, seo_engine)[0]
+        assert reconstruct_view(db, runs[4]) == view_from_result(expected)
+        assert reconstruct_view(db, runs[3])['title'] == 'Third'
+        assert reconstruct_view(db, runs[3])['links'] == [stub_site.url('/b')]
+        assert reconstruct_view(db, runs[1])['title'] == 'First'
+
+def test_error_run_keeps_state(stub_site):
+    """Fetch errors are recorded without touching the last known state"""
+    Base.metadata.create_all(bind=engine)
+    stub_site.routes = {'/': {'status': 500, 'body': 'down'}}
+    with SessionLocal() as db:
+        record = create_monitor(db, stub_site.url('/'), SETTINGS, 3600)
+        run = run_monitor(db, record)
+        assert run.kind == 'error'
+        assert run.status_code == 500
+        assert record.last_view is None
+
+def test_failed_score_save_leaves_no_run(stub_site, monkeypatch):
+    """A run interrupted while saving its snapshot leaves no analysis or run behind"""
+    Base.metadata.create_all(bind=engine)
+    stub_site.routes = {'/': page('Unsaved')}
+    save_results = seo.save_results
+    def interrupted(*args, **kwargs):
+        save_results(*args, **kwargs)
+        raise RuntimeError("worker lost")
+    monkeypatch.setattr('monitor.seo.save_results', interrupted)
+    with SessionLocal() as db:
+        record = create_monitor(db, stub_site.url('/'), SETTINGS, 3600)
+        with pytest.raises(RuntimeError):
+            run_monitor(db, record, SEOEngine())
+    with SessionLocal() as db:
+        assert db.query(Analysis).filter_by(url=stub_site.url('/')).count() == 0
+        assert db.query(MonitorRun).filter_by(monitor_id=record.id).count() == 0
+
+def test_claim_respects_host_cap():
+    """A scheduler pass claims at most host_cap monitors per host"""
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow() + timedelta(days=1)
+    with SessionLocal() as db:
+        db.query(Monitor).update({'is_active': False})
+        ids = [create_monitor(db, f"https://busy.example/{i}", SETTINGS, 600).id for i in range(5)]
+        ids.append(create_monitor(db, "https://quiet.example/", SETTINGS, 600).id)
+
+        claimed = claim_due_monitors(db, now=now, host_cap=2)
+        assert len(claimed) == 3
+        assert ids[-1] in claimed
+        for record in db.query(Monitor).filter(Monitor.id.in_(ids)):
+            assert record.next_run_at > now
@@ -0,0 +1,92 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+import near_duplicates
+from main import app
+from models import SessionLocal, Analysis, ContentFingerprint
+from pipeline import AnalysisSettings, analysis_record
+
+client = TestClient(app)
+
+def words(prefix, count=300, start=0):
+    return ' '.join(f"{prefix}{i}" for i in range(start, start + count))
+
+def test_signatures_estimate_similarity():
+    """Near-identical texts get near-identical signatures; unrelated texts share next to nothing"""
+    text = words('alpha')
+    edited = text.replace('alpha150', 'changed')
+    signature = near_duplicates.signature(text)
+    assert signature.shape == (near_duplicates.MINHASH_PERMUTATIONS,)
+    assert near_duplicates.similarity(signature, near_duplicates.signature(edited)[None, :])[0] > 0.9
+    assert near_duplicates.similarity(signature, near_duplicates.signature(words('beta'))[None, :])[0] < 0.1
+    # Only words count, not case or punctuation
+    assert (near_duplicates.signature(text.upper().replace(' ', ', ')) == signature).all()
+    assert near_duplicates.signature('  ...  ') is None
+
+def page(body):
+    return f"<html><head><title>Syndicated</title></head><body><p>{body}</p></body></html>"
+
+def test_near_duplicates_are_found_and_reported(stub_site):
+    """A page nearly identical to a stored one lists it and fails the duplicate-content rule"""
+    with TestClient(app):  # creates the tables
+        pass
+    text = words('gamma')
+    stub_site.routes = {'/original': page(text), '/copy': page(text.replace('gamma7 ', 'and ')),
+                        '/other': page(words('delta'))}
+    settings = {'include_ai_analysis': False}
+
+    def analyze(path):
+        return client.post("/api/analyze", json={'url': stub_site.url(path), 'settings': settings}).json()
+
+    original = analyze('/original')
+    assert original['content']['near_duplicates'] == []
+    copy = analyze('/copy')
+    assert [(m['analysis_id'], m['url']) for m in copy['content']['near_duplicates']] == [
+        (original['analysis_id'], stub_site.url('/original'))]
+    assert copy['content']['near_duplicates'][0]['similarity'] >= near_duplicates.NEAR_DUPLICATE_THRESHOLD
+    assert "Content nearly duplicates 1 other analyzed pages" in copy['seo_analysis']['issues']
+    assert analyze('/other')['content']['near_duplicates'] == []
+
+    # A page analyzed again isn't a duplicate of itself
+    settings['max_links'] = 10  # a different cache key, so it's fetched again
+    assert [m['url'] for m in analyze('/original')['content']['near_duplicates']] == [stub_site.url('/copy')]
+
+def store(url, text, ai_insights=None):
+    result = {'url': url, 'content': {'text': text}, 'ai_insights': ai_insights}
+    with SessionLocal() as db:
+        record = analysis_record(result, AnalysisSettings())
+        db.add(record)
+        db.commit()
+        return record.id
+
+def test_ai_insights_are_reused_for_near_identical_pages():
+    """Successful insights of a near-identical page are reused; weaker matches and failures are not"""
+    with TestClient(app):
+        pass
+    insights = {'success': True, 'analysis': {'summary': 'A page'}}
+    text = words('epsilon')
+    reusable = store('https://reuse.test/a', text, insights)
+    failed = store('https://reuse.test/b', text, {'error': 'AI analysis failed'})
+
+    duplicates = near_duplicates.lookup(text, 'https://reuse.test/c')
+    assert {m['analysis_id'] for m in duplicates} == {reusable, failed}
+    result = {'content': {'text': text, 'near_duplicates': duplicates}}
+    assert near_duplicates.reusable_insights(result) == dict(insights, reused_from=reusable)
+
+    result['content']['near_duplicates'] = [dict(m, similarity=0.9) for m in duplicates]
+    assert near_duplicates.reusable_insights(result) is None
+
+def test_backfill_fingerprints_stored_analyses():
+    """Analyses stored without fingerprints get them, and become findable"""
+    with TestClient(app):
+        pass
+    with SessionLocal() as db:
+        analysis_id = db.execute(insert(Analysis).values(
+            url='https://backfill.test/zeta', content={'text': words('zeta')}).returning(Analysis.id)).scalar()
+        db.commit()
+
+    assert near_duplicates.backfill(chunk_size=2)['fingerprints'] >= 1
+    with SessionLocal() as db:
+        assert db.get(ContentFingerprint, analysis_id) is not None
+    assert near_duplicates.backfill()['fingerprints'] == 0
+    assert [m['analysis_id'] for m in near_duplicates.lookup(words('zeta'), 'https://elsewhere.test/')] == [analysis_id]
@@ -0,0 +1,95 @@
+import datetime
+import ssl
+
+import requests
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+from fastapi.testclient import TestClient
+
+from main import app
+from benchmarks.stub_sites import StubServer
+from network_timing import TimingAdapter, hop_timings, summarize
+
+client = TestClient(app)
+
+PAGE = '<html><head><title>Timed</title></head><body><p>Text</p></body></html>'
+
+def timed_session():
+    session = requests.Session()
+    session.mount('http://', TimingAdapter())
+    session.mount('https://', TimingAdapter())
+    return session
+
+def self_signed_context(tmp_path):
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, '127.0.0.1')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    (tmp_path / 'cert.pem').write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    (tmp_path / 'key.pem').write_bytes(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                         serialization.NoEncryption()))
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(tmp_path / 'cert.pem', tmp_path / 'key.pem')
+    return context
+
+def test_phases_per_redirect_hop():
+    """Each hop is timed; delays show up as time to first byte and download"""
+    routes = {
+        '/old': {'status': 301, 'headers': {'Location': '/new'}},
+        '/new': {'body': 'x' * 50000, 'delay': 0.2, 'body_delay': 0.15},
+    }
+    with StubServer(routes, keep_alive=True) as server, timed_session() as session:
+        response = session.get(server.url('/old'))
+
+    redirect, final = hop_timings(response)
+    assert (redirect['url'], redirect['status_code']) == (server.url('/old'), 301)
+    assert (final['url'], final['status_code']) == (server.url('/new'), 200)
+    assert final['http_version'] == 'HTTP/1.1'
+
+    # The redirect opened the connection; the final hop went over it again
+    assert not redirect['reused_connection'] and redirect['dns_ms'] is not None and redirect['connect_ms'] > 0
+    assert redirect['tls_ms'] is None
+    assert final['reused_connection'] and final['dns_ms'] is None and final['connect_ms'] is None
+
+    # A little slack: the server's sleeps and our clock don't line up to the microsecond
+    assert final['ttfb_ms'] >= 190 and redirect['ttfb_ms'] < 190
+    assert final['download_ms'] >= 140 and final['bytes'] == 50000
+    assert 0 < final['throughput_bps'] < 50000 / 0.14
+    assert final['total_ms'] >= final['ttfb_ms'] + final['download_ms']
+
+    network = summarize(hop_timings(response))
+    assert network['ttfb_ms'] == round(redirect['ttfb_ms'] + final['ttfb_ms'], 3)
+    assert network['reused_connections'] == 1 and len(network['hops']) == 2
+
+def test_tls_handshake_is_timed(tmp_path):
+    """HTTPS connections report the TLS handshake separately from the TCP connect"""
+    with StubServer({'/': PAGE}, ssl_context=self_signed_context(tmp_path)) as server, timed_session() as session:
+        response = session.get(server.url('/'), verify=False)
+
+    timing = response.network_timing
+    assert response.text == PAGE
+    assert timing['connect_ms'] > 0 and timing['tls_ms'] > 0
+
+def test_analysis_reports_and_stores_timings(stub_site):
+    """/api/analyze exposes the breakdown under performance and it can be queried later"""
+    stub_site.routes = {'/slow': {'body': PAGE, 'delay': 0.1}, '/go': {'status': 302, 'headers': {'Location': '/slow'}}}
+    with TestClient(app):  # creates the tables
+        pass
+    response = client.post("/api/analyze", json={'url': stub_site.url('/go'), 'settings': {'include_ai_analysis': False}})
+    network = response.json()['performance']['network']
+    assert [hop['status_code'] for hop in network['hops']] == [302, 200]
+    assert network['ttfb_ms'] >= 90
+
+    timings = client.get("/api/performance/timings", params={'url': stub_site.url('/go')}).json()
+    assert [(t['analysis_id'], t['hop'], t['url']) for t in timings] == [
+        (response.json()['analysis_id'], 1, stub_site.url('/slow'))
+    ]
+    assert timings[0]['ttfb_ms'] == network['hops'][1]['ttfb_ms']
+
+    all_hops = client.get("/api/performance/timings", params={'url': stub_site.url('/go'), 'final_only': False}).json()
+    assert [t['status_code'] for t in all_hops] == [302, 200]
@@ -0,0 +1,98 @@
+import gzip
+
+import pytest
+from fastapi.testclient import TestClient
+
+import page_weight
+from main import app
+from cache import SharedCache
+from page_weight import audit, collect_subresources
+from pipeline import parse_html
+
+client = TestClient(app)
+
+CSS = gzip.compress(b'body { color: #333; }' * 200)
+JS = 'console.log("hello");' * 100
+FONT = b'\x00' * 3000
+
+PAGE = """<html><head><title>Heavy</title>
+<link rel="stylesheet" href="/site.css"><link rel="preload" as="font" href="/font.woff2">
+<link rel="icon" href="/favicon.ico"><style>@font-face { src: url('/font.woff2'); }</style>
+<script src="/app.js"></script></head>
+<body><img src="/logo.png"><img src="logo.png" srcset="/logo.png 1x, /logo@2x.png 2x">
+<img src="data:image/gif;base64,R0lGOD"><script src="/app.js"></script><img src="/missing.png"></body></html>"""
+
+ROUTES = {
+    '/site.css': {'body': CSS, 'headers': {'Content-Type': 'text/css', 'Content-Encoding': 'gzip',
+                                          'Cache-Control': 'public, max-age=31536000'}},
+    '/app.js': {'body': JS, 'headers': {'Content-Type': 'application/javascript'}},
+    '/logo.png': {'body': b'\x89PNG' + b'\x00' * 1000, 'headers': {'Content-Type': 'image/png', 'ETag': '"v1"'}},
+    '/logo@2x.png': {'body': b'\x89PNG' + b'\x00' * 4000, 'headers': {'Content-Type': 'image/png', 'Cache-Control': 'no-store'}},
+    '/favicon.ico': {'body': b'\x00' * 500, 'headers': {'Content-Type': 'image/x-icon', 'Cache-Control': 'max-age=600'}},
+    # Refuses HEAD; its size comes from a ranged GET
+    '/font.woff2': {'body': FONT, 'head': False, 'ranges': True,
+                    'headers': {'Content-Type': 'font/woff2', 'Cache-Control': 'max-age=86400'}},
+}
+
+@pytest.fixture
+def asset_cache(monkeypatch):
+    cache = SharedCache('asset:', 60, 100)
+    monkeypatch.setattr(page_weight, 'asset_cache', cache)
+    return cache
+
+def test_subresources_are_collected_once_each():
+    """Stylesheets, scripts, images and fonts are found, resolved and deduplicated"""
+    found = collect_subresources(parse_html(PAGE), 'http://site.test/page/')
+    assert found == [
+        ('http://site.test/site.css', 'stylesheet'),
+        ('http://site.test/font.woff2', 'font'),
+        ('http://site.test/favicon.ico', 'image'),
+        ('http://site.test/app.js', 'script'),
+        ('http://site.test/logo.png', 'image'),
+        ('http://site.test/page/logo.png', 'image'),
+        ('http://site.test/logo@2x.png', 'image'),
+        ('http://site.test/missing.png', 'image'),
+    ]
+
+def test_audit_reports_sizes_compression_and_caching(stub_site, asset_cache):
+    """Each asset's transfer size, encoding and cache headers add up to the page weight"""
+    stub_site.routes = dict(ROUTES)
+    report = audit(collect_subresources(parse_html(PAGE), stub_site.url('/')), 'test-agent')
+    assets = {asset['url'][len(stub_site.url('')):]: asset for asset in report['assets']}
+
+    assert assets['/site.css']['size'] == len(CSS) and assets['/site.css']['content_encoding'] == 'gzip'
+    assert assets['/site.css']['max_age'] == 31536000 and assets['/site.css']['cacheable']
+    assert assets['/font.woff2']['size'] == len(FONT) and assets['/font.woff2']['status_code'] == 206
+    assert assets['/logo.png']['cacheable'] and assets['/logo.png']['etag'] == '"v1"'
+    assert assets['/missing.png']['status_code'] == 404
+
+    measured = ('/site.css', '/app.js', '/logo.png', '/logo@2x.png', '/favicon.ico', '/font.woff2')
+    assert report['total_bytes'] == sum(assets[path]['size'] for path in measured)
+    # logo.png resolves to /logo.png from the root, so it's audited once
+    assert report['asset_count'] == report['audited'] == 7 and report['failed'] == 1
+    assert report['by_type']['image']['count'] == 4
+    assert report['uncompressed'] == [stub_site.url('/app.js')]
+    assert sorted(report['uncached']) == sorted([stub_site.url('/app.js'), stub_site.url('/logo@2x.png')])
+    assert report['largest'][0]['url'] == stub_site.url('/logo@2x.png')
+
+def test_assets_are_cached_across_analyses(stub_site, asset_cache):
+    """A second page sharing assets only fetches the ones not measured before"""
+    stub_site.routes = dict(ROUTES, **{
+        '/': PAGE,
+        '/other': '<html><head><link rel="stylesheet" href="/site.css"></head><body><img src="/new.png"></body></html>',
+        '/new.png': {'body': b'\x89PNG', 'headers': {'Content-Type': 'image/png'}},
+    })
+    settings = {'include_ai_analysis': False, 'include_page_weight': True}
+    first = client.post("/api/analyze", json={'url': stub_site.url('/'), 'settings': settings}).json()
+    assert first['page_weight']['cache_hits'] == 0 and first['page_weight']['total_bytes'] > 0
+
+    stub_site.requests.clear()
+    second = client.post("/api/analyze", json={'url': stub_site.url('/other'), 'settings': settings}).json()
+    assert second['page_weight']['cache_hits'] == 1 and second['page_weight']['audited'] == 2
+    assert '/site.css' not in stub_site.requests and '/new.png' in stub_site.requests
+
+def test_audit_is_off_by_default(stub_site):
+    """Without include_page_weight no subresource is fetched"""
+    stub_site.routes = dict(ROUTES, **{'/': PAGE})
+    result = client.post("/api/analyze", json={'url': stub_site.url('/'), 'settings': {'include_ai_analysis': False}}).json()
+    assert 'page_weight' not in result and stub_site.requests == ['/']
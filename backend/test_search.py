@@ -0,0 +1,95 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models import SessionLocal, Analysis
+import search
+from search import fts5_query
+
+client = TestClient(app)
+
+def store(title, heading='', text=''):
+    with SessionLocal() as db:
+        analysis = Analysis(url=f"https://search.test/{title.lower().replace(' ', '-')}", title=title,
+                            headings={'h1': [{'text': heading, 'id': None}], 'h2': []}, content={'text': text})
+        db.add(analysis)
+        db.commit()
+        return analysis.id
+
+@pytest.fixture(scope='module')
+def pages():
+    with TestClient(app):  # creates the tables and the search index
+        pass
+    return {
+        'title': store('Zanzibar travel guide', 'Beaches', 'Where to stay and what to eat.'),
+        'heading': store('Island holidays', 'Zanzibar beaches', 'Sun, sand and spice tours.'),
+        'body': store('East Africa', 'Overview', 'A week in Zanzibar is enough for the spice farms.'),
+        'other': store('Mountain hiking', 'Kilimanjaro', 'Seven days to the summit, no beaches.'),
+    }
+
+def test_fts5_query():
+    """Web-style syntax becomes quoted FTS5 terms; operators typed by users can't break the query"""
+    assert fts5_query('spice farms') == '"spice" "farms"'
+    assert fts5_query('"spice farms" -beaches') == '"spice farms" NOT "beaches"'
+    assert fts5_query('zanzibar OR kilimanjaro') == '"zanzibar" OR "kilimanjaro"'
+    assert fts5_query('NEAR( AND "') == '"NEAR" "AND"'
+    assert fts5_query('-beaches') == ''
+
+def test_results_are_ranked_by_field(pages):
+    """Title matches outrank heading matches, which outrank body matches"""
+    response = client.get("/api/search", params={'q': 'zanzibar'})
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert [r['analysis_id'] for r in results] == [pages['title'], pages['heading'], pages['body']]
+    assert results[0]['score'] > results[1]['score'] > results[2]['score']
+    assert '<mark>Zanzibar</mark>' in results[2]['snippet']
+
+def test_search_stems_phrases_and_exclusions(pages):
+    """Stemmed words, phrases and -exclusions all match as on the web"""
+    def ids(q):
+        return {r['analysis_id'] for r in client.get("/api/search", params={'q': q}).json()['results']}
+    assert ids('beach') == {pages['title'], pages['heading'], pages['other']}
+    assert ids('"spice farms"') == {pages['body']}
+    assert ids('beaches -zanzibar') == {pages['other']}
+
+def test_keyset_pagination(pages):
+    """Following next_cursor walks every match once, in rank order"""
+    seen, cursor = [], None
+    while True:
+        page = client.get("/api/search", params={'q': 'zanzibar', 'limit': 2, 'cursor': cursor}).json()
+        seen += [r['analysis_id'] for r in page['results']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == [pages['title'], pages['heading'], pages['body']]
+    assert client.get("/api/search", params={'q': 'zanzibar', 'cursor': 'nope'}).status_code == 400
+
+def test_only_recent_matches_are_ranked(pages, monkeypatch):
+    """Past the ranking window, the best of the most recent matches come back, flagged as such"""
+    monkeypatch.setattr(search, 'SEARCH_RANK_WINDOW', 2)
+    page = client.get("/api/search", params={'q': 'zanzibar'}).json()
+    assert [r['analysis_id'] for r in page['results']] == [pages['heading'], pages['body']]
+    assert page['ranked_recent_only']
+
+def test_index_follows_updates_and_deletes(pages):
+    """Triggers keep the index in sync as analyses change or go away"""
+    analysis_id = store('Quokka facts', text='Small and friendly.')
+    assert [r['analysis_id'] for r in client.get("/api/search", params={'q': 'quokka'}).json()['results']] == [analysis_id]
+
+    with SessionLocal() as db:
+        db.get(Analysis, analysis_id).content = {'text': 'Now about wombats.'}
+        db.commit()
+    assert client.get("/api/search", params={'q': 'wombats'}).json()['results'][0]['analysis_id'] == analysis_id
+
+    with SessionLocal() as db:
+        db.delete(db.get(Analysis, analysis_id))
+        db.commit()
+    assert client.get("/api/search", params={'q': 'quokka'}).json()['results'] == []
+
+def test_snippets_are_escaped():
+    """Page text is escaped before matches are highlighted"""
+    with TestClient(app):
+        pass
+    store('Markup page', text='Use <script>alert(1)</script> carefully with xylophones.')
+    snippet = client.get("/api/search", params={'q': 'xylophones'}).json()['results'][0]['snippet']
+    assert '<script>' not in snippet and '&lt;script&gt;' in snippet and '<mark>xylophones</mark>' in snippet
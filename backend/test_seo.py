@@ -0,0 +1,122 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+import main
+from benchmarks.fakes import FakeRedis
+from main import app
+
+from models import Base, engine, Analysis, SEOScore, SEORuleResult
+from seo import SEOEngine, SEORule, Finding, DEFAULT_RULES, features_frame, rescore_analyses
+
+def make_result(title="A" * 40, description="D" * 130, h1=1, length=500, without_alt=0, internal=5):
+    """Build a minimal analysis result with the given SEO-relevant properties."""
+    return {
+        'metadata': {'title': title, 'meta_tags': {'description': description}},
+        'content': {'text': 'x', 'length': length},
+        'headings': {'h1': [{'text': 'Heading'}] * h1},
+        'links': {'total_internal': internal},
+        'images': {'without_alt': without_alt}
+    }
+
+def test_score_perfect_page():
+    """A page passing every rule gets the full score"""
+    result = SEOEngine().score(make_result())
+    assert result['score'] == 90
+    assert result['grade'] == 'A'
+    assert result['issues'] == []
+    assert all(r['passed'] for r in result['rules'])
+
+def test_image_and_link_checks_use_result_sections():
+    """Alt-text and internal-link rules read the images and links sections"""
+    result = SEOEngine().score(make_result(without_alt=3, internal=1))
+    assert "3 images missing alt text" in result['issues']
+    assert "Add more internal links to improve site structure" in result['recommendations']
+    assert result['score'] == 90 - 5 - 10
+
+def test_first_matching_finding_wins():
+    """A missing title reports only the 'missing' finding"""
+    result = SEOEngine().score(make_result(title=""))
+    assert "Missing page title" in result['issues']
+    assert not any("too short" in issue for issue in result['issues'] if "Title" in issue)
+
+def test_unknown_feature_rejected():
+    """Rules may only reference known features"""
+    with pytest.raises(ValueError):
+        SEOEngine([SEORule('bogus', 'not_a_feature', (Finding('<', 1),))])
+
+def test_ruleset_version_changes_with_rules():
+    """Changing a rule changes the ruleset version"""
+    changed = DEFAULT_RULES[:-1] + (SEORule('internal_links', 'internal_links', (Finding('<', 5),), points=5),)
+    assert SEOEngine().version != SEOEngine(changed).version
+
+def test_bulk_matches_inline():
+    """Vectorized scoring agrees with inline scoring row by row"""
+    engine_ = SEOEngine()
+    results = [
+        make_result(),
+        make_result(title="", description="", h1=0, length=10, without_alt=2, internal=0),
+        make_result(title="T" * 70, description="d" * 200, h1=3),
+        make_result(title="short", description="short", internal=2, without_alt=1),
+    ]
+    rows = [(i, r['metadata'], r['content'], r['headings'], r['links'], r['images']) for i, r in enumerate(results)]
+    scores, rule_results = engine_.score_frame(features_frame(rows))
+
+    for i, result in enumerate(results):
+        inline = engine_.score(result)
+        row = scores[scores['analysis_id'] == i].iloc[0]
+        assert row['score'] == inline['score']
+        assert row['grade'] == inline['grade']
+        bulk_rules = rule_results[rule_results['analysis_id'] == i]
+        assert bulk_rules['passed'].tolist() == [r['passed'] for r in inline['rules']]
+        assert bulk_rules['issue'].tolist() == [r['issue'] for r in inline['rules']]
+
+def test_rescore_persists_and_skips_current():
+    """Backfill stores per-rule results and only rescores stale analyses"""
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.query(SEORuleResult).delete()
+        db.query(SEOScore).delete()
+        for result in (make_result(), make_result(h1=0)):
+            db.add(Analysis(
+                url="https://example.com",
+                page_metadata=result['metadata'],
+                content=result['content'],
+                headings=result['headings'],
+                links=result['links'],
+                images=result['images']
+            ))
+        db.commit()
+        total = db.query(Analysis).count()
+
+        summary = rescore_analyses(db, SEOEngine(), chunk_size=1)
+        assert summary['scored'] == total
+        assert db.query(SEOScore).count() == total
+        assert db.query(SEORuleResult).filter_by(rule_id='single_h1', passed=False).count() >= 1
+
+        assert rescore_analyses(db, SEOEngine())['scored'] == 0
+
+def test_rescore_endpoint_runs_off_the_request_session():
+    """The API rescores on an executor thread with its own session"""
+    with TestClient(app) as client:
+        summary = client.post("/api/seo/rescore", params={'stale_only': False, 'chunk_size': 5}).json()
+    assert summary['scored'] >= 1 and summary['ruleset_version'] == SEOEngine().version
+
+def test_analyses_store_scores_with_the_analysis(stub_site, monkeypatch):
+    """Fresh and cached analyses are stored with their scores, or not at all"""
+    monkeypatch.setattr(main.cache_manager, 'redis_client', FakeRedis())
+    stub_site.routes = {'/': '<html><head><title>Scored</title></head><body><h1>Scored</h1></body></html>'}
+    payload = {'url': stub_site.url('/'), 'settings': {'include_ai_analysis': False}}
+    with TestClient(app) as client:
+        fresh = client.post("/api/analyze", json=payload).json()
+        assert client.post("/api/analyze", json=payload).json()['title'] == 'Scored'  # from the cache
+
+        def locked(*args, **kwargs):
+            raise RuntimeError("database is locked")
+        monkeypatch.setattr('main.seo.save_results', locked)
+        assert client.post("/api/analyze", json=payload).status_code == 200
+
+    with Session(engine) as db:
+        analyses = db.query(Analysis.id).filter_by(url=stub_site.url('/')).all()
+        assert len(analyses) == 2 and (fresh['analysis_id'],) in analyses
+        assert db.query(SEOScore).filter(SEOScore.analysis_id.in_([a.id for a in analyses])).count() == 2
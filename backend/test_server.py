@@ -0,0 +1,80 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+pytestmark = pytest.mark.skipif(sys.platform != 'linux', reason="smoke test of the Linux process manager")
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(port, log, *args):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'server.db')}",
+               WARM_UP_ON_STARTUP='false', LOG_FORMAT='json', LOG_LEVEL='INFO')
+    process = subprocess.Popen([sys.executable, 'server.py', '--host', '127.0.0.1', '--port', str(port), *args],
+                               cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:  # the socket is bound before the workers are up
+            time.sleep(0.2)
+    process.kill()
+    raise AssertionError("server didn't come up")
+
+def messages(output):
+    lines = (json.loads(line) for line in output.splitlines() if line.startswith('{'))
+    return [line['message'] for line in lines if line.get('logger') == 'server']
+
+def test_serves_recycles_and_drains(stub_site, tmp_path):
+    """Workers answer under load and are replaced as they recycle; SIGTERM lets in-flight analyses finish"""
+    stub_site.routes = {'/slow': {'body': '<html><head><title>Slow</title></head></html>', 'delay': 1.5}}
+    port = free_port()
+    log = open(tmp_path / 'server.log', 'w')  # a file rather than a pipe nobody reads until the end
+    process = start_server(port, log, '--workers', '2', '--max-requests', '20', '--max-requests-jitter', '0')
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            statuses = list(pool.map(lambda _: requests.get(f"http://127.0.0.1:{port}/health", timeout=10).status_code,
+                                     range(200)))
+        assert statuses == [200] * 200
+
+        # Whichever worker serves the scrape reports all of them, recycled ones included
+        scrape = requests.get(f"http://127.0.0.1:{port}/metrics", timeout=10).text.splitlines()
+        health_checks = sum(float(line.rsplit(' ', 1)[1]) for line in scrape
+                            if line.startswith('webanalyzer_http_request_duration_seconds_count{handler="health_check"'))
+        assert health_checks >= 200
+        assert 'webanalyzer_http_requests_in_flight 1.0' in scrape
+
+        with ThreadPoolExecutor(1) as pool:
+            analysis = pool.submit(requests.post, f"http://127.0.0.1:{port}/api/analyze", timeout=30,
+                                   json={'url': stub_site.url('/slow'), 'settings': {'include_ai_analysis': False}})
+            time.sleep(0.5)
+            process.send_signal(signal.SIGTERM)
+            response = analysis.result()
+        assert response.status_code == 200 and response.json()['title'] == 'Slow'
+        process.wait(timeout=30)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        log.close()
+
+    assert process.returncode == 0
+    logged = messages((tmp_path / 'server.log').read_text())
+    assert logged.count("Started worker") > 2  # 200 requests over 2 workers recycled after 20 each
+    assert logged[-2:] == ["Draining", "Stopped"]
+    with pytest.raises(requests.ConnectionError):
+        requests.get(f"http://127.0.0.1:{port}/health", timeout=1)
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Cumulative time to `import main`, as reported by -X importtime; raise it on slow machines
+IMPORT_TIME_BUDGET_MS = float(os.getenv('IMPORT_TIME_BUDGET_MS', 1000))
+
+# Loaded on first use, never by importing the app
+LAZY_MODULES = ('pandas', 'numpy', 'reportlab', 'openpyxl', 'pyarrow', 'openai',
+                'celery', 'aiohttp', 'passlib', 'bcrypt', 'jose', 'redis', 'uvicorn', 'jobs')
+
+def run_python(code, *flags):
+    return subprocess.run([sys.executable, *flags, '-c', code], cwd=BACKEND_DIR,
+                          capture_output=True, text=True, check=True)
+
+def main_import_ms():
+    """Cumulative import time of `main` in milliseconds."""
+    stderr = run_python('import main', '-X', 'importtime').stderr
+    for line in stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].rstrip() == ' main':
+            return int(fields[1]) / 1000
+    raise AssertionError(f"main not in -X importtime output:\n{stderr[-2000:]}")
+
+def test_heavy_modules_are_not_imported_at_startup():
+    """Importing the app leaves the optional heavy subsystems unloaded"""
+    code = f"import sys, main; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    assert run_python(code).stdout.strip() == ''
+
+def test_import_time_budget():
+    """Importing the app stays within the import-time budget"""
+    # Best of three, so one slow run on a busy machine doesn't fail the build
+    elapsed = min(main_import_ms() for _ in range(3))
+    assert elapsed <= IMPORT_TIME_BUDGET_MS, f"import main took {elapsed:.0f} ms (budget {IMPORT_TIME_BUDGET_MS:.0f} ms)"
@@ -207,7 +207,7 @@ interface AnalysisResult {
     content_length: number;
     content_type: string;
     server: string;
-    encoding: string;
+    encoding: { name: string; source: string } | string | null;
     redirect_count: number;
   };
 }
@@ -385,7 +385,8 @@ const Analyzer = () => {
     if (!result || !result.analysis_id) return;
 
     try {
-      const response = await axios.post(`/api/export/${result.analysis_id}`, format, {
+      const response = await axios.post(`/api/export/${result.analysis_id}`, null, {
+        params: { format },
         responseType: 'blob'
       });
 
@@ -1266,7 +1267,11 @@ const Analyzer = () => {
                   </Box>
                   <Box sx={{ display: 'flex', justifyContent: 'space-between' }}>
                     <Typography>Encoding:</Typography>
-                    <Typography variant="body2">{result.performance.encoding}</Typography>
+                    <Typography variant="body2">
+                      {typeof result.performance.encoding === 'object' && result.performance.encoding
+                        ? `${result.performance.encoding.name} (${result.performance.encoding.source})`
+                        : result.performance.encoding}
+                    </Typography>
                   </Box>
                   <Box sx={{ display: 'flex', justifyContent: 'space-between' }}>
                     <Typography>Redirects:</Typography>